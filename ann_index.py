@@ -0,0 +1,264 @@
+'''
+Konfigurabilni FAISS indexi i automatsko podesavanje parametara.
+
+Config je obican dict, npr. {"type": "hnsw_sq8", "M": 32, "efSearch": 64}.
+Podrzani tipovi:
+- flat       - egzaktna pretraga
+- hnsw_flat  - HNSW nad float32 vektorima (M, efConstruction, efSearch)
+- hnsw_sq8   - HNSW sa 8-bitnom skalarnom kvantizacijom
+- hnsw_pq    - HNSW sa product kvantizacijom (pq_m, nbits)
+- ivf_flat   - IVF sa float32 listama (nlist, nprobe)
+- ivf_pq     - IVF sa PQ kodovima (nlist, nprobe, pq_m, nbits)
+- binary     - binarni kodovi + float rescoring (binary_index, oversample,
+               rescore_dtype), vidi binary_index.py
+
+Tuning builda egzaktni IndexFlat kao ground truth nad sacuvanim vektorima,
+prolazi kroz mrezu parametara i prijavljuje Pareto front recall@k /
+latencija / memorija. Izabrana konfiguracija se cuva u PATH/index_config.json:
+
+    python ann_index.py --rag hnsw --target-recall 0.95
+'''
+
+import os
+import json
+import math
+import time
+from typing import Callable, Dict, List, Optional
+import faiss
+import numpy as np
+from binary_index import BinaryRescoreIndex
+
+CONFIG_FILE = "index_config.json"
+INDEX_TYPES = ("flat", "hnsw_flat", "hnsw_sq8", "hnsw_pq", "ivf_flat", "ivf_pq", "binary")
+DEFAULTS = {
+    "M": 32,
+    "efConstruction": 40,
+    "efSearch": 16,
+    "nlist": None,      # None - 4 * sqrt(n)
+    "nprobe": 8,
+    "pq_m": None,       # None - najveci delilac dimenzije iz PQ_M_CHOICES
+    "nbits": 8,
+    "binary_index": "flat",  # "flat" ili "hnsw"
+    "rescore_dtype": "float16",
+    "oversample": 4
+}
+# parametri koji uticu samo na pretragu (ne traze rebuild)
+SEARCH_PARAMS = ("efSearch", "nprobe", "oversample")
+PQ_M_CHOICES = (64, 48, 32, 16, 8)
+# koliko vektora iz kolekcije koristimo kao upite pri tuningu
+TUNE_QUERIES = 200
+
+TUNE_GRID = {
+    "flat": [{}],
+    "hnsw_flat": [{"M": m, "efSearch": ef} for m in (16, 32, 48) for ef in (16, 32, 64, 128)],
+    "hnsw_sq8": [{"M": m, "efSearch": ef} for m in (16, 32, 48) for ef in (16, 32, 64, 128)],
+    "hnsw_pq": [{"M": 32, "pq_m": pq_m, "efSearch": ef} for pq_m in (16, 32, 64) for ef in (32, 64, 128)],
+    "ivf_flat": [{"nprobe": p} for p in (1, 4, 8, 16, 32)],
+    "ivf_pq": [{"pq_m": pq_m, "nprobe": p} for pq_m in (16, 32, 64) for p in (4, 8, 16, 32)],
+    "binary": [{"binary_index": "flat", "oversample": o} for o in (2, 4, 8, 16)]
+}
+
+
+def resolve(config: Dict, dim: int, n: int) -> Dict:
+    """
+    Popunjava podrazumevane vrednosti i auto parametre za dati broj vektora.
+    """
+    if config.get("type") not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type {config.get('type')}, expected one of {INDEX_TYPES}")
+    resolved = {**DEFAULTS, **config}
+    if resolved["nlist"] is None:
+        resolved["nlist"] = int(4 * math.sqrt(max(n, 1)))
+    # k-means trazi bar ~39 tacaka po centroidu
+    resolved["nlist"] = max(1, min(resolved["nlist"], n // 39))
+    if resolved["pq_m"] is None:
+        resolved["pq_m"] = next((m for m in PQ_M_CHOICES if dim % m == 0), 1)
+    if dim % resolved["pq_m"] != 0:
+        raise ValueError(f"pq_m={resolved['pq_m']} must divide dimension {dim}")
+    resolved["nbits"] = max(1, min(resolved["nbits"], int(math.log2(max(n, 2)))))
+    return resolved
+
+
+def config_kind(config: Dict) -> str:
+    """
+    Stabilan opis build parametara - promena invalidira sacuvani index.
+    """
+    build = {k: v for k, v in sorted({**DEFAULTS, **config}.items()) if k not in SEARCH_PARAMS}
+    return "_".join(f"{k}={v}" for k, v in build.items())
+
+
+def _make_base(c: Dict, dim: int) -> faiss.Index:
+    kind = c["type"]
+    if kind == "flat":
+        return faiss.IndexFlatL2(dim)
+    if kind == "ivf_flat":
+        return faiss.IndexIVFFlat(faiss.IndexFlatL2(dim), dim, c["nlist"])
+    if kind == "ivf_pq":
+        return faiss.IndexIVFPQ(faiss.IndexFlatL2(dim), dim, c["nlist"], c["pq_m"], c["nbits"])
+    if kind == "hnsw_flat":
+        index = faiss.IndexHNSWFlat(dim, c["M"])
+    elif kind == "hnsw_sq8":
+        index = faiss.IndexHNSWSQ(dim, faiss.ScalarQuantizer.QT_8bit, c["M"])
+    else:
+        index = faiss.IndexHNSWPQ(dim, c["pq_m"], c["M"], c["nbits"])
+    index.hnsw.efConstruction = c["efConstruction"]
+    return index
+
+
+def make_factory(config: Dict) -> Callable[[int, int], faiss.Index]:
+    """
+    Factory (dim, n) -> prazan index sa id mapiranjem (add_with_ids / remove_ids).
+    """
+    def factory(dim: int, n: int) -> faiss.Index:
+        c = resolve(config, dim, n)
+        if c["type"] == "binary":
+            return BinaryRescoreIndex(dim, c["binary_index"], c["M"], c["rescore_dtype"], c["oversample"])
+        return faiss.IndexIDMap2(_make_base(c, dim))
+    return factory
+
+
+def make_loader(config: Dict) -> Optional[Callable[[str, bool], object]]:
+    # binarni index ima svoj format (binarni FAISS + .npy vektori)
+    return BinaryRescoreIndex.read if config.get("type") == "binary" else None
+
+
+def apply_search_params(index, config: Dict):
+    if isinstance(index, BinaryRescoreIndex):
+        index.oversample = config.get("oversample", DEFAULTS["oversample"])
+        base = index.binary_base
+        if isinstance(base, faiss.IndexBinaryHNSW):
+            base.hnsw.efSearch = config.get("efSearch", DEFAULTS["efSearch"])
+        return
+    base = faiss.downcast_index(index.index) if isinstance(index, faiss.IndexIDMap) else index
+    if isinstance(base, faiss.IndexHNSW):
+        base.hnsw.efSearch = config.get("efSearch", DEFAULTS["efSearch"])
+    elif isinstance(base, faiss.IndexIVF):
+        base.nprobe = config.get("nprobe", DEFAULTS["nprobe"])
+
+
+def index_memory(index) -> int:
+    if isinstance(index, BinaryRescoreIndex):
+        return index.memory_bytes()
+    return int(faiss.serialize_index(index).nbytes)
+
+
+def load_config(path: str, default: Dict) -> Dict:
+    config_path = os.path.join(path, CONFIG_FILE)
+    if not os.path.exists(config_path):
+        return dict(default)
+    with open(config_path, "r", encoding="utf-8") as f:
+        return json.load(f)["config"]
+
+
+def save_config(path: str, config: Dict, report: Optional[Dict] = None):
+    with open(os.path.join(path, CONFIG_FILE), "w", encoding="utf-8") as f:
+        json.dump({"config": config, "report": report}, f, indent=2)
+
+
+def _recall(found: np.ndarray, truth: np.ndarray) -> float:
+    k = truth.shape[1]
+    return float(np.mean([len(set(f) & set(t)) / k for f, t in zip(found, truth)]))
+
+
+def pareto_front(points: List[Dict]) -> List[Dict]:
+    def dominates(a, b):
+        better_or_equal = (a["recall"] >= b["recall"] and a["latency_ms"] <= b["latency_ms"]
+                           and a["memory_bytes"] <= b["memory_bytes"])
+        strictly = (a["recall"] > b["recall"] or a["latency_ms"] < b["latency_ms"]
+                    or a["memory_bytes"] < b["memory_bytes"])
+        return better_or_equal and strictly
+    front = [p for p in points if not any(dominates(o, p) for o in points if o is not p)]
+    return sorted(front, key=lambda p: p["latency_ms"])
+
+
+def tune(embeddings: np.ndarray, types=INDEX_TYPES, k: int = 10, target_recall: float = 0.95,
+         n_queries: int = TUNE_QUERIES, seed: int = 0) -> Dict:
+    embeddings = np.ascontiguousarray(embeddings, dtype='float32')
+    n, dim = embeddings.shape
+    rng = np.random.default_rng(seed)
+    # upiti se izdvajaju iz indexa - vektor koji je i u indexu uvek nadje sebe i naduva recall
+    held_out = np.zeros(n, dtype=bool)
+    held_out[rng.choice(n, size=min(n_queries, n // 2), replace=False)] = True
+    queries = embeddings[held_out]
+    embeddings = np.ascontiguousarray(embeddings[~held_out])
+    n = len(embeddings)
+    k = min(k, n)
+
+    # egzaktni ground truth
+    exact = faiss.IndexFlatL2(dim)
+    exact.add(embeddings)
+    _, truth = exact.search(queries, k)
+
+    points = []
+    for kind in types:
+        built = {}
+        for params in TUNE_GRID[kind]:
+            config = {"type": kind, **params}
+            build_key = config_kind(config)
+            if build_key not in built:
+                index = make_factory(config)(dim, n)
+                start = time.perf_counter()
+                if not index.is_trained:
+                    index.train(embeddings)
+                index.add_with_ids(embeddings, np.arange(n, dtype='int64'))
+                built[build_key] = (index, time.perf_counter() - start, index_memory(index))
+            index, build_s, memory = built[build_key]
+
+            apply_search_params(index, config)
+            start = time.perf_counter()
+            # upiti jedan po jedan, kao u retrievalu
+            found = np.vstack([index.search(q[None, :], k)[1] for q in queries])
+            latency_ms = (time.perf_counter() - start) * 1000 / len(queries)
+            points.append({
+                "config": config,
+                "recall": _recall(found, truth),
+                "latency_ms": latency_ms,
+                "memory_bytes": memory,
+                "build_s": build_s
+            })
+            print(f"{config}: recall@{k}={points[-1]['recall']:.3f} "
+                  f"latency={latency_ms:.3f} ms memory={memory / 1e6:.1f} MB")
+
+    front = pareto_front(points)
+    # najbrza konfiguracija koja dostize ciljani recall, inace ona sa najboljim recallom
+    good = [p for p in front if p["recall"] >= target_recall]
+    chosen = min(good, key=lambda p: p["latency_ms"]) if good else max(front, key=lambda p: p["recall"])
+    return {"k": k, "target_recall": target_recall, "chosen": chosen, "pareto_front": front, "points": points}
+
+
+def tune_rag(rag, types=INDEX_TYPES, k: int = 10, target_recall: float = 0.95) -> Dict:
+    """
+    Tuning nad vektorima iz chroma kolekcije raga; izabrani config se cuva i index se ponovo builda.
+    """
+    results = rag.collection.get(include=['embeddings'])
+    embeddings = np.array(results['embeddings']).astype('float32')
+    report = tune(embeddings, types=types, k=k, target_recall=target_recall)
+
+    print("Pareto front (recall / latency / memory):")
+    for p in report["pareto_front"]:
+        print(f"  {p['config']}: {p['recall']:.3f} / {p['latency_ms']:.3f} ms / {p['memory_bytes'] / 1e6:.1f} MB")
+    chosen = report["chosen"]["config"]
+    print(f"Chosen: {chosen}")
+
+    save_config(rag.vector_index.path, chosen,
+                {key: report[key] for key in ("k", "target_recall", "chosen", "pareto_front")})
+    rag.vector_index.set_config(chosen)
+    return report
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="ANN index parameter tuning")
+    parser.add_argument("--rag", choices=["hnsw", "crossranking"], default="hnsw")
+    parser.add_argument("--types", nargs="+", choices=INDEX_TYPES, default=list(INDEX_TYPES))
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--target-recall", type=float, default=0.95)
+    args = parser.parse_args()
+
+    if args.rag == "hnsw":
+        from hnsw import HnswRAG
+        target = HnswRAG()
+    else:
+        from rag import CrossRankingRAG
+        target = CrossRankingRAG()
+    tune_rag(target, types=args.types, k=args.k, target_recall=args.target_recall)
@@ -0,0 +1,127 @@
+'''
+Dinamicko micro-batchovanje zahteva za inference.
+
+Konkurentni zahtevi se skupljaju najvise max_wait_ms (ili dok se ne skupi
+max_batch_size) i obradjuju jednim pozivom - za RAG to je jedan forward pass
+embedding modela, jedna FAISS batch pretraga i jedan cross-encoder batch
+(retrieve_many). Dok se jedan batch obradjuje, novi zahtevi cekaju u redu,
+pa se pod opterecenjem batchevi sami povecavaju.
+
+Obrada ide u jednoj pozadinskoj niti po batcheru (model se ne poziva
+paralelno sam sa sobom), event loop ostaje slobodan za HTTP.
+
+    batcher = MicroBatcher(lambda items: rag.retrieve_many(items, top_k=10))
+    result = await batcher.submit("query")
+'''
+
+import time
+import asyncio
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 5.0
+
+
+class MicroBatcher:
+    def __init__(self, process: Callable[[List], List], max_batch_size: int = MAX_BATCH_SIZE,
+                 max_wait_ms: float = MAX_WAIT_MS, name: str = "batcher"):
+        self.process = process
+        self.max_batch_size = max_batch_size
+        self.max_wait_ms = max_wait_ms
+        self.name = name
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._queue: Optional[asyncio.Queue] = None
+        self._task = None
+
+        # metrike
+        self.requests = 0
+        self.dispatched = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        self.max_queue_depth = 0
+        self.queue_depth_sum = 0
+        self.wait_s = 0.0
+        self.process_s = 0.0
+
+    def _ensure_started(self):
+        if self._task is None:
+            self._queue = asyncio.Queue()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def submit(self, item):
+        self._ensure_started()
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((item, future, time.perf_counter()))
+        self.requests += 1
+        self.max_queue_depth = max(self.max_queue_depth, self._queue.qsize())
+        return await future
+
+    async def _collect(self) -> List:
+        batch = [await self._queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_wait_ms / 1000
+        while len(batch) < self.max_batch_size:
+            # prvo sve sto vec ceka, bez cekanja
+            if not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+                continue
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect()
+            self.queue_depth_sum += self._queue.qsize()
+            started = time.perf_counter()
+            self.batches += 1
+            self.dispatched += len(batch)
+            self.batch_sizes[len(batch)] += 1
+            self.wait_s += sum(started - enqueued for _, _, enqueued in batch)
+
+            try:
+                results = await loop.run_in_executor(self._executor, self.process, [item for item, _, _ in batch])
+                results = list(results)
+                if len(results) != len(batch):
+                    # zip bi tiho odsekao visak - zahtevi bez rezultata bi cekali zauvek
+                    raise RuntimeError(f"{self.name}: process returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            finally:
+                self.process_s += time.perf_counter() - started
+
+            for (_, future, _), result in zip(batch, results):
+                # klijent je mozda prekinuo zahtev
+                if future.done():
+                    continue
+                # process moze vratiti izuzetak za pojedinacni zahtev - ne obara ostale iz batcha
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def stats(self) -> Dict:
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "mean_batch_size": self.dispatched / self.batches if self.batches else 0.0,
+            "batch_size_histogram": dict(sorted(self.batch_sizes.items())),
+            "queue_depth": self._queue.qsize() if self._queue is not None else 0,
+            "max_queue_depth": self.max_queue_depth,
+            "mean_queue_depth": self.queue_depth_sum / self.batches if self.batches else 0.0,
+            "mean_wait_ms": self.wait_s * 1000 / self.dispatched if self.dispatched else 0.0,
+            "mean_batch_ms": self.process_s * 1000 / self.batches if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait_ms
+        }
@@ -0,0 +1,210 @@
+'''
+Offline benchmark retrievala - bez LLM-a i bez mreze.
+
+Za svaki RAG meri kvalitet (precision/recall/MRR/nDCG@k) i latenciju
+retrievala (p50/p95/p99, QPS za pojedinacne upite i za retrieve_many).
+Relevantnost se racuna jednom po indexu (broj dokumenata po poglavlju i
+sortirane strane za intervale), a ne ponovnim citanjem cele kolekcije.
+
+Upiti su u QUESTIONS formatu (questions.py) ili u JSON fajlu sa listom
+takvih objekata:
+
+    python benchmark.py --queries queries.json --top-k 10 --output bench.json
+'''
+
+import argparse
+import json
+import math
+import time
+from typing import Dict, List, Optional
+import numpy as np
+from latency import latency_stats
+
+
+def load_queries(path: Optional[str] = None) -> List[Dict]:
+    if path is None:
+        from questions import QUESTIONS
+        return QUESTIONS
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _merge_intervals(intervals) -> List[List[int]]:
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class RelevanceIndex:
+    """
+    Unapred izracunata relevantnost nad DocStore-om jednog indexa.
+
+    by_pages=True proverava page_start u relevant_pages (HnswRAG chunkovi),
+    inace chapter u relevant_chapters (CrossRankingRAG paragrafi).
+    """
+    def __init__(self, vector_index):
+        docs = vector_index.docs
+        live = np.array([doc_id is not None for doc_id in vector_index.doc_id_mapping], dtype=bool)
+        chapters = np.asarray(docs.int_columns["chapter"])[live]
+        pages = np.asarray(docs.int_columns["page_start"])[live]
+        self.chapter_counts = np.bincount(chapters[chapters >= 0])
+        self.sorted_pages = np.sort(pages[pages >= 0])
+
+    def total_relevant(self, query_item: Dict, by_pages: bool) -> int:
+        if by_pages:
+            total = 0
+            for start, end in _merge_intervals(query_item.get("relevant_pages", [])):
+                total += int(np.searchsorted(self.sorted_pages, end, side="right") -
+                             np.searchsorted(self.sorted_pages, start, side="left"))
+            return total
+        return int(sum(self.chapter_counts[c] for c in set(query_item.get("relevant_chapters", []))
+                       if 0 <= c < len(self.chapter_counts)))
+
+
+def is_relevant(metadata: Dict, query_item: Dict, by_pages: bool) -> bool:
+    try:
+        if by_pages:
+            page = int(metadata.get("page_start"))
+            return any(start <= page <= end for start, end in query_item.get("relevant_pages", []))
+        return int(metadata.get("chapter")) in query_item.get("relevant_chapters", [])
+    except (ValueError, TypeError):
+        return False
+
+
+def ranking_metrics(relevance: List[bool], total_relevant: int, top_k: int) -> Dict:
+    hits = sum(relevance)
+    first_hit = next((rank for rank, rel in enumerate(relevance) if rel), None)
+    dcg = sum(1 / math.log2(rank + 2) for rank, rel in enumerate(relevance) if rel)
+    idcg = sum(1 / math.log2(rank + 2) for rank in range(min(total_relevant, top_k)))
+    return {
+        "precision": hits / top_k if top_k else 0.0,
+        "recall": hits / total_relevant if total_relevant else 0.0,
+        "mrr": 1 / (first_hit + 1) if first_hit is not None else 0.0,
+        "ndcg": dcg / idcg if idcg else 0.0
+    }
+
+
+def _timed_queries(rag, queries: List[Dict], top_k: int, repeats: int, before=None):
+    # before() se zove pre svakog merenog poziva (npr. praznjenje kesa skorova)
+    latencies, results = [], []
+    for item in queries:
+        for _ in range(repeats):
+            if before:
+                before()
+            start = time.perf_counter()
+            result = rag.retrieve(item["query"], top_k=top_k)
+            latencies.append(time.perf_counter() - start)
+        results.append(result)
+    return latencies, results
+
+
+def _batch_qps(rag, texts: List[str], top_k: int, repeats: int, before=None) -> float:
+    batch_times = []
+    for _ in range(repeats):
+        if before:
+            before()
+        start = time.perf_counter()
+        rag.retrieve_many(texts, top_k=top_k)
+        batch_times.append(time.perf_counter() - start)
+    return len(texts) * repeats / sum(batch_times)
+
+
+def benchmark_rag(rag, queries: List[Dict], top_k: int = 10, repeats: int = 5, by_pages: bool = False) -> Dict:
+    relevance_index = RelevanceIndex(rag.vector_index)
+    texts = [q["query"] for q in queries]
+
+    # zagrevanje (lazy inicijalizacija modela, kesevi OS-a za mmap)
+    rag.retrieve_many(texts, top_k=top_k)
+
+    # kes skorova cross encodera se prazni pre svakog merenja - latencija je bez pogodaka u kesu
+    reranker = getattr(rag, "reranker", None)
+    clear = reranker.clear if reranker is not None else None
+    latencies, results = _timed_queries(rag, queries, top_k, repeats, before=clear)
+    per_query = []
+    for item, result in zip(queries, results):
+        relevance = [is_relevant(m, item, by_pages) for m in result["metadatas"]]
+        metrics = ranking_metrics(relevance, relevance_index.total_relevant(item, by_pages), top_k)
+        per_query.append({"query": item["query"], **metrics})
+
+    report = {
+        "rag": rag.__class__.__name__,
+        "top_k": top_k,
+        "queries": len(queries),
+        **{name: float(np.mean([q[name] for q in per_query])) for name in ("precision", "recall", "mrr", "ndcg")},
+        "latency": latency_stats(latencies),
+        "batch_qps": _batch_qps(rag, texts, top_k, repeats, before=clear),
+        "per_query": per_query
+    }
+    if reranker is not None:
+        report["pairs_scored"] = float(np.mean([r["rerank"]["pairs_scored"] for r in results]))
+        if reranker.cache_entries > 0:
+            # ponovljeni upiti sa toplim kesom skorova, posebno od necesiranih
+            rag.retrieve_many(texts, top_k=top_k)
+            report["latency_cached"] = latency_stats(_timed_queries(rag, queries, top_k, repeats)[0])
+            report["batch_qps_cached"] = _batch_qps(rag, texts, top_k, repeats)
+    return report
+
+
+def print_report(report: Dict):
+    latency = report["latency"]
+    print("=" * 80)
+    print(f"{report['rag']} ({report['queries']} queries, top_k={report['top_k']})")
+    print(f"Precision@{report['top_k']}: {report['precision']:.2%}  Recall@{report['top_k']}: {report['recall']:.2%}  "
+          f"MRR: {report['mrr']:.3f}  nDCG@{report['top_k']}: {report['ndcg']:.3f}")
+    print(f"Latency p50 {latency['p50_ms']:.1f} ms | p95 {latency['p95_ms']:.1f} ms | p99 {latency['p99_ms']:.1f} ms | "
+          f"QPS {latency['qps']:.1f} | batch QPS {report['batch_qps']:.1f}")
+    if "pairs_scored" in report:
+        print(f"Cross encoder pairs scored per query: {report['pairs_scored']:.1f}")
+    if "latency_cached" in report:
+        cached = report["latency_cached"]
+        print(f"Cached scores: p50 {cached['p50_ms']:.1f} ms | p95 {cached['p95_ms']:.1f} ms | "
+              f"p99 {cached['p99_ms']:.1f} ms | QPS {cached['qps']:.1f} | batch QPS {report['batch_qps_cached']:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline retrieval benchmark")
+    parser.add_argument("--queries", help="JSON fajl sa upitima u QUESTIONS formatu")
+    parser.add_argument("--rag", choices=["hnsw", "crossranking", "both"], default="both")
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--output", help="JSON fajl za rezultate (za poredjenje izmedju verzija)")
+    parser.add_argument("--cascade", action="store_true",
+                        help="i podrazumevani CrossRankingRAG (odsecanje po marginu i rani izlaz, reranker.py), uz razliku u kvalitetu")
+    args = parser.parse_args()
+
+    queries = load_queries(args.queries)
+    reports = []
+    # bez kesa upita, da merimo stvarni retrieval
+    if args.rag in ("crossranking", "both"):
+        from rag import CrossRankingRAG
+        from reranker import CascadeReranker
+        # pun reranking - referenca za kvalitet kaskade
+        full = benchmark_rag(CrossRankingRAG(reranker=CascadeReranker()), queries, args.top_k, args.repeats, by_pages=False)
+        reports.append(full)
+        print_report(full)
+        if args.cascade:
+            rag = CrossRankingRAG()
+            cascade = benchmark_rag(rag, queries, args.top_k, args.repeats, by_pages=False)
+            cascade["rag"] += " (cascade)"
+            # trosak kaskade u kvalitetu naspram punog rerankinga
+            cascade["vs_full"] = {name: cascade[name] - full[name] for name in ("precision", "recall", "mrr", "ndcg")}
+            reports.append(cascade)
+            print_report(cascade)
+            print("Cascade vs full reranking: " + "  ".join(
+                f"{name} {delta:+.3f}" for name, delta in cascade["vs_full"].items()))
+    if args.rag in ("hnsw", "both"):
+        from hnsw import HnswRAG
+        reports.append(benchmark_rag(HnswRAG(), queries, args.top_k, args.repeats, by_pages=True))
+        print_report(reports[-1])
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(reports, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+'''
+Dvostepena pretraga: binarni kodovi + egzaktni rescoring.
+
+Prvi stepen drzi 1 bit po dimenziji (znak komponente) u FAISS binarnom
+indexu (flat ili HNSW, Hamming distanca) i uzima oversample * k kandidata.
+Drugi stepen racuna egzaktnu L2 distancu kandidata nad float16/float32
+vektorima koji se cuvaju u .npy fajlu i mmapuju pri ucitavanju.
+
+Index u memoriji je ~32x manji od IndexFlatL2 (dim/8 bajtova po vektoru).
+Klasa ima isti interfejs koji VectorIndex koristi od FAISS indexa
+(add_with_ids, remove_ids, search, ntotal), pa je samo jos jedan tip u
+ann_index.py: {"type": "binary", "binary_index": "flat", "oversample": 4}.
+'''
+
+import os
+from typing import Optional
+import faiss
+import numpy as np
+from doc_store import GrowableArray
+
+VECTORS_SUFFIX = ".vectors.npy"
+DEFAULT_OVERSAMPLE = 4
+
+
+def binarize(x: np.ndarray) -> np.ndarray:
+    return np.packbits(np.asarray(x) > 0, axis=1)
+
+
+class BinaryRescoreIndex:
+    def __init__(self, dim: int, binary_index: str = "flat", M: int = 32,
+                 rescore_dtype: str = "float16", oversample: int = DEFAULT_OVERSAMPLE):
+        if dim % 8 != 0:
+            raise ValueError(f"Binary index needs dimension divisible by 8, got {dim}")
+        self.d = dim
+        self.oversample = oversample
+        base = faiss.IndexBinaryHNSW(dim, M) if binary_index == "hnsw" else faiss.IndexBinaryFlat(dim)
+        self.binary = faiss.IndexBinaryIDMap2(base)
+        self._set_vectors(np.zeros((0, dim), dtype=rescore_dtype))
+
+    def _set_vectors(self, vectors: np.ndarray):
+        # rezerva kapaciteta - add kopira samo nove vektore, ne sve
+        self._vectors = GrowableArray(vectors)
+        self.vectors = self._vectors.values
+
+    @property
+    def ntotal(self) -> int:
+        return self.binary.ntotal
+
+    @property
+    def is_trained(self) -> bool:
+        return True
+
+    @property
+    def binary_base(self):
+        return faiss.downcast_IndexBinary(self.binary.index)
+
+    def train(self, x: np.ndarray):
+        pass
+
+    def add_with_ids(self, x: np.ndarray, labels: np.ndarray):
+        self.binary.add_with_ids(binarize(x), labels)
+        # red u vectors = labela (labele se dodeljuju redom i ne ponavljaju)
+        rows = int(labels.max()) + 1
+        if rows > len(self.vectors):
+            self.vectors = self._vectors.append(np.zeros((rows - len(self.vectors), self.d), dtype=self.vectors.dtype))
+        self.vectors[labels] = x.astype(self.vectors.dtype)
+
+    def remove_ids(self, selector) -> int:
+        # IndexBinaryHNSW ne podrzava brisanje - RuntimeError, VectorIndex onda pravi tombstone
+        return self.binary.remove_ids(selector)
+
+    def _candidates(self, codes: np.ndarray, k: int, selector):
+        fetch = min(self.ntotal, max(k * self.oversample, k))
+        while True:
+            _, labels = self.binary.search(codes, fetch)
+            rows = [[label for label in row if label >= 0 and (selector is None or selector.is_member(int(label)))]
+                    for row in labels]
+            # ako filter odbaci previse kandidata, trazimo jos
+            if fetch >= self.ntotal or all(len(row) >= k for row in rows):
+                return rows
+            fetch = min(self.ntotal, fetch * 2)
+
+    def search(self, x: np.ndarray, k: int, params: Optional[faiss.SearchParameters] = None):
+        x = np.asarray(x, dtype='float32')
+        selector = params.sel if params is not None else None
+        candidates = self._candidates(binarize(x), k, selector)
+
+        distances = np.full((len(x), k), np.inf, dtype='float32')
+        labels = np.full((len(x), k), -1, dtype='int64')
+        for i, rows in enumerate(candidates):
+            if not rows:
+                continue
+            rows = np.array(rows, dtype='int64')
+            # egzaktni rescoring nad float vektorima
+            diff = self.vectors[rows].astype('float32') - x[i]
+            dist = np.einsum('ij,ij->i', diff, diff)
+            order = np.argsort(dist)[:k]
+            distances[i, :len(order)] = dist[order]
+            labels[i, :len(order)] = rows[order]
+        return distances, labels
+
+    def memory_bytes(self) -> int:
+        # samo binarni index je u memoriji, float vektori su mmapovani
+        return int(faiss.serialize_index_binary(self.binary).nbytes)
+
+    def write(self, path: str):
+        tmp = path + ".tmp"
+        faiss.write_index_binary(self.binary, tmp)
+        vectors_tmp = path + ".vectors.tmp.npy"
+        np.save(vectors_tmp, np.asarray(self.vectors))
+        os.replace(vectors_tmp, path + VECTORS_SUFFIX)
+        os.replace(tmp, path)
+
+    @classmethod
+    def read(cls, path: str, mmap: bool = True) -> "BinaryRescoreIndex":
+        index = cls.__new__(cls)
+        index.binary = faiss.read_index_binary(path)
+        index.d = index.binary.d
+        index.oversample = DEFAULT_OVERSAMPLE
+        # mmapovan niz je read-only; VectorIndex pre izmena ucitava index bez mmap-a
+        index._set_vectors(np.load(path + VECTORS_SUFFIX, mmap_mode='r' if mmap else None))
+        return index
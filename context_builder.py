@@ -0,0 +1,243 @@
+'''
+Sklapanje konteksta za LLM u okviru budzeta tokena.
+
+Umesto da se lista dokumenata ubaci u prompt kako jeste:
+1. susedni/preklopljeni chunkovi istog izvora se spajaju - po poziciji
+   (metadata "position") ili po strani i preklopu teksta (fixed-size chunkovi
+   se preklapaju za overlap karaktera)
+2. skoro-duplikati se izbacuju - MinHash nad shingle-ovima od SHINGLE reci,
+   procena Jaccard slicnosti >= NEAR_DUPLICATE
+3. pasusi se pakuju od najbolje rangiranog dok ima mesta u budzetu, brojano
+   tokenizerom modela
+
+Za svaki zahtev se vraca koliko je tokena ustedjeno u odnosu na naivni prompt.
+
+    builder = ContextBuilder(max_tokens=3000)
+    context = builder.build(results)   # rezultat retrieve()
+    context.text, context.tokens_saved
+'''
+
+import re
+import zlib
+from typing import Dict, List, Optional
+import numpy as np
+
+TOKENIZER_NAME = "unsloth/Llama-3.3-70B-Instruct"
+MAX_TOKENS = 3000
+SHINGLE = 5
+NUM_HASHES = 64
+NEAR_DUPLICATE = 0.8
+# najmanji preklop teksta (karakteri) da bi se dva chunka spojila
+MIN_OVERLAP = 20
+SEPARATOR = "\n\n"
+
+_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(0)
+# a, b < 2^31 i crc32 < 2^32, pa a * h + b staje u uint64
+_A = _rng.integers(1, 1 << 31, size=NUM_HASHES, dtype=np.uint64)
+_B = _rng.integers(0, 1 << 31, size=NUM_HASHES, dtype=np.uint64)
+
+
+class Tokenizer:
+    """
+    Broji tokene tokenizerom LLM-a; ako tokenizer nije dostupan (offline), ~4 karaktera po tokenu.
+    """
+    def __init__(self, name: str = TOKENIZER_NAME):
+        self.name = name
+        self._tokenizer = None
+        self._loaded = False
+
+    def _load(self):
+        if not self._loaded:
+            self._loaded = True
+            try:
+                from transformers import AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(self.name)
+            except (OSError, ValueError, ImportError) as e:
+                print(f"Tokenizer {self.name} not available ({type(e).__name__}), estimating tokens from length")
+        return self._tokenizer
+
+    def count(self, texts: List[str]) -> List[int]:
+        tokenizer = self._load()
+        if tokenizer is None:
+            return [max(1, len(t) // 4) for t in texts]
+        return [len(ids) for ids in tokenizer(texts, add_special_tokens=False)["input_ids"]]
+
+
+def minhash(text: str) -> np.ndarray:
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[i:i + SHINGLE]) for i in range(max(1, len(words) - SHINGLE + 1))}
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in shingles], dtype=np.uint64)
+    # (a * h + b) mod p za svaku od NUM_HASHES funkcija, minimum po shingle-ovima
+    return ((np.outer(hashes, _A) + _B) % _PRIME).min(axis=0)
+
+
+def similarity(a: np.ndarray, b: np.ndarray) -> float:
+    return float(np.mean(a == b))
+
+
+def _overlap(a: str, b: str, max_overlap: int = 512) -> int:
+    # koliko kraja a se ponavlja na pocetku b
+    for size in range(min(len(a), len(b), max_overlap), MIN_OVERLAP - 1, -1):
+        if a.endswith(b[:size]):
+            return size
+    return 0
+
+
+class Passage:
+    def __init__(self, text: str, metadata: Dict, score: float):
+        self.text = text
+        self.metadata = dict(metadata)
+        self.score = score
+
+    @property
+    def source(self) -> str:
+        return self.metadata.get("source", "")
+
+    def pages(self):
+        try:
+            return int(self.metadata.get("page_start")), int(self.metadata.get("page_end"))
+        except (TypeError, ValueError):
+            return None
+
+    def header(self) -> str:
+        parts = []
+        if self.metadata.get("chapter") and self.metadata.get("chapter") != "0":
+            parts.append(f"Chapter {self.metadata['chapter']}")
+        if self.metadata.get("subchapter"):
+            parts.append(f"Section {self.metadata['subchapter']}")
+        pages = self.pages()
+        if pages:
+            parts.append(f"Page {pages[0]}" if pages[0] == pages[1] else f"Pages {pages[0]}-{pages[1]}")
+        return " | ".join(parts)
+
+    def format(self) -> str:
+        header = self.header()
+        return f"[{header}]\n{self.text}" if header else self.text
+
+
+class BuiltContext:
+    def __init__(self, text: str, passages: List[Passage], tokens: int, naive_tokens: int,
+                 merged: int, duplicates: int, dropped: int):
+        self.text = text
+        self.passages = passages
+        self.tokens = tokens
+        self.naive_tokens = naive_tokens
+        self.merged = merged
+        self.duplicates = duplicates
+        self.dropped = dropped
+
+    @property
+    def tokens_saved(self) -> int:
+        return self.naive_tokens - self.tokens
+
+    def stats(self) -> Dict:
+        return {
+            "tokens": self.tokens,
+            "naive_tokens": self.naive_tokens,
+            "tokens_saved": self.tokens_saved,
+            "passages": len(self.passages),
+            "merged": self.merged,
+            "duplicates": self.duplicates,
+            "dropped": self.dropped
+        }
+
+
+class ContextBuilder:
+    def __init__(self, max_tokens: int = MAX_TOKENS, tokenizer: Optional[Tokenizer] = None,
+                 near_duplicate: float = NEAR_DUPLICATE):
+        self.max_tokens = max_tokens
+        self.tokenizer = tokenizer or Tokenizer()
+        self.near_duplicate = near_duplicate
+
+    @staticmethod
+    def passages(results: Dict) -> List[Passage]:
+        """
+        Pasusi sa skorom iz retrieve() rezultata: "scores" (vece je bolje, cross encoder)
+        ili "distances" (manje je bolje); bez toga redosled je rang.
+        """
+        documents = results["documents"]
+        metadatas = results.get("metadatas") or [{}] * len(documents)
+        if results.get("scores") is not None:
+            scores = list(results["scores"])
+        elif results.get("distances") is not None:
+            scores = [-d for d in results["distances"]]
+        else:
+            scores = [-i for i in range(len(documents))]
+        return [Passage(doc, meta or {}, score) for doc, meta, score in zip(documents, metadatas, scores)]
+
+    def _adjacent(self, a: Passage, b: Passage) -> int:
+        """
+        0 ako a i b nisu susedni, inace koliko karaktera pocetka b preskociti pri spajanju
+        (-1 - susedni bez preklopa, spajaju se razmakom).
+        """
+        if a.source != b.source:
+            return 0
+        pages_a, pages_b = a.pages(), b.pages()
+        if pages_a is None or pages_b is None or not 0 <= pages_b[0] - pages_a[1] <= 1:
+            return 0
+        overlap = _overlap(a.text, b.text)
+        if overlap:
+            return overlap
+        # bez preklopa spajamo samo uzastopne chunkove (position iz corpus.py)
+        if "position" in a.metadata and "position" in b.metadata:
+            if int(b.metadata["position"]) - int(a.metadata["position"]) == 1:
+                return -1
+        return 0
+
+    def _merge(self, passages: List[Passage]):
+        merged = 0
+        # sortirano po izvoru i strani, pa proveravamo samo susedne parove
+        def order(p: Passage):
+            pages = p.pages() or (0, 0)
+            return p.source, int(p.metadata.get("position", -1)), pages[0]
+
+        result = []
+        for p in sorted(passages, key=order):
+            if result:
+                skip = self._adjacent(result[-1], p)
+                if skip:
+                    last = result[-1]
+                    last.text = last.text + (" " + p.text if skip < 0 else p.text[skip:])
+                    last.score = max(last.score, p.score)
+                    pages_last, pages_p = last.pages(), p.pages()
+                    if pages_last and pages_p:
+                        last.metadata["page_end"] = str(max(pages_last[1], pages_p[1]))
+                    if "position" in p.metadata:
+                        last.metadata["position"] = p.metadata["position"]
+                    merged += 1
+                    continue
+            result.append(p)
+        return result, merged
+
+    def _deduplicate(self, passages: List[Passage]):
+        # od najboljeg ka najgorem - zadrzavamo bolje rangiranu kopiju
+        kept, signatures = [], []
+        for p in sorted(passages, key=lambda p: p.score, reverse=True):
+            signature = minhash(p.text)
+            if any(similarity(signature, s) >= self.near_duplicate for s in signatures):
+                continue
+            kept.append(p)
+            signatures.append(signature)
+        return kept, len(passages) - len(kept)
+
+    def build(self, results: Dict) -> BuiltContext:
+        passages = self.passages(results)
+        merged_passages, merged = self._merge(passages)
+        unique, duplicates = self._deduplicate(merged_passages)
+
+        # pakovanje od najbolje rangiranog; pasus koji ne staje se preskace, manji mozda staje
+        formatted = [p.format() for p in unique]
+        costs = self.tokenizer.count(formatted + [SEPARATOR, str(results["documents"])])
+        separator_cost, naive_tokens = costs[-2], costs[-1]
+        packed, texts, tokens = [], [], 0
+        for p, text, cost in zip(unique, formatted, costs):
+            extra = cost + (separator_cost if packed else 0)
+            if tokens + extra > self.max_tokens:
+                continue
+            packed.append(p)
+            texts.append(text)
+            tokens += extra
+
+        return BuiltContext(SEPARATOR.join(texts), packed, tokens, naive_tokens,
+                            merged, duplicates, len(unique) - len(packed))
@@ -0,0 +1,187 @@
+'''
+Korpus od vise PDF-ova sa inkrementalnim (diferencijalnim) ingestom.
+
+Id dokumenta je hash (izvor, sadrzaj, parametri chunkovanja), pa isti tekst
+uvek dobija isti id. Manifest (PATH/corpus_manifest.json) pamti za svaki
+PDF hash fajla, parametre i id-jeve koji su vec u indexu. Pri ponovnom
+ingestu:
+- PDF sa istim hash-om i parametrima se preskace (ne parsira se uopste)
+- izmenjen PDF se parsira, a enkodiraju se i dodaju samo novi id-jevi
+- id-jevi kojih vise nema se brisu iz chroma kolekcije i FAISS indexa
+- postojecim id-jevima kojima se pomerio redni broj (position) menja se
+  samo metadata, bez ponovnog enkodiranja
+- PDF koji je nestao iz korpusa se brise ceo
+
+Korpus je direktorijum (svi *.pdf rekurzivno), jedan PDF ili manifest
+fajl sa putanjama (.txt - jedna po liniji, .json - lista).
+
+    sync_corpus(rag, "data", PARAGRAPHS)
+'''
+
+import os
+import json
+import hashlib
+from typing import Dict, Iterator, List, Optional
+from pdf_parser import PDFParser, MIN_PARAGRAPH_LENGTH
+from parse_cache import ParseCache, PARSER_VERSION, file_hash
+from ingest_pipeline import ingest
+
+MANIFEST_FILE = "corpus_manifest.json"
+MANIFEST_VERSION = 1
+
+# parametri jedinica koje idu u ragove (deo id-ja i manifesta)
+PARAGRAPHS = {"unit": "paragraph", "min_length": MIN_PARAGRAPH_LENGTH, "parser_version": PARSER_VERSION}
+CHUNKS = {"unit": "chunk", "chunk_size": 512, "overlap": 64, "parser_version": PARSER_VERSION}
+
+
+def list_sources(corpus: str) -> List[str]:
+    if os.path.isdir(corpus):
+        sources = [os.path.join(root, name) for root, _, files in os.walk(corpus)
+                   for name in files if name.lower().endswith(".pdf")]
+    elif corpus.endswith(".json"):
+        with open(corpus, "r", encoding="utf-8") as f:
+            sources = json.load(f)
+    elif corpus.endswith(".txt"):
+        with open(corpus, "r", encoding="utf-8") as f:
+            sources = [line.strip() for line in f if line.strip() and not line.startswith("#")]
+    else:
+        sources = [corpus]
+    return sorted(os.path.normpath(s) for s in sources)
+
+
+def chunk_id(source: str, content: str, params: Dict) -> str:
+    h = hashlib.sha1()
+    for part in (source, json.dumps(params, sort_keys=True), content):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return f"{params['unit']}_{h.hexdigest()[:24]}"
+
+
+def units(parser: PDFParser, params: Dict) -> Iterator[Dict]:
+    if params["unit"] == "paragraph":
+        return parser.iter_paragraphs()
+    return parser.iter_fixed_size_chunks(params["chunk_size"], params["overlap"])
+
+
+def to_document(doc_id: str, item: Dict, source: str, position: int) -> Dict:
+    return {
+        "id": doc_id,
+        "content": item["content"],
+        "metadata": {
+            "source": source,
+            # redni broj u izvoru - context_builder po njemu spaja susedne chunkove
+            "position": position,
+            "chapter": item["chapter"],
+            "chapter_number": item["chapter_number"],
+            "subchapter": item.get("subchapter", ""),
+            "page_start": str(item["page_start"]),
+            "page_end": str(item["page_end"])
+        }
+    }
+
+
+class Manifest:
+    def __init__(self, path: str):
+        self.path = os.path.join(path, MANIFEST_FILE)
+        self.sources: Dict[str, Dict] = {}
+        self.exists = os.path.exists(self.path)
+        if self.exists:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.sources = data["sources"]
+
+    def is_current(self, source: str, source_hash: str, params: Dict) -> bool:
+        entry = self.sources.get(source)
+        return entry is not None and entry["file_hash"] == source_hash and entry["params"] == params
+
+    def ids(self, source: str) -> List[str]:
+        return self.sources.get(source, {}).get("ids", [])
+
+    def positions(self, source: str) -> Dict[str, int]:
+        # stari manifest nema pozicije - tada se azuriraju svi zadrzani dokumenti
+        entry = self.sources.get(source, {})
+        return dict(zip(entry.get("ids", []), entry.get("positions", [])))
+
+    def save(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"version": MANIFEST_VERSION, "sources": self.sources}, f)
+        os.replace(tmp, self.path)
+        self.exists = True
+
+
+def sync_corpus(rag, corpus: str, params: Dict, workers: Optional[int] = None,
+                cache: Optional[ParseCache] = None, path: Optional[str] = None) -> Dict:
+    """
+    Dovodi rag u stanje korpusa. path - direktorijum manifesta (podrazumevano rag.vector_index.path).
+    Vraca broj dodatih, obrisanih i preskocenih dokumenata/izvora.
+    """
+    manifest = Manifest(path or rag.vector_index.path)
+    sources = list_sources(corpus)
+    summary = {"added": 0, "deleted": 0, "repositioned": 0, "unchanged_sources": 0, "removed_sources": 0}
+
+    if not manifest.exists and rag.collection.count() > 0:
+        # kolekcija iz vremena pozicionih id-jeva (para_i/chunk_i) - ne znamo kom izvoru pripada
+        legacy = list(rag.collection.get(include=[])["ids"])
+        print(f"No corpus manifest, removing {len(legacy)} documents with positional ids")
+        rag.delete_documents(legacy)
+        summary["deleted"] += len(legacy)
+
+    for source in sources:
+        source_hash = file_hash(source)
+        if manifest.is_current(source, source_hash, params):
+            summary["unchanged_sources"] += 1
+            continue
+
+        print(f"Ingesting {source}...")
+        old = set(manifest.ids(source))
+        old_positions = manifest.positions(source)
+        seen: Dict[str, int] = {}
+        moved: List[Dict] = []
+
+        def new_documents() -> Iterator[Dict]:
+            parser = PDFParser(source, workers=workers, cache=cache)
+            for position, item in enumerate(units(parser, params)):
+                doc_id = chunk_id(source, item["content"], params)
+                # isti tekst dvaput u istom PDF-u je isti dokument
+                if doc_id in seen:
+                    continue
+                seen[doc_id] = position
+                if doc_id not in old:
+                    yield to_document(doc_id, item, source, position)
+                elif old_positions.get(doc_id) != position:
+                    # isti tekst, ali se ispred njega nesto dodalo/obrisalo
+                    moved.append(to_document(doc_id, item, source, position))
+
+        stats = ingest(rag, new_documents())
+        summary["added"] += stats[-1]["docs"]
+
+        vanished = [doc_id for doc_id in old if doc_id not in seen]
+        if vanished:
+            rag.delete_documents(vanished)
+            summary["deleted"] += len(vanished)
+        if moved:
+            rag.update_metadata([doc["id"] for doc in moved], [doc["metadata"] for doc in moved])
+            summary["repositioned"] += len(moved)
+        print(f"  {source}: +{stats[-1]['docs']} / -{len(vanished)} / ~{len(moved)} documents, {len(seen)} total")
+
+        # manifest posle svakog izvora, da prekid ne izgubi ono sto je vec uradjeno
+        manifest.sources[source] = {"file_hash": source_hash, "params": params,
+                                    "ids": list(seen), "positions": list(seen.values())}
+        manifest.save()
+
+    removed = [source for source in manifest.sources if source not in sources]
+    for source in removed:
+        ids = manifest.ids(source)
+        print(f"Source {source} is gone, removing {len(ids)} documents")
+        if ids:
+            rag.delete_documents(ids)
+        summary["deleted"] += len(ids)
+        summary["removed_sources"] += 1
+        del manifest.sources[source]
+    if removed or not manifest.exists:
+        manifest.save()
+
+    print(f"Corpus synced: {summary}")
+    return summary
@@ -3,7 +3,7 @@ import warnings
 import logging
 import sys
 
-def disable_warning_messages():
+def disable_warning_messages(redirect_stderr: bool = True):
     """
     VAŽNO: Ova funkcija MORA biti pozvana PRE importa bilo koje biblioteke!
     """
@@ -26,5 +26,7 @@ def disable_warning_messages():
     logging.getLogger('protobuf').setLevel(logging.ERROR)
     
     # 4. Privremeno redirectuj stderr (za protobuf greške)
-    import io
-    sys.stderr = io.StringIO()
\ No newline at end of file
+    # main ga ostavlja, da se traceback-ovi i dalje vide
+    if redirect_stderr:
+        import io
+        sys.stderr = io.StringIO()
\ No newline at end of file
@@ -0,0 +1,184 @@
+'''
+Kompaktno skladiste dokumenata i metadata poravnato sa FAISS labelama.
+
+Red i u skladistu je dokument sa FAISS labelom i, pa retrieval posle
+pretrage ne ide u chroma db nego samo cita nizove u memoriji, i redosled
+rezultata je uvek isti kao redosled iz FAISS-a.
+
+Tekst je jedan utf-8 blob sa offsetima, a chapter/page metadata su int32
+kolone (-1 = nema vrednosti); vrednost koja nije broj ostaje u json extra
+koloni, pa se metadata vraca nepromenjena. Sve se cuva kao .npy i pri startu mmapuje.
+Nizovi imaju rezervu kapaciteta (kao list), pa append kopira samo nove
+vrednosti - ne ceo korpus - osim pri prvom appendu posle mmap ucitavanja.
+'''
+
+import os
+import json
+from typing import Dict, List, Optional, Sequence
+import numpy as np
+
+# metadata polja koja cuvamo kao int32 kolone (u chroma su stringovi)
+INT_COLUMNS = ("chapter", "chapter_number", "page_start", "page_end")
+STRING_COLUMNS = ("subchapter", "source")
+MISSING = -1
+
+
+def _to_int(value) -> int:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return MISSING
+
+
+def _extra(metadata: Dict) -> str:
+    """
+    Json za extra kolonu: polja bez kolone i vrednosti koje kolone ne vracaju
+    tacno (nebrojevi u int kolonama, brojevi umesto stringova, prazni stringovi),
+    pa metadata(row) vraca isti dict koji je upisan.
+    """
+    extra = {}
+    for key, value in metadata.items():
+        if key in INT_COLUMNS:
+            number = _to_int(value)
+            if number != MISSING and str(number) == value:
+                continue
+        elif key in STRING_COLUMNS and isinstance(value, str) and value:
+            continue
+        extra[key] = value
+    return json.dumps(extra) if extra else ""
+
+
+class GrowableArray:
+    """
+    Niz sa rezervom kapaciteta po prvoj osi; append je amortizovano O(novih redova).
+    values je pogled na popunjeni deo (mmapovan niz se kopira tek pri prvom appendu).
+    """
+    def __init__(self, values: np.ndarray):
+        self._data = values
+        self.size = len(values)
+
+    @property
+    def values(self) -> np.ndarray:
+        return self._data[:self.size]
+
+    def append(self, new: np.ndarray) -> np.ndarray:
+        needed = self.size + len(new)
+        if needed > len(self._data) or not self._data.flags.writeable:
+            grown = np.empty((max(needed, 2 * len(self._data), 16),) + self._data.shape[1:], dtype=self._data.dtype)
+            grown[:self.size] = self._data[:self.size]
+            self._data = grown
+        self._data[self.size:needed] = new
+        self.size = needed
+        return self.values
+
+
+class StringColumn:
+    """
+    Niz stringova kao jedan utf-8 blob + offseti.
+    """
+    def __init__(self, blob: Optional[np.ndarray] = None, offsets: Optional[np.ndarray] = None):
+        self._blob = GrowableArray(blob if blob is not None else np.zeros(0, dtype='uint8'))
+        self._offsets = GrowableArray(offsets if offsets is not None else np.zeros(1, dtype='int64'))
+        self.blob = self._blob.values
+        self.offsets = self._offsets.values
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def append(self, values: Sequence[str]):
+        encoded = [v.encode("utf-8") for v in values]
+        lengths = np.fromiter((len(e) for e in encoded), dtype='int64', count=len(encoded))
+        self.blob = self._blob.append(np.frombuffer(b"".join(encoded), dtype='uint8'))
+        self.offsets = self._offsets.append(self.offsets[-1] + np.cumsum(lengths))
+
+    def get(self, row: int) -> str:
+        return self.blob[self.offsets[row]:self.offsets[row + 1]].tobytes().decode("utf-8")
+
+    def save(self, prefix: str):
+        _save_npy(prefix + "_blob.npy", self.blob)
+        _save_npy(prefix + "_offsets.npy", self.offsets)
+
+    @classmethod
+    def load(cls, prefix: str, mmap: bool = True) -> "StringColumn":
+        mode = 'r' if mmap else None
+        return cls(np.load(prefix + "_blob.npy", mmap_mode=mode), np.load(prefix + "_offsets.npy", mmap_mode=mode))
+
+
+def _save_npy(path: str, array: np.ndarray):
+    tmp = path[:-len(".npy")] + ".tmp.npy"
+    np.save(tmp, np.asarray(array))
+    os.replace(tmp, path)
+
+
+class DocStore:
+    def __init__(self):
+        self.text = StringColumn()
+        self.int_columns = {name: np.zeros(0, dtype='int32') for name in INT_COLUMNS}
+        self._int_buffers: Dict[str, GrowableArray] = {}
+        self.string_columns = {name: StringColumn() for name in STRING_COLUMNS}
+        # ostala metadata polja kao json po redu
+        self.extra = StringColumn()
+
+    def __len__(self) -> int:
+        return len(self.text)
+
+    def append(self, documents: List[str], metadatas: Optional[List[Dict]] = None):
+        metadatas = metadatas or [{} for _ in documents]
+        self.text.append(documents)
+        for name in INT_COLUMNS:
+            values = np.array([_to_int(m.get(name)) for m in metadatas], dtype='int32')
+            if name not in self._int_buffers:
+                self._int_buffers[name] = GrowableArray(self.int_columns[name])
+            self.int_columns[name] = self._int_buffers[name].append(values)
+        for name in STRING_COLUMNS:
+            self.string_columns[name].append([str(m.get(name, "")) for m in metadatas])
+        self.extra.append([_extra(m) for m in metadatas])
+
+    def document(self, row: int) -> str:
+        return self.text.get(row)
+
+    def documents(self, rows: Sequence[int]) -> List[str]:
+        return [self.text.get(row) for row in rows]
+
+    def metadata(self, row: int) -> Dict:
+        meta = {}
+        for name in INT_COLUMNS:
+            value = int(self.int_columns[name][row])
+            if value != MISSING:
+                # chroma metadata u ovom projektu cuva brojeve kao stringove
+                meta[name] = str(value)
+        for name in STRING_COLUMNS:
+            value = self.string_columns[name].get(row)
+            # prazan string - kolona nije postojala (ili je u extra)
+            if value:
+                meta[name] = value
+        extra = self.extra.get(row)
+        if extra:
+            meta.update(json.loads(extra))
+        return meta
+
+    def metadatas(self, rows: Sequence[int]) -> List[Dict]:
+        return [self.metadata(row) for row in rows]
+
+    def save(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.text.save(os.path.join(directory, "text"))
+        self.extra.save(os.path.join(directory, "extra"))
+        for name, column in self.string_columns.items():
+            column.save(os.path.join(directory, name))
+        for name, values in self.int_columns.items():
+            _save_npy(os.path.join(directory, name + ".npy"), values)
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> Optional["DocStore"]:
+        store = cls()
+        try:
+            store.text = StringColumn.load(os.path.join(directory, "text"), mmap)
+            store.extra = StringColumn.load(os.path.join(directory, "extra"), mmap)
+            for name in STRING_COLUMNS:
+                store.string_columns[name] = StringColumn.load(os.path.join(directory, name), mmap)
+            for name in INT_COLUMNS:
+                store.int_columns[name] = np.load(os.path.join(directory, name + ".npy"), mmap_mode='r' if mmap else None)
+        except (OSError, ValueError):
+            return None
+        return store
@@ -0,0 +1,182 @@
+'''
+Trajni kes embeddinga po sadrzaju teksta.
+
+Kljuc je (model, backend, normalizacija, hash teksta), pa isti paragraf
+nije potrebno ponovo enkodirati posle brisanja kolekcije, promene
+chunk_size/overlap (nepromenjeni chunkovi) ili ponovnog buildanja raga.
+Oba raga dele isti kes - razliciti modeli su razliciti prostori.
+
+Za svaki prostor (direktorijum po hash-u kljuca modela):
+- vectors.f16 - float16 vektori, red po red, mmapuju se pri citanju
+- index.bin   - uint64 hash teksta za svaki red (append-only)
+- meta.json   - model, backend, normalizacija, dimenzija
+
+Novi redovi se dopisuju: prvo vektori, pa index - red postoji tek kad je
+njegov hash u indexu, pa prekinut upis ostavlja samo visak u vectors.f16
+koji se odsece pri sledecem ucitavanju. vectors.f16 se prosiruje unapred
+(kao list), pa se memmap pravi ponovo samo kad novi redovi ne stanu. I novi vektori prolaze kroz
+float16, pa isti tekst uvek daje isti vektor (pogodak ili promasaj).
+'''
+
+import os
+import json
+import hashlib
+import threading
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import telemetry
+
+CACHE_DIR = "./embedding_cache"
+VECTORS_FILE = "vectors.f16"
+INDEX_FILE = "index.bin"
+META_FILE = "meta.json"
+# najmanja rezerva redova pri prosirivanju vectors.f16
+MIN_CAPACITY = 1024
+
+
+def text_hash(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little")
+
+
+def _space_name(model_name: str, backend: str, normalize: bool) -> str:
+    key = json.dumps([model_name, backend, normalize])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+class _Space:
+    """
+    Vektori jednog (model, backend, normalizacija) prostora.
+    """
+    def __init__(self, directory: str, meta: Dict):
+        self.directory = directory
+        self.meta = meta
+        self.dim: Optional[int] = meta.get("dim")
+        self.rows: Dict[int, int] = {}
+        self.vectors: Optional[np.ndarray] = None
+        # broj redova za koje vectors.f16 (i memmap) ima mesta
+        self.capacity = 0
+        self.hits = 0
+        self.misses = 0
+        self._load()
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def _load(self):
+        if self.dim is None or not os.path.exists(self._path(INDEX_FILE)):
+            return
+        keys = np.fromfile(self._path(INDEX_FILE), dtype='uint64')
+        row_bytes = self.dim * 2
+        if not os.path.exists(self._path(VECTORS_FILE)):
+            open(self._path(VECTORS_FILE), "wb").close()
+        count = min(len(keys), os.path.getsize(self._path(VECTORS_FILE)) // row_bytes)
+        # odsecamo ostatke prekinutog upisa (vektori bez indexa ili obrnuto)
+        for name, size in ((INDEX_FILE, count * 8), (VECTORS_FILE, count * row_bytes)):
+            if os.path.getsize(self._path(name)) != size:
+                with open(self._path(name), "r+b") as f:
+                    f.truncate(size)
+        self.rows = {int(key): row for row, key in enumerate(keys[:count])}
+        if count:
+            self._map(count)
+
+    def _map(self, capacity: int):
+        # fajl se prosiruje nulama; redovi van self.rows nisu u indexu pa se nikad ne citaju
+        with open(self._path(VECTORS_FILE), "ab") as f:
+            f.truncate(capacity * self.dim * 2)
+        self.vectors = np.memmap(self._path(VECTORS_FILE), dtype='float16', mode='r+',
+                                 shape=(capacity, self.dim))
+        self.capacity = capacity
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def lookup(self, hashes: List[int]) -> np.ndarray:
+        return np.array([self.rows.get(h, -1) for h in hashes], dtype='int64')
+
+    def get(self, rows: np.ndarray) -> np.ndarray:
+        return np.asarray(self.vectors[rows], dtype='float32')
+
+    def add(self, hashes: List[int], vectors: np.ndarray):
+        if self.dim is None:
+            self.dim = vectors.shape[1]
+            self.meta["dim"] = self.dim
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(META_FILE), "w", encoding="utf-8") as f:
+                json.dump(self.meta, f, indent=2)
+        fresh = [(h, i) for i, h in enumerate(hashes) if h not in self.rows]
+        if not fresh:
+            return
+        start = len(self.rows)
+        end = start + len(fresh)
+        if end > self.capacity:
+            self._map(max(end, 2 * self.capacity, MIN_CAPACITY))
+        self.vectors[start:end] = vectors[[i for _, i in fresh]]
+        self.vectors.flush()
+        with open(self._path(INDEX_FILE), "ab") as f:
+            f.write(np.array([h for h, _ in fresh], dtype='uint64').tobytes())
+        for h, _ in fresh:
+            self.rows[h] = len(self.rows)
+
+
+class EmbeddingCache:
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+        self._spaces: Dict[str, _Space] = {}
+        self._lock = threading.Lock()
+
+    def _space(self, model_name: str, backend: str, normalize: bool) -> _Space:
+        name = _space_name(model_name, backend, normalize)
+        if name not in self._spaces:
+            directory = os.path.join(self.cache_dir, name)
+            meta = {"model": model_name, "backend": backend, "normalize": normalize}
+            try:
+                with open(os.path.join(directory, META_FILE), "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                pass
+            self._spaces[name] = _Space(directory, meta)
+        return self._spaces[name]
+
+    def encode(self, model_name: str, backend: str, normalize: bool, texts: List[str],
+               encode: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        """
+        Embeddinzi za texts (float32, redosled kao texts); model (encode) dobija
+        samo tekstove kojih nema u kesu, svaki jedinstveni tekst jednom.
+        """
+        if not texts:
+            return np.asarray(encode([]), dtype='float32')
+        hashes = [text_hash(text) for text in texts]
+        with self._lock:
+            space = self._space(model_name, backend, normalize)
+            rows = space.lookup(hashes)
+            # i ponovljeni tekstovi unutar istog poziva se enkoduju jednom
+            missing = {}
+            for i in np.flatnonzero(rows < 0):
+                missing.setdefault(hashes[i], i)
+            hits = int((rows >= 0).sum())
+            space.hits += hits
+            space.misses += len(missing)
+        telemetry.count("embedding_cache", hits, state="hit", model=model_name)
+        telemetry.count("embedding_cache", len(missing), state="miss", model=model_name)
+
+        if missing:
+            fresh = np.asarray(encode([texts[i] for i in missing.values()]), dtype='float32')
+            with self._lock:
+                space.add(list(missing), fresh)
+                rows = space.lookup(hashes)
+        with self._lock:
+            return space.get(rows)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            result = {}
+            for space in self._spaces.values():
+                lookups = space.hits + space.misses
+                normalized = "/normalized" if space.meta["normalize"] else ""
+                result[f"{space.meta['model']}[{space.meta['backend']}{normalized}]"] = {
+                    "entries": len(space),
+                    "hits": space.hits,
+                    "misses": space.misses,
+                    "hit_rate": space.hits / lookups if lookups else 0.0
+                }
+            return result
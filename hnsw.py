@@ -7,108 +7,265 @@ fixed size chunkingom
 Celobrojnom kvantizacijom
 '''
 
-from chromadb.config import Settings
-import chromadb
+import threading
+from concurrent.futures import Future
 from typing import List, Optional, Dict
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer, CrossEncoder
+import model_registry
+import telemetry
+from query_cache import QueryCache
+from embedding_cache import EmbeddingCache
 
 COLLECTION_NAME = "hnsw"
 PATH = "./hnsw"
+# podrazumevani index; tuning (ann_index.py) cuva izabrani u PATH/index_config.json
+INDEX_CONFIG = {"type": "hnsw_sq8", "M": 32, "efConstruction": 40, "efSearch": 16}
+# udeo SQ8 vrednosti van treniranog opsega posle kog se kvantizator ponovo trenira
+RETRAIN_THRESHOLD = 0.01
 
 
 class HnswRAG:
         def __init__(self, 
-                     embedding_model: str = "BAAI/bge-large-en-v1.5"):
-                self.embedding_model = SentenceTransformer(embedding_model)
-                self.embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
-                self.index = None
-
-                # Inicijalizacija ChromaDB with persistence
-                self.chroma = chromadb.PersistentClient(path=PATH)
-                self.collection = self.chroma.get_or_create_collection(COLLECTION_NAME)
-                
-                # ako vec postoje informacije odmah buildamo index
-                self._build_index()
+                     embedding_model: str = "BAAI/bge-large-en-v1.5",
+                     retrain_threshold: float = RETRAIN_THRESHOLD,
+                     cache: Optional[QueryCache] = None,
+                     backend: str = "torch",
+                     threads: Optional[int] = None,
+                     index_config: Optional[Dict] = None,
+                     shards: int = 1,
+                     shard_by: str = "source",
+                     embedding_cache: Optional[EmbeddingCache] = None):
+                # backend: "torch", "onnx" ili "onnx-int8" (vidi onnx_backend.py)
+                # shards > 1 - index podeljen po izvornom PDF-u ili hash-u id-ja (vidi sharded_index.py)
+                # model, chroma i FAISS se ucitavaju tek pri prvoj upotrebi (ili u warmup())
+                self.embedding_model_name = embedding_model
+                self.backend = backend
+                self.threads = threads
+                self.retrain_threshold = retrain_threshold
+                self.index_config = index_config
+                self.shards = shards
+                self.shard_by = shard_by
+                self.cache = cache
+                # embeddinzi dokumenata po sadrzaju, deljeni izmedju ragova i pokretanja (vidi embedding_cache.py)
+                self.embedding_cache = embedding_cache
+                self.chroma = None
+                self._collection = None
+                self._vector_index = None
+                self._lock = threading.RLock()
 
-        def add_documents(self, documents: List[str], ids: Optional[List[str]] = None, 
-                         metadatas: Optional[List[Dict]] = None):
-                # Generisanje ID-jeva ako nisu dostavljeni
-                if ids is None:
-                        ids = [str(i) for i in range(len(documents))]
-                
+        @property
+        def embedding_model(self):
+                # deljen sa drugim instancama kroz registar (vidi model_registry.py)
+                return model_registry.get_embedding_model(self.embedding_model_name, self.backend, self.threads)
+
+        @property
+        def embedding_dim(self) -> int:
+                return model_registry.embedding_dim(self.embedding_model_name, self.backend, self.threads)
+
+        @property
+        def collection(self):
+                if self._collection is None:
+                        with self._lock:
+                                if self._collection is None:
+                                        import chromadb
+                                        # Inicijalizacija ChromaDB with persistence
+                                        self.chroma = chromadb.PersistentClient(path=PATH)
+                                        self._collection = self.chroma.get_or_create_collection(COLLECTION_NAME)
+                return self._collection
+
+        @property
+        def vector_index(self):
+                # lock jer warmup() ucitava index u pozadinskoj niti (RLock - _load_index trazi i kolekciju)
+                if self._vector_index is None:
+                        with self._lock:
+                                if self._vector_index is None:
+                                        self._vector_index = self._load_index()
+                return self._vector_index
+
+        def _load_index(self):
+                from ann_index import load_config
+
+                # M = 32 (broj linkova po čvoru), SQ8 kvantizacija ako nije drugacije podeseno
+                config = self.index_config or load_config(PATH, INDEX_CONFIG)
+                if self.shards > 1:
+                        from sharded_index import ShardedVectorIndex
+                        index = ShardedVectorIndex(
+                                PATH, self.embedding_dim, self.collection, config,
+                                shards=self.shards, shard_by=self.shard_by,
+                                retrain_threshold=self.retrain_threshold
+                        )
+                else:
+                        from vector_index import VectorIndex
+                        index = VectorIndex(
+                                PATH, self.embedding_dim, self.collection,
+                                config=config, retrain_threshold=self.retrain_threshold
+                        )
+                # ako vec postoje informacije odmah buildamo index (ili ucitamo sa diska)
+                with telemetry.span("build_index", rag=COLLECTION_NAME):
+                        index.load_or_build()
+                if index.index is None:
+                        print("No embeddings in ChromaDB yet")
+                return index
+
+        def warmup(self, index: bool = True) -> List[Future]:
+                # model (i index) se ucitavaju u pozadini; prva upotreba ceka samo ako nisu gotovi
+                futures = model_registry.warmup([
+                        (model_registry.EMBEDDING, self.embedding_model_name, self.backend, self.threads)
+                ])
+                if index:
+                        futures.append(model_registry.run_in_background(lambda: self.vector_index))
+                return futures
+
+        def encode_documents(self, documents: List[str], show_progress_bar: bool = True) -> np.ndarray:
                 batch_size = 64
-                total_docs = len(documents)
-                
-                print(f"Encoding {total_docs} documents in batches of {batch_size}...")
-                
-                all_embeddings = self.embedding_model.encode(
-                    documents,
-                    batch_size=batch_size,
-                    show_progress_bar=True,
-                    convert_to_numpy=True,
-                    normalize_embeddings=True
-                )
+                if show_progress_bar:
+                        print(f"Encoding {len(documents)} documents in batches of {batch_size}...")
+                def encode(texts: List[str]) -> np.ndarray:
+                        return self.embedding_model.encode(
+                            texts,
+                            batch_size=batch_size,
+                            show_progress_bar=show_progress_bar,
+                            convert_to_numpy=True,
+                            normalize_embeddings=True
+                        )
 
+                with telemetry.span("encode_documents", rag=COLLECTION_NAME, documents=len(documents)):
+                        if self.embedding_cache is None:
+                                return encode(documents)
+                        # model dobija samo tekstove kojih nema u kesu
+                        return self.embedding_cache.encode(self.embedding_model_name, self.backend, True,
+                                                           documents, encode)
+
+        def _write_to_chroma(self, write, documents: List[str], ids: List[str],
+                             metadatas: Optional[List[Dict]], all_embeddings: np.ndarray):
                 # size batcha za chroma db je 5000
                 chroma_batch_size = 5000
+                total_docs = len(documents)
                 for i in range(0, total_docs, chroma_batch_size):
                         end_idx = min(i + chroma_batch_size, total_docs)
                         batch_docs = documents[i:end_idx]
                         batch_ids = ids[i:end_idx]
                         batch_metadatas = metadatas[i:end_idx] if metadatas else None
-                        batch_embeddings = all_embeddings[i:end_idx].tolist()
+                        # chroma prima numpy direktno, bez .tolist() kopije
+                        batch_embeddings = all_embeddings[i:end_idx]
                         
                         if batch_metadatas:
-                                self.collection.add(documents=batch_docs, embeddings=batch_embeddings, 
-                                                  ids=batch_ids, metadatas=batch_metadatas)
+                                write(documents=batch_docs, embeddings=batch_embeddings, 
+                                      ids=batch_ids, metadatas=batch_metadatas)
                         else:
-                                self.collection.add(documents=batch_docs, embeddings=batch_embeddings, ids=batch_ids)
+                                write(documents=batch_docs, embeddings=batch_embeddings, ids=batch_ids)
                         
                         print(f"Added batch {i//chroma_batch_size + 1}: {len(batch_docs)} documents to ChromaDB")
+
+        def add_documents(self, documents: List[str], ids: Optional[List[str]] = None, 
+                         metadatas: Optional[List[Dict]] = None):
+                # Generisanje ID-jeva ako nisu dostavljeni
+                if ids is None:
+                        ids = [str(i) for i in range(len(documents))]
+                if not documents:
+                        return
                 
+                with telemetry.span("add_documents", rag=COLLECTION_NAME, documents=len(documents)):
+                        all_embeddings = self.encode_documents(documents)
+                        self.add_encoded(documents, ids, metadatas, all_embeddings)
                 print(f"Finished: Added {len(documents)} documents to ChromaDB")
 
-                # odmah buildamo index posle dodavanja podataka
-                self._build_index()
+        def add_encoded(self, documents: List[str], ids: List[str], metadatas: Optional[List[Dict]],
+                        embeddings: np.ndarray, save: bool = True):
+                # vec enkodirani dokumenti - chroma pa index (koristi i ingest_pipeline)
+                with telemetry.span("chroma_write", rag=COLLECTION_NAME, documents=len(documents)):
+                        self._write_to_chroma(self.collection.add, documents, ids, metadatas, embeddings)
 
-        def _build_index(self):
-                # svi dokumenti iz chroma db
-                results = self.collection.get(include=['embeddings', 'documents'])
-        
-                if results['embeddings'] is None or len(results['embeddings']) == 0:
-                        print("No embeddings in ChromaDB yet")
+                # u index dodajemo samo nove vektore
+                with telemetry.span("index_add", rag=COLLECTION_NAME, documents=len(documents)):
+                        self.vector_index.add(ids, embeddings, documents, metadatas)
+                if save:
+                        # snimanje u pozadini - add ne ceka na prepisivanje indexa, docstore-a i BM25
+                        self.vector_index.save_in_background()
+
+        def update_documents(self, documents: List[str], ids: List[str],
+                             metadatas: Optional[List[Dict]] = None):
+                if not documents:
                         return
-                embeddings = np.array(results['embeddings']).astype('float32')
-                
-                # M = 32 (broj linkova po čvoru)
-                print("Building HNSW index with Scalar Quantization (SQ8)...")
-                self.index = faiss.IndexHNSWSQ(self.embedding_dim, faiss.ScalarQuantizer.QT_8bit, 32)
-                
-                # trening za kvantizaciju
-                print("Training index...")
-                self.index.train(embeddings)
-                
-                print("Adding vectors to index...")
-                self.index.add(embeddings)
-                
-                self.doc_id_mapping = results['ids']
-                print(f"Index built with {len(embeddings)} vectors using SQ8 quantization")
-
-        def retrieve(self, query: str, top_k: int = 5) -> Dict:
-                # vektor za query
-                query_emb = self.embedding_model.encode([query]).astype('float32')
-                distances, indices = self.index.search(query_emb, top_k)
-                # id-jevi i rezultati
-                doc_ids = [self.doc_id_mapping[i] for i in indices[0]]
-                chroma_results = self.collection.get(ids=doc_ids, include=['documents', 'metadatas'])
-                
-                return {
-                        "documents": chroma_results['documents'],
-                        "doc_ids": doc_ids,
-                        "metadatas": chroma_results.get('metadatas', []),
-                        "distances": distances[0].tolist()
-                }
-
-            
+                all_embeddings = self.encode_documents(documents)
+                self._write_to_chroma(self.collection.upsert, documents, ids, metadatas, all_embeddings)
+
+                self.vector_index.remove(ids)
+                self.vector_index.add(ids, all_embeddings, documents, metadatas)
+                self.vector_index.save_in_background()
+
+        def update_metadata(self, ids: List[str], metadatas: List[Dict]):
+                # menja se samo metadata - tekst i vektori se citaju iz chroma db, bez enkodiranja
+                batch_size = 5000
+                for i in range(0, len(ids), batch_size):
+                        batch_ids = ids[i:i + batch_size]
+                        batch_metadatas = metadatas[i:i + batch_size]
+                        rows = self.collection.get(ids=batch_ids, include=['embeddings', 'documents'])
+                        by_id = {doc_id: (emb, doc) for doc_id, emb, doc
+                                 in zip(rows['ids'], rows['embeddings'], rows['documents'])}
+                        embeddings = np.array([by_id[doc_id][0] for doc_id in batch_ids], dtype='float32')
+                        documents = [by_id[doc_id][1] for doc_id in batch_ids]
+
+                        self.collection.update(ids=batch_ids, metadatas=batch_metadatas)
+                        self.vector_index.remove(batch_ids)
+                        self.vector_index.add(batch_ids, embeddings, documents, batch_metadatas)
+                if ids:
+                        self.vector_index.save_in_background()
+
+        def delete_documents(self, ids: List[str]):
+                self.collection.delete(ids=ids)
+                self.vector_index.remove(ids)
+                self.vector_index.save_in_background()
+
+        def _build_index(self, force: bool = False):
+                with telemetry.span("build_index", rag=COLLECTION_NAME, force=force):
+                        self.vector_index.load_or_build(force=force)
+                if self.vector_index.index is None:
+                        print("No embeddings in ChromaDB yet")
+
+        def retrieve(self, query: str, top_k: int = 5, filter: Optional[Dict] = None) -> Dict:
+                # filter po metadata, npr. {"chapter": 20} ili {"pages": [349, 373]} (vidi metadata_filter.py)
+                return self.retrieve_many([query], top_k=top_k, filter=filter)[0]
+
+        def _encode_queries(self, queries: List[str]) -> np.ndarray:
+                # vektori za sve queryje u jednom forward passu, normalizovani kao i korpus
+                with telemetry.span("encode_queries", rag=COLLECTION_NAME, queries=len(queries)):
+                        return self.embedding_model.encode(queries, batch_size=64, normalize_embeddings=True).astype('float32')
+
+        def retrieve_many(self, queries: List[str], top_k: int = 5, filter: Optional[Dict] = None) -> List[Dict]:
+                with telemetry.span("retrieve", rag=COLLECTION_NAME, queries=len(queries), top_k=top_k,
+                                    filtered=bool(filter)):
+                        # kes je po (upit, top_k), pa filtrirani upiti idu mimo njega
+                        if self.cache is None or filter:
+                                return self._search_batch(queries, self._encode_queries(queries), top_k, filter)
+                        return self.cache.retrieve_many(
+                                self.vector_index.version, queries, top_k,
+                                self._encode_queries,
+                                lambda batch, embs: self._search_batch(batch, embs, top_k)
+                        )
+
+        def _search_batch(self, queries: List[str], query_embs: np.ndarray, top_k: int,
+                          filter: Optional[Dict] = None) -> List[Dict]:
+                # pretraga i citanje dokumenata nad istim stanjem indexa (add/remove cekaju)
+                with self.vector_index.lock:
+                        return self._search_and_fetch(query_embs, top_k, filter)
+
+        def _search_and_fetch(self, query_embs: np.ndarray, top_k: int, filter: Optional[Dict]) -> List[Dict]:
+                # jedna matricna pretraga za sve queryje
+                with telemetry.span("faiss_search", rag=COLLECTION_NAME, queries=len(query_embs), k=top_k):
+                        distances, labels = self.vector_index.search(query_embs, top_k, filter=filter)
+
+                # dokumenti i metadata po FAISS labeli, bez chroma upita
+                docs = self.vector_index.docs
+                results = []
+                with telemetry.span("docstore_fetch", rag=COLLECTION_NAME):
+                        for row_labels, row_distances in zip(labels, distances):
+                                found = row_labels >= 0
+                                row_labels = row_labels[found]
+                                results.append({
+                                        "documents": docs.documents(row_labels),
+                                        "doc_ids": self.vector_index.doc_ids(row_labels),
+                                        "metadatas": docs.metadatas(row_labels),
+                                        "distances": row_distances[found].tolist()
+                                })
+                return results
@@ -0,0 +1,161 @@
+'''
+Cuvanje FAISS indexa na disku.
+
+Index se pise sa faiss.write_index i pri startu se mmapuje, tako da
+restart ne mora ponovo da trenira kvantizator i ubacuje sve vektore.
+Uz index cuvamo doc_id_mapping i otisak (fingerprint) chroma kolekcije -
+id-jeva, tekstova i metadata; ako se kolekcija u medjuvremenu promenila
+(i izmenjen dokument pod istim id-jem), index se builda iz pocetka.
+
+BackgroundSaver snima u pozadinskoj niti, pa inkrementalni add ne ceka
+na prepisivanje indexa, docstore-a i BM25 fajlova; zahtevi koji stignu
+dok snimanje ceka se spajaju u jedno snimanje.
+'''
+
+import os
+import json
+import hashlib
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Iterable, Optional, Tuple
+import faiss
+
+INDEX_FILE = "faiss.index"
+META_FILE = "faiss_meta.json"
+# povecati kad se promeni format fajlova
+FORMAT_VERSION = 4
+
+
+def entry_hash(doc_id: str, document: Optional[str] = None, metadata: Optional[Dict] = None) -> int:
+    h = hashlib.sha1()
+    for part in (doc_id, document or "", json.dumps(metadata or {}, sort_keys=True, default=str)):
+        h.update(part.encode("utf-8"))
+        h.update(b"\0")
+    return int.from_bytes(h.digest()[:8], "little")
+
+
+def docs_fingerprint(ids: Iterable[str], documents: Optional[Iterable[str]] = None,
+                     metadatas: Optional[Iterable[Optional[Dict]]] = None) -> Dict:
+    """
+    Otisak kolekcije: broj dokumenata i XOR hash (id, tekst, metadata) svakog.
+    Izmenjen tekst ili metadata pod istim id-jem menja otisak. XOR ne zavisi
+    od redosleda, pa se moze azurirati inkrementalno.
+    """
+    ids = list(ids)
+    documents = documents if documents is not None else [None] * len(ids)
+    metadatas = metadatas if metadatas is not None else [None] * len(ids)
+    return update_fingerprint({"count": 0, "content_hash": format(0, "016x")},
+                              added=zip(ids, documents, metadatas))
+
+
+def update_fingerprint(fingerprint: Dict, added: Iterable[Tuple] = (), removed: Iterable[Tuple] = ()) -> Dict:
+    """
+    added/removed - trojke (id, tekst, metadata).
+    """
+    count = fingerprint["count"]
+    content_hash = int(fingerprint["content_hash"], 16)
+    for entry in added:
+        content_hash ^= entry_hash(*entry)
+        count += 1
+    for entry in removed:
+        content_hash ^= entry_hash(*entry)
+        count -= 1
+    return {"count": count, "content_hash": format(content_hash, "016x")}
+
+
+def collection_fingerprint(collection) -> Dict:
+    rows = collection.get(include=['documents', 'metadatas'])
+    return docs_fingerprint(rows['ids'], rows['documents'], rows['metadatas'])
+
+
+class IndexStore:
+    def __init__(self, path: str, kind: str, loader: Optional[Callable[[str, bool], object]] = None):
+        # kind opisuje tip indexa, npr. "hnsw_sq8_m32" - promena tipa invalidira fajl
+        self.kind = kind
+        # loader/write() za indexe koji nisu obicni faiss.Index (npr. binarni)
+        self.loader = loader
+        self.index_path = os.path.join(path, INDEX_FILE)
+        self.meta_path = os.path.join(path, META_FILE)
+
+    def load(self, fingerprint: Dict) -> Optional[Tuple[faiss.Index, Dict]]:
+        if not (os.path.exists(self.index_path) and os.path.exists(self.meta_path)):
+            return None
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if meta.get("format_version") != FORMAT_VERSION or meta.get("kind") != self.kind:
+            return None
+        if meta.get("fingerprint") != fingerprint:
+            print("Persisted FAISS index is stale, rebuilding")
+            return None
+
+        index = self.read_index(mmap=True)
+        if index.ntotal != meta.get("ntotal"):
+            return None
+        return index, meta
+
+    def read_index(self, mmap: bool = False) -> faiss.Index:
+        if self.loader is not None:
+            return self.loader(self.index_path, mmap)
+        if mmap:
+            try:
+                return faiss.read_index(self.index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                # neki tipovi indexa ne podrzavaju mmap
+                pass
+        return faiss.read_index(self.index_path)
+
+    def save(self, index: faiss.Index, meta: Dict):
+        # prvo pisemo u tmp fajl pa rename, da prekid ne ostavi polovican index
+        tmp_index = self.index_path + ".tmp"
+        tmp_meta = self.meta_path + ".tmp"
+        if hasattr(index, "write"):
+            # index sa pratecim fajlovima sam radi tmp + rename
+            index.write(self.index_path)
+        else:
+            faiss.write_index(index, tmp_index)
+            os.replace(tmp_index, self.index_path)
+        with open(tmp_meta, "w", encoding="utf-8") as f:
+            json.dump({
+                **meta,
+                "format_version": FORMAT_VERSION,
+                "kind": self.kind,
+                "ntotal": index.ntotal
+            }, f)
+        os.replace(tmp_meta, self.meta_path)
+
+
+class BackgroundSaver:
+    def __init__(self, save: Callable[[], None], lock, name: str = "index-save"):
+        # lock - isti lock pod kojim se index menja, pa je snimak konzistentan
+        self._save = save
+        self._lock = lock
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix=name)
+        self._state_lock = threading.Lock()
+        self._pending: Optional[Future] = None
+
+    def _run(self):
+        with self._state_lock:
+            self._pending = None
+        with self._lock:
+            try:
+                self._save()
+            except Exception as e:
+                print(f"Background index save failed: {type(e).__name__}: {e}")
+                raise
+
+    def request(self) -> Future:
+        """
+        Zakazuje snimanje; ako jedno vec ceka, novo se ne dodaje (ono ce snimiti i ove izmene).
+        """
+        with self._state_lock:
+            if self._pending is None:
+                self._pending = self._executor.submit(self._run)
+            return self._pending
+
+    def flush(self):
+        # ceka zakazano snimanje (i ono koje je u toku)
+        self._executor.submit(lambda: None).result()
@@ -0,0 +1,162 @@
+'''
+Streaming ingestion: parse -> encode -> store kao preklopljene faze.
+
+Svaka faza radi u svojoj niti, a faze su povezane ogranicenim redovima
+(queue.Queue(maxsize)), pa u memoriji nikad nema vise od
+queue_size * batch_size dokumenata plus jedan shard PDF-a, bez obzira na
+velicinu dokumenta. Encoding (torch/onnxruntime) i chroma/sqlite pisanje
+otpustaju GIL, pa se faze stvarno preklapaju.
+
+Za svaku fazu se meri propusnost i backpressure: koliko je vremena faza
+cekala na ulaz (prethodna faza je spora) i na izlaz (sledeca faza je spora).
+
+    stats = ingest(rag, documents_iter, batch_size=256)
+'''
+
+import time
+import queue
+import threading
+from itertools import islice
+from typing import Callable, Dict, Iterable, Iterator, List
+
+BATCH_SIZE = 256
+QUEUE_SIZE = 4
+
+_DONE = object()
+
+
+class StageStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.items = 0
+        self.docs = 0
+        self.busy_s = 0.0
+        self.wait_in_s = 0.0
+        self.wait_out_s = 0.0
+        self.max_queue_depth = 0
+
+    def as_dict(self) -> Dict:
+        return {
+            "stage": self.name,
+            "batches": self.items,
+            "docs": self.docs,
+            "docs_per_s": self.docs / self.busy_s if self.busy_s else 0.0,
+            "busy_s": self.busy_s,
+            "wait_in_s": self.wait_in_s,
+            "wait_out_s": self.wait_out_s,
+            "max_queue_depth": self.max_queue_depth
+        }
+
+
+def batched(items: Iterable, size: int) -> Iterator[List]:
+    iterator = iter(items)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _put(q: queue.Queue, item, stats: StageStats):
+    start = time.perf_counter()
+    q.put(item)
+    stats.wait_out_s += time.perf_counter() - start
+    stats.max_queue_depth = max(stats.max_queue_depth, q.qsize())
+
+
+def run_pipeline(source: Iterable, stages: List, queue_size: int = QUEUE_SIZE,
+                 size: Callable[[object], int] = len) -> List[Dict]:
+    """
+    source - iterator batcheva; stages - lista (ime, fn) gde fn(batch) vraca batch za sledecu fazu.
+    """
+    queues = [queue.Queue(maxsize=queue_size) for _ in stages]
+    all_stats = [StageStats("parse")] + [StageStats(name) for name, _ in stages]
+    errors = []
+
+    def produce():
+        stats = all_stats[0]
+        try:
+            iterator = iter(source)
+            while True:
+                start = time.perf_counter()
+                batch = next(iterator, _DONE)
+                stats.busy_s += time.perf_counter() - start
+                if batch is _DONE:
+                    break
+                stats.items += 1
+                stats.docs += size(batch)
+                _put(queues[0], batch, stats)
+        except BaseException as e:
+            errors.append(e)
+        finally:
+            queues[0].put(_DONE)
+
+    def work(i: int, fn):
+        stats = all_stats[i + 1]
+        inbox = queues[i]
+        outbox = queues[i + 1] if i + 1 < len(queues) else None
+        while True:
+            start = time.perf_counter()
+            batch = inbox.get()
+            stats.wait_in_s += time.perf_counter() - start
+            if batch is _DONE:
+                break
+            if errors:
+                # greska negde u pipelineu - samo praznimo red da se niko ne zaglavi
+                continue
+            try:
+                start = time.perf_counter()
+                result = fn(batch)
+                stats.busy_s += time.perf_counter() - start
+                stats.items += 1
+                stats.docs += size(batch)
+            except BaseException as e:
+                errors.append(e)
+                continue
+            if outbox is not None:
+                _put(outbox, result, stats)
+        if outbox is not None:
+            outbox.put(_DONE)
+
+    threads = [threading.Thread(target=produce, name="ingest-parse", daemon=True)]
+    threads += [threading.Thread(target=work, args=(i, fn), name=f"ingest-{name}", daemon=True)
+                for i, (name, fn) in enumerate(stages)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    if errors:
+        raise errors[0]
+    return [stats.as_dict() for stats in all_stats]
+
+
+def ingest(rag, documents: Iterable[Dict], batch_size: int = BATCH_SIZE,
+           queue_size: int = QUEUE_SIZE) -> List[Dict]:
+    """
+    documents - iterator dict-ova {"id", "content", "metadata"} (npr. iz PDFParser.iter_paragraphs).
+    Index se snima jednom, na kraju.
+    """
+    def encode(batch: List[Dict]):
+        return batch, rag.encode_documents([d["content"] for d in batch], show_progress_bar=False)
+
+    def store(encoded):
+        batch, embeddings = encoded
+        rag.add_encoded([d["content"] for d in batch], [d["id"] for d in batch],
+                        [d["metadata"] for d in batch], embeddings, save=False)
+        return None
+
+    started = time.perf_counter()
+    stats = run_pipeline(batched(documents, batch_size), [("encode", encode), ("store", store)],
+                         queue_size=queue_size, size=lambda b: len(b[0]) if isinstance(b, tuple) else len(b))
+    # index je mozda treniran na prvom batchu (IVF nlist, SQ8/PQ kvantizator) - treniramo na svemu
+    if not rag.vector_index.retrain_if_needed():
+        rag.vector_index.save()
+
+    elapsed = time.perf_counter() - started
+    total = stats[-1]["docs"]
+    print(f"Ingested {total} documents in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.1f} docs/s)")
+    for stage in stats:
+        print(f"  {stage['stage']:>6}: {stage['docs_per_s']:8.1f} docs/s busy | "
+              f"waited {stage['wait_in_s']:.1f}s on input, {stage['wait_out_s']:.1f}s on output (backpressure) | "
+              f"max queue {stage['max_queue_depth']}")
+    return stats
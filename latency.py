@@ -0,0 +1,20 @@
+'''
+Zbirne statistike latencije (percentili, prosek, QPS).
+
+Dele ih benchmark.py, telemetry.py (histogrami faza) i llm.py
+(TTFT / ukupno vreme generisanja), pa zive u zasebnom modulu bez
+ostalih zavisnosti projekta.
+'''
+
+from typing import Dict, List
+import numpy as np
+
+PERCENTILES = (50, 95, 99)
+
+
+def latency_stats(latencies: List[float]) -> Dict:
+    values = np.array(latencies) * 1000
+    stats = {f"p{p}_ms": float(np.percentile(values, p)) for p in PERCENTILES}
+    stats["mean_ms"] = float(values.mean())
+    stats["qps"] = len(values) / (values.sum() / 1000) if values.sum() else 0.0
+    return stats
@@ -0,0 +1,229 @@
+'''
+BM25 invertovani index nad istim dokumentima kao FAISS index.
+
+Labele su iste kao u VectorIndex-u (red u DocStore-u), pa se leksicki i
+dense rezultati direktno spajaju. Postings liste su u CSR obliku - za svaki
+term opseg u nizovima labels (int32) i tfs (uint16) - i cuvaju se kao .npy
+koji se pri startu mmapuju. Novi dokumenti idu u mali "delta" segment u
+memoriji koji se pri snimanju spaja sa osnovnim.
+
+Brisanje samo oznacava labelu; df se preracunava tek pri spajanju
+segmenata (kao u Lucene-u), razlika u skoru je zanemarljiva.
+
+Tokeni su reci i identifikatori; camelCase/snake_case identifikatori se
+indeksiraju i celi i po delovima, pa upit "tableFindString" pogadja tacno
+taj identifikator, a "find string" i dalje nalazi isti tekst.
+'''
+
+import os
+import re
+import json
+import math
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import numpy as np
+from doc_store import GrowableArray, _save_npy
+
+K1 = 1.2
+B = 0.75
+# konstanta u reciprocal rank fusion: 1 / (RRF_K + rank)
+RRF_K = 60
+# delta segment se spaja sa osnovnim kad predje ovoliko postinga
+MERGE_THRESHOLD = 200_000
+
+_TOKEN = re.compile(r"[A-Za-z_][A-Za-z0-9_]*|\d+")
+_PARTS = re.compile(r"[A-Z]+(?=[A-Z][a-z]|\d|\b)|[A-Z]?[a-z]+|[A-Z]+|\d+")
+
+
+def tokenize(text: str) -> List[str]:
+    tokens = []
+    for word in _TOKEN.findall(text):
+        tokens.append(word.lower())
+        parts = [p.lower() for p in _PARTS.findall(word.replace("_", " "))]
+        if len(parts) > 1:
+            tokens.extend(parts)
+    return tokens
+
+
+def reciprocal_rank_fusion(rankings: Iterable[Sequence[int]], k: int = RRF_K) -> List[Tuple[int, float]]:
+    """
+    Spaja vise rang lista labela (najbolja prva); vraca (labela, skor) od najboljeg.
+    """
+    scores: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, label in enumerate(ranking):
+            label = int(label)
+            if label < 0:
+                continue
+            scores[label] = scores.get(label, 0.0) + 1.0 / (k + rank + 1)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
+
+
+class BM25Index:
+    def __init__(self):
+        self.vocab: Dict[str, int] = {}
+        # osnovni segment (CSR po term id-ju)
+        self.offsets = np.zeros(1, dtype='int64')
+        self.labels = np.zeros(0, dtype='int32')
+        self.tfs = np.zeros(0, dtype='uint16')
+        # delta segment: term id -> ([labele], [tf])
+        self.delta: Dict[int, Tuple[List[int], List[int]]] = {}
+        self.delta_size = 0
+        self.doc_len = np.zeros(0, dtype='int32')
+        self.deleted = np.zeros(0, dtype=bool)
+        # df osnovnog segmenta; df delta segmenta je duzina njegove liste
+        self.df = np.zeros(0, dtype='int32')
+        # rezerva kapaciteta za doc_len/deleted (pravi se pri prvom rastu)
+        self._buffers: Dict[str, GrowableArray] = {}
+
+    def __len__(self) -> int:
+        return len(self.doc_len)
+
+    @property
+    def live_count(self) -> int:
+        return int(len(self.doc_len) - self.deleted.sum())
+
+    def _grow(self, size: int):
+        if size > len(self.doc_len):
+            extra = size - len(self.doc_len)
+            for name in ("doc_len", "deleted"):
+                if name not in self._buffers:
+                    self._buffers[name] = GrowableArray(getattr(self, name))
+                values = getattr(self, name)
+                setattr(self, name, self._buffers[name].append(np.zeros(extra, dtype=values.dtype)))
+
+    def add(self, labels: Sequence[int], documents: Sequence[str]):
+        labels = [int(label) for label in labels]
+        if not labels:
+            return
+        self._grow(max(labels) + 1)
+        for label, text in zip(labels, documents):
+            counts = Counter(tokenize(text))
+            self.doc_len[label] = sum(counts.values())
+            self.deleted[label] = False
+            for term, tf in counts.items():
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    term_id = self.vocab[term] = len(self.vocab)
+                postings = self.delta.setdefault(term_id, ([], []))
+                postings[0].append(label)
+                postings[1].append(min(tf, np.iinfo('uint16').max))
+                self.delta_size += 1
+        if self.delta_size > MERGE_THRESHOLD:
+            self.merge()
+
+    def remove(self, labels: Sequence[int]):
+        labels = [int(label) for label in labels if int(label) < len(self.deleted)]
+        self.deleted[labels] = True
+
+    def merge(self):
+        """
+        Spaja delta segment sa osnovnim i izbacuje obrisane labele iz postinga.
+        """
+        n_terms = len(self.vocab)
+        lists_labels, lists_tfs = [], []
+        for term_id in range(n_terms):
+            if term_id + 1 < len(self.offsets):
+                start, end = self.offsets[term_id], self.offsets[term_id + 1]
+                base_labels, base_tfs = np.asarray(self.labels[start:end]), np.asarray(self.tfs[start:end])
+            else:
+                base_labels, base_tfs = np.zeros(0, dtype='int32'), np.zeros(0, dtype='uint16')
+            extra = self.delta.get(term_id)
+            if extra:
+                base_labels = np.concatenate([base_labels, np.array(extra[0], dtype='int32')])
+                base_tfs = np.concatenate([base_tfs, np.array(extra[1], dtype='uint16')])
+            keep = ~self.deleted[base_labels]
+            lists_labels.append(base_labels[keep])
+            lists_tfs.append(base_tfs[keep])
+
+        lengths = np.array([len(l) for l in lists_labels], dtype='int64')
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)]).astype('int64')
+        self.labels = np.concatenate(lists_labels) if lists_labels else np.zeros(0, dtype='int32')
+        self.tfs = np.concatenate(lists_tfs) if lists_tfs else np.zeros(0, dtype='uint16')
+        self.df = lengths.astype('int32')
+        self.delta = {}
+        self.delta_size = 0
+
+    def _postings(self, term_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        if term_id + 1 < len(self.offsets):
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            labels, tfs = self.labels[start:end], self.tfs[start:end]
+        else:
+            labels, tfs = np.zeros(0, dtype='int32'), np.zeros(0, dtype='uint16')
+        extra = self.delta.get(term_id)
+        if extra:
+            labels = np.concatenate([labels, np.array(extra[0], dtype='int32')])
+            tfs = np.concatenate([tfs, np.array(extra[1], dtype='uint16')])
+        return labels, tfs
+
+    def _df(self, term_id: int) -> int:
+        df = int(self.df[term_id]) if term_id < len(self.df) else 0
+        extra = self.delta.get(term_id)
+        return df + (len(extra[0]) if extra else 0)
+
+    def search(self, queries: Sequence[str], k: int,
+               mask: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Kao faiss search: (skorovi, labele) oblika (len(queries), k), labela -1 kad nema pogodaka.
+        mask - bool po labeli, samo te labele mogu biti pogodak (metadata filter).
+        """
+        scores_out = np.zeros((len(queries), k), dtype='float32')
+        labels_out = np.full((len(queries), k), -1, dtype='int64')
+        live = self.live_count
+        if live == 0 or k == 0:
+            return scores_out, labels_out
+        avgdl = max(float(self.doc_len[~self.deleted].mean()), 1.0)
+        norm = K1 * (1 - B + B * self.doc_len / avgdl)
+
+        for row, query in enumerate(queries):
+            scores = np.zeros(len(self.doc_len), dtype='float32')
+            for term in set(tokenize(query)):
+                term_id = self.vocab.get(term)
+                if term_id is None:
+                    continue
+                labels, tfs = self._postings(term_id)
+                if not len(labels):
+                    continue
+                df = min(self._df(term_id), live)
+                idf = math.log(1 + (live - df + 0.5) / (df + 0.5))
+                tfs = tfs.astype('float32')
+                # labela se u postingu jednog terma pojavljuje najvise jednom
+                scores[labels] += idf * tfs * (K1 + 1) / (tfs + norm[labels])
+            scores[self.deleted] = 0
+            if mask is not None:
+                scores[~mask] = 0
+            hits = np.flatnonzero(scores)
+            if not len(hits):
+                continue
+            top = hits[np.argsort(-scores[hits], kind='stable')[:k]]
+            scores_out[row, :len(top)] = scores[top]
+            labels_out[row, :len(top)] = top
+        return scores_out, labels_out
+
+    def save(self, directory: str):
+        if self.delta:
+            self.merge()
+        os.makedirs(directory, exist_ok=True)
+        for name in ("offsets", "labels", "tfs", "doc_len", "deleted", "df"):
+            _save_npy(os.path.join(directory, name + ".npy"), getattr(self, name))
+        tmp = os.path.join(directory, "vocab.json.tmp")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.vocab, f)
+        os.replace(tmp, os.path.join(directory, "vocab.json"))
+
+    @classmethod
+    def load(cls, directory: str, mmap: bool = True) -> Optional["BM25Index"]:
+        index = cls()
+        try:
+            with open(os.path.join(directory, "vocab.json"), "r", encoding="utf-8") as f:
+                index.vocab = json.load(f)
+            for name in ("offsets", "labels", "tfs"):
+                setattr(index, name, np.load(os.path.join(directory, name + ".npy"), mmap_mode='r' if mmap else None))
+            # male nizove koji se menjaju pri add/remove drzimo u memoriji
+            for name in ("doc_len", "deleted", "df"):
+                setattr(index, name, np.load(os.path.join(directory, name + ".npy")))
+        except (OSError, ValueError):
+            return None
+        if len(index.offsets) != len(index.vocab) + 1:
+            return None
+        return index
@@ -0,0 +1,230 @@
+'''
+Sloj za generisanje odgovora preko LLM-a.
+
+- jedan pooled HTTP klijent (httpx.AsyncClient, keep-alive) po provideru,
+  umesto novog Groq klijenta za svaki upit
+- asyncio konkurentnost, najvise max_in_flight zahteva istovremeno
+- streaming tokena - meri se time-to-first-token (ttft) i ukupno vreme
+- retry sa eksponencijalnim backoffom (mrezne greske, 429, 5xx) dok jos
+  nijedan token nije stigao
+- provider je zamenljiv: OpenAI kompatibilni API (Groq, vLLM, mock_llm_server.py)
+
+Sinhroni pozivi (generate/generate_many) idu kroz event loop u pozadinskoj
+niti, pa pool konekcija prezivljava izmedju poziva.
+
+    generator = Generator(OpenAICompatibleProvider(GROQ_BASE_URL, API_KEY, MODEL))
+    results = generator.generate_many(prompts)
+    python llm.py --base-url http://127.0.0.1:8001/v1 --requests 32   # benchmark
+'''
+
+import os
+import abc
+import json
+import time
+import random
+import asyncio
+import threading
+from typing import AsyncIterator, Callable, Dict, List, Optional
+import telemetry
+
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+MAX_IN_FLIGHT = 4
+MAX_CONNECTIONS = 16
+RETRIES = 3
+BACKOFF_S = 0.5
+TIMEOUT_S = 60.0
+RETRY_STATUS = (408, 429, 500, 502, 503, 504)
+
+
+class LLMError(Exception):
+    def __init__(self, message: str, retryable: bool = False):
+        super().__init__(message)
+        self.retryable = retryable
+
+
+class LLMProvider(abc.ABC):
+    """
+    Interfejs providera: stream vraca tokene (delove teksta) kako stizu.
+    """
+    @abc.abstractmethod
+    def stream(self, messages: List[Dict], **params) -> AsyncIterator[str]:
+        """
+        Async generator tokena; greske kao LLMError (retryable za mrezne greske, 429, 5xx).
+        """
+
+    async def aclose(self):
+        pass
+
+
+class OpenAICompatibleProvider(LLMProvider):
+    def __init__(self, base_url: str, api_key: Optional[str], model: str,
+                 max_connections: int = MAX_CONNECTIONS, timeout: float = TIMEOUT_S):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.model = model
+        self.max_connections = max_connections
+        self.timeout = timeout
+        self._client = None
+        self._client_loop = None
+
+    def _get_client(self):
+        # AsyncClient je vezan za event loop - jedan po loopu, ponovo koriscen za sve zahteve
+        # httpx se uvozi tek ovde, da import main-a / servera ostane brz
+        import httpx
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                headers=headers,
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=self.max_connections,
+                                    max_keepalive_connections=self.max_connections)
+            )
+            self._client_loop = loop
+        return self._client
+
+    async def stream(self, messages: List[Dict], **params) -> AsyncIterator[str]:
+        import httpx
+        body = {"model": self.model, "messages": messages, "stream": True, **params}
+        try:
+            async with self._get_client().stream("POST", "/chat/completions", json=body) as response:
+                if response.status_code != 200:
+                    text = (await response.aread()).decode("utf-8", "replace")[:200]
+                    raise LLMError(f"HTTP {response.status_code}: {text}",
+                                   retryable=response.status_code in RETRY_STATUS)
+                # server-sent events: "data: {...}" linije, kraj je "data: [DONE]"
+                async for line in response.aiter_lines():
+                    if not line.startswith("data:"):
+                        continue
+                    data = line[len("data:"):].strip()
+                    if data == "[DONE]":
+                        return
+                    choices = json.loads(data).get("choices") or [{}]
+                    token = choices[0].get("delta", {}).get("content")
+                    if token:
+                        yield token
+        except httpx.TransportError as e:
+            raise LLMError(f"{type(e).__name__}: {e}", retryable=True) from e
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+class GenerationResult:
+    def __init__(self, text: str, ttft_s: Optional[float], total_s: float, attempts: int):
+        self.text = text
+        self.ttft_s = ttft_s
+        self.total_s = total_s
+        self.attempts = attempts
+
+    def as_dict(self) -> Dict:
+        return {"text": self.text, "ttft_s": self.ttft_s, "total_s": self.total_s, "attempts": self.attempts}
+
+
+class Generator:
+    def __init__(self, provider: LLMProvider, max_in_flight: int = MAX_IN_FLIGHT,
+                 retries: int = RETRIES, backoff_s: float = BACKOFF_S, **params):
+        self.provider = provider
+        self.max_in_flight = max_in_flight
+        self.retries = retries
+        self.backoff_s = backoff_s
+        # temperature, max_tokens...
+        self.params = params
+        self._semaphores = {}
+        self._loop = None
+        self._lock = threading.Lock()
+
+    def _semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        if loop not in self._semaphores:
+            self._semaphores[loop] = asyncio.Semaphore(self.max_in_flight)
+        return self._semaphores[loop]
+
+    async def agenerate(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> GenerationResult:
+        messages = [{"role": "user", "content": prompt}]
+        async with self._semaphore():
+            # span tek posle semafora - cekanje na slobodan slot nije vreme LLM-a
+            with telemetry.span("llm_generate", prompt_chars=len(prompt)) as current:
+                start = time.perf_counter()
+                attempt = 0
+                while True:
+                    attempt += 1
+                    tokens = []
+                    ttft = None
+                    try:
+                        async for token in self.provider.stream(messages, **self.params):
+                            if ttft is None:
+                                ttft = time.perf_counter() - start
+                            tokens.append(token)
+                            if on_token:
+                                on_token(token)
+                        current.set(attempts=attempt, ttft_ms=ttft * 1000 if ttft else None, chunks=len(tokens))
+                        telemetry.count("llm_chunks_received", len(tokens))
+                        return GenerationResult("".join(tokens), ttft, time.perf_counter() - start, attempt)
+                    except LLMError as e:
+                        # posle prvog tokena ne ponavljamo - deo odgovora je vec otisao pozivaocu
+                        if not e.retryable or tokens or attempt > self.retries:
+                            raise
+                        telemetry.count("llm_retries")
+                        delay = self.backoff_s * 2 ** (attempt - 1) * (0.5 + random.random())
+                        print(f"LLM request failed ({e}), retry {attempt}/{self.retries} in {delay:.2f}s")
+                        await asyncio.sleep(delay)
+
+    async def agenerate_many(self, prompts: List[str]) -> List[GenerationResult]:
+        return await asyncio.gather(*(self.agenerate(p) for p in prompts))
+
+    def _run(self, coro):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, name="llm-loop", daemon=True).start()
+        # task nastavlja trace pozivaoca (spanovi iz telemetry.py)
+        return asyncio.run_coroutine_threadsafe(telemetry.with_parent(telemetry.current_span(), coro),
+                                                self._loop).result()
+
+    def generate(self, prompt: str, on_token: Optional[Callable[[str], None]] = None) -> GenerationResult:
+        return self._run(self.agenerate(prompt, on_token))
+
+    def generate_many(self, prompts: List[str]) -> List[GenerationResult]:
+        return self._run(self.agenerate_many(prompts))
+
+    def close(self):
+        if self._loop is not None:
+            self._run(self.provider.aclose())
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = None
+
+
+def generation_stats(results: List[GenerationResult]) -> Dict:
+    from latency import latency_stats
+    ttft = [r.ttft_s for r in results if r.ttft_s is not None]
+    return {
+        "requests": len(results),
+        "ttft": latency_stats(ttft) if ttft else None,
+        "total": latency_stats([r.total_s for r in results]),
+        "retries": sum(r.attempts - 1 for r in results)
+    }
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="LLM generation benchmark (serial vs concurrent)")
+    parser.add_argument("--base-url", default=os.environ.get("LLM_BASE_URL", GROQ_BASE_URL))
+    parser.add_argument("--model", default="llama-3.3-70b-versatile")
+    parser.add_argument("--requests", type=int, default=16)
+    parser.add_argument("--in-flight", type=int, default=MAX_IN_FLIGHT)
+    args = parser.parse_args()
+
+    provider = OpenAICompatibleProvider(args.base_url, os.environ.get("GROQ_API_KEY"), args.model)
+    prompts = [f"Question {i}: what is a closure?" for i in range(args.requests)]
+    for in_flight in (1, args.in_flight):
+        generator = Generator(provider, max_in_flight=in_flight, max_tokens=256)
+        start = time.perf_counter()
+        results = generator.generate_many(prompts)
+        wall = time.perf_counter() - start
+        print(f"in_flight={in_flight}: wall {wall:.2f}s, {generation_stats(results)}")
+        generator.close()
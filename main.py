@@ -1,114 +1,111 @@
 import os
-os.environ["TOKENIZERS_PARALLELISM"] = "false"
+# pre importa biblioteka (env varijable, warnings, logovi transformers/hf)
+from disable_warnings import disable_warning_messages
+disable_warning_messages(redirect_stderr=False)
 import time
-from rag import CrossRankingRAG
-from hnsw import HnswRAG
-from pdf_parser import PDFParser
-from groq import Groq
+from questions import QUESTIONS
+# ragovi, ingest (pdf parser, korpus) i benchmark se uvoze tek u funkcijama
+# koje ih koriste, da import main-a (i servera) ostane brz; httpx uvozi tek llm provider
+from llm import Generator, OpenAICompatibleProvider, GROQ_BASE_URL, generation_stats
+import model_registry
+import telemetry
 
 
 API_KEY = os.environ.get("GROQ_API_KEY")
 MODEL = "llama-3.3-70b-versatile"
-PDF_PATH = "data/crafting-interpreters.pdf"
+# bilo koji OpenAI kompatibilan endpoint, npr. mock_llm_server.py: http://127.0.0.1:8001/v1
+LLM_BASE_URL = os.environ.get("LLM_BASE_URL", GROQ_BASE_URL)
+# koliko LLM zahteva istovremeno
+LLM_IN_FLIGHT = 4
+# budzet tokena za kontekst u promptu
+CONTEXT_TOKENS = 3000
+# direktorijum sa PDF-ovima, jedan PDF ili manifest (.txt/.json lista putanja)
+CORPUS = "data"
 DIVIDE = 80
+# paralelno parsiranje PDF-a po opsezima strana
+PARSE_WORKERS = os.cpu_count()
+# za korpuse od mnogo PDF-ova: index podeljen na shardove po PDF-u (vidi sharded_index.py)
+SHARDS = int(os.environ.get("RAG_SHARDS", "1"))
 
-QUESTIONS = [
-    {
-        "query": "How does the book implement string interning in the hash table, and what performance benefits does this optimization provide?",
-        "relevant_chapters": [20],
-        "relevant_pages": [[349, 373]]
-    },
-    {
-        "query": "Compare the parsing strategies of jlox and clox: which algorithms are used and how do they represent grammar rules?",
-        "relevant_chapters": [6, 17],
-        "relevant_pages": [[76, 94], [297, 318]]
-    },
-    {
-        "query": "Why does jlox require a separate 'Resolver' pass before interpretation, and how does it use 'distance' (or hops) to fix the closure binding problem?",
-        "relevant_chapters": [11],
-        "relevant_pages": [[175, 190]]
-    }
-]
 
+_context_builder = None
 
-def generate_response(query: str, context: str) -> str:
-        prompt = f"""
+def get_context_builder():
+        global _context_builder
+        if _context_builder is None:
+                from context_builder import ContextBuilder
+                _context_builder = ContextBuilder(max_tokens=CONTEXT_TOKENS)
+        return _context_builder
+
+def build_context(results: dict):
+        # spajanje preklopljenih chunkova, bez skoro-duplikata, u okviru budzeta tokena
+        with telemetry.span("build_context"):
+                return get_context_builder().build(results)
+
+def count_prompt_tokens(prompts: list):
+        # tokeni poslati LLM-u (istim tokenizerom kao budzet konteksta)
+        telemetry.count("llm_prompt_tokens", sum(get_context_builder().tokenizer.count(prompts)))
+
+def build_prompt(query: str, context: str) -> str:
+        return f"""
         You are a helpful assistant that can answer questions about the following context:
         {context}
         Question: {query}
         """
-        response = Groq(api_key=API_KEY).chat.completions.create(
-                model=MODEL,
-                messages=[{"role": "user", "content": prompt}],
-                temperature=0.7,
-                max_tokens=2048
-        )
-        return response.choices[0].message.content
+
+_generator = None
+
+def get_generator() -> Generator:
+        # jedan generator (i pool konekcija) za ceo proces
+        global _generator
+        if _generator is None:
+                provider = OpenAICompatibleProvider(LLM_BASE_URL, API_KEY, MODEL)
+                _generator = Generator(provider, max_in_flight=LLM_IN_FLIGHT, temperature=0.7, max_tokens=2048)
+        return _generator
+
+def generate_response(query: str, context: str) -> str:
+        prompt = build_prompt(query, context)
+        with telemetry.span("generate_response"):
+                count_prompt_tokens([prompt])
+                return get_generator().generate(prompt).text
 
 def load_pdf_into_rags():
+        from rag import CrossRankingRAG
+        from hnsw import HnswRAG
+        from parse_cache import ParseCache
+        from query_cache import QueryCache
+        from embedding_cache import EmbeddingCache
+        from corpus import sync_corpus, PARAGRAPHS, CHUNKS
         print("="*DIVIDE)
 
-        hnsw_rag = HnswRAG()  
-        crossranking_rag = CrossRankingRAG()  
-        
-        hnsw_count = hnsw_rag.collection.count()
-        crossranking_count = crossranking_rag.collection.count()
-        # da li trebamo opet da dodamo pdf 
-        if hnsw_count > 0 and crossranking_count > 0:
-                print("PDF already loaded into RAG")
-                return hnsw_rag, crossranking_rag
-        
-        
-        print(f"\nParsing PDF: {PDF_PATH}")
-        parser = PDFParser(PDF_PATH)
-        
-        print("Extracting paragraphs...")
-        paragraphs = parser.extract_paragraphs()
-        print(f"Found {len(paragraphs)} paragraphs")
-        print("Extracting fixed size chunks...")
-        large_chunks = parser.extract_fixed_size_chunks()
-        print(f"Found {len(large_chunks)} fixed chunks")
-        
-        # dodajemo paragrafe u crossranking rag
-        if len(paragraphs) > 0 and crossranking_count == 0:
-                print("Loading paragraphs into FlatL2 RAG...")
-                para_docs = [p['content'] for p in paragraphs]
-                para_ids = [f"para_{i}" for i in range(len(paragraphs))]
-                # metadata
-                para_metadatas = [{
-                        'chapter': p['chapter'],
-                        'chapter_number': p['chapter_number'],
-                        'subchapter': p.get('subchapter', ''),
-                        'page_start': str(p['page_start']),
-                        'page_end': str(p['page_end'])
-                } for p in paragraphs]
-                crossranking_rag.add_documents(
-                        documents=para_docs,
-                        ids=para_ids,
-                        metadatas=para_metadatas
-                )
-                print(f"FlatL2 RAG built successfully with {len(paragraphs)} paragraphs")
-        
+        # kes embeddinga dokumenata: ponovni ingest, novi chunk_size/overlap i rebuild ne enkoduju isti tekst
+        embedding_cache = EmbeddingCache()
+        hnsw_rag = HnswRAG(shards=SHARDS, embedding_cache=embedding_cache)  
+        crossranking_rag = CrossRankingRAG(shards=SHARDS, embedding_cache=embedding_cache)  
+        # sva tri modela i oba indexa se ucitavaju paralelno, dok ide sync korpusa
+        warmup_start = time.perf_counter()
+        warmup = hnsw_rag.warmup() + crossranking_rag.warmup()
+        # kes upita i odgovora ispred oba raga
+        hnsw_rag.cache = QueryCache(hnsw_rag.embedding_dim)
+        crossranking_rag.cache = QueryCache(crossranking_rag.embedding_dim)
+
+        # samo izmene u korpusu: novi chunkovi se dodaju, nestali brisu, nepromenjeni PDF-ovi preskacu
+        print(f"\nSyncing corpus: {CORPUS}")
+        parse_cache = ParseCache()
+
+        # paragrafi u crossranking rag
+        print("Syncing paragraphs into FlatL2 RAG...")
+        sync_corpus(crossranking_rag, CORPUS, PARAGRAPHS, workers=PARSE_WORKERS, cache=parse_cache)
+
         # chunkovi u hnsw rag
-        if len(large_chunks) > 0 and hnsw_count == 0:
-                print("Loading chunks into HNSW RAG...")
-                chunk_docs = [c['content'] for c in large_chunks]
-                chunk_ids = [f"chunk_{i}" for i in range(len(large_chunks))]
-                chunk_metadatas = [{
-                        'chapter': c['chapter'],
-                        'chapter_number': c['chapter_number'],
-                        'subchapter': c.get('subchapter', ''),
-                        'page_start': str(c['page_start']),
-                        'page_end': str(c['page_end'])
-                } for c in large_chunks]
-                hnsw_rag.add_documents(
-                        documents=chunk_docs,
-                        ids=chunk_ids,
-                        metadatas=chunk_metadatas
-                )
-                print(f"HNSW RAG built successfully with {len(large_chunks)} chunks")
+        print("Syncing chunks into HNSW RAG...")
+        sync_corpus(hnsw_rag, CORPUS, CHUNKS, workers=PARSE_WORKERS, cache=parse_cache)
 
-        print("PDF loaded successfully into both RAG systems!")
+        print(f"Corpus loaded: {crossranking_rag.collection.count()} paragraphs, {hnsw_rag.collection.count()} chunks")
+        for future in warmup:
+                future.result()
+        print(f"Models warm after {time.perf_counter() - warmup_start:.2f}s: {model_registry.stats()}")
+        print(f"Embedding cache: {embedding_cache.stats()}")
         print("="*DIVIDE)
         
         return hnsw_rag, crossranking_rag
@@ -130,6 +127,18 @@ def format_metadata(metadata: dict, is_hnsw: bool = False) -> str:
                             parts.append(f"Page {metadata['page_start']}")
         return " | ".join(parts)
 
+_relevance_indexes = {}
+
+def _relevance_index(rag):
+        from benchmark import RelevanceIndex
+        # jedan unos po indexu; nova verzija (add/remove/rebuild) zamenjuje stari
+        vector_index = rag.vector_index
+        cached = _relevance_indexes.get(id(vector_index))
+        if cached is None or cached[0] is not vector_index or cached[1] != vector_index.version:
+                cached = (vector_index, vector_index.version, RelevanceIndex(vector_index))
+                _relevance_indexes[id(vector_index)] = cached
+        return cached[2]
+
 def calculate_metrics(rag, retrieved_metadatas, relevant_chapters, relevant_pages, is_hnsw=False):
         relevant_retrieved = 0
         
@@ -154,28 +163,44 @@ def calculate_metrics(rag, retrieved_metadatas, relevant_chapters, relevant_page
         k = len(retrieved_metadatas)
         precision = relevant_retrieved / k if k > 0 else 0
         
-        try:
-                all_metadatas = rag.collection.get(include=['metadatas'])['metadatas']
-                total_relevant = 0
-                for meta in all_metadatas:
-                        if is_hnsw:
-                                if is_page_relevant(meta.get('page_start')):
-                                        total_relevant += 1
-                        else:
-                                try:
-                                        if int(meta.get('chapter')) in relevant_chapters:
-                                                total_relevant += 1
-                                except (ValueError, TypeError):
-                                        pass
-        except Exception as e:
-                print(f"Error calculating recall denominator: {e}")
-                total_relevant = 0
+        # imenilac za recall iz unapred izracunate relevantnosti (jednom po verziji indexa)
+        relevance = _relevance_index(rag)
+        total_relevant = relevance.total_relevant(
+                {"relevant_chapters": relevant_chapters, "relevant_pages": relevant_pages},
+                by_pages=is_hnsw
+        )
                 
         recall = relevant_retrieved / total_relevant if total_relevant > 0 else 0
         
         return precision, recall, relevant_retrieved, total_relevant
 
-def query_rag(rag, query_item: dict, top_k: int = 10):
+def generate_answers(rag, queries: list, results: list, top_k: int = 10) -> list:
+        # svi odgovori koji nisu u kesu idu LLM-u konkurentno (najvise LLM_IN_FLIGHT odjednom)
+        cache = rag.cache
+        version = rag.vector_index.version
+        answers = [cache.get_answer(q, top_k, version) if cache else None for q in queries]
+        missing = [i for i, answer in enumerate(answers) if answer is None]
+        if missing:
+                contexts = [build_context(results[i]) for i in missing]
+                for i, context in zip(missing, contexts):
+                        print(f"  Context for query {i+1}: {context.tokens} tokens, {context.tokens_saved} saved "
+                              f"({context.merged} merged, {context.duplicates} near-duplicates, {context.dropped} over budget)")
+                saved = sum(c.tokens_saved for c in contexts)
+                naive = sum(c.naive_tokens for c in contexts)
+                print(f"{rag.__class__.__name__} context: {saved} of {naive} prompt tokens saved "
+                      f"({saved / naive if naive else 0:.1%}) over {len(contexts)} requests")
+                prompts = [build_prompt(queries[i], c.text) for i, c in zip(missing, contexts)]
+                with telemetry.span("generate_response", requests=len(prompts)):
+                        count_prompt_tokens(prompts)
+                        generated = get_generator().generate_many(prompts)
+                for i, result in zip(missing, generated):
+                        answers[i] = result.text
+                        if cache:
+                                cache.put_answer(queries[i], top_k, version, result.text)
+                print(f"{rag.__class__.__name__} LLM: {generation_stats(generated)}")
+        return answers
+
+def query_rag(rag, query_item: dict, top_k: int = 10, results: dict = None, response: str = None):
         query = query_item["query"]
         relevant_chapters = query_item.get("relevant_chapters", [])
         relevant_pages = query_item.get("relevant_pages", [])
@@ -183,12 +208,23 @@ def query_rag(rag, query_item: dict, top_k: int = 10):
         start_time = time.time() 
         print("="*80)
         print(f"QUERY: {query} for {rag.__class__.__name__}")
-        results = rag.retrieve(query, top_k=top_k)
+        # rezultati mogu doci vec izracunati iz retrieve_many
+        if results is None:
+                results = rag.retrieve(query, top_k=top_k)
 
-        # queryujemo LLM
-        response = generate_response(query, results['documents'])
+        # queryujemo LLM (osim ako je isti upit vec odgovoren nad istim indexom ili je odgovor vec generisan)
+        cache = rag.cache
+        if response is None and cache:
+                response = cache.get_answer(query, top_k, rag.vector_index.version)
+        if response is None:
+                context = build_context(results)
+                print(f"Context: {context.stats()}")
+                response = generate_response(query, context.text)
+                if cache:
+                        cache.put_answer(query, top_k, rag.vector_index.version, response)
         print(f"Response: {response}")
         
+        from hnsw import HnswRAG
         is_hnsw = isinstance(rag, HnswRAG)
         for i, metadata in enumerate(results['metadatas']):
                 print(f"  Metadata: {format_metadata(metadata, is_hnsw)}")
@@ -218,11 +254,24 @@ def query_rag(rag, query_item: dict, top_k: int = 10):
 def main():
         # dodamo pdf u oba raga
         hnsw_rag, crossranking_rag = load_pdf_into_rags()
+
+        # retrieval za sva pitanja u jednom batchu po ragu
+        top_k = 10
+        queries = [q["query"] for q in QUESTIONS]
+        crossranking_results = crossranking_rag.retrieve_many(queries, top_k=top_k)
+        hnsw_results = hnsw_rag.retrieve_many(queries, top_k=top_k)
+        crossranking_answers = generate_answers(crossranking_rag, queries, crossranking_results, top_k)
+        hnsw_answers = generate_answers(hnsw_rag, queries, hnsw_results, top_k)
         
         for i, query_item in enumerate(QUESTIONS):
                 print(f"\n{i+1}. Processing Query: {query_item['query']}")
-                query_rag(crossranking_rag, query_item)
-                query_rag(hnsw_rag, query_item)
+                query_rag(crossranking_rag, query_item, top_k, crossranking_results[i], crossranking_answers[i])
+                query_rag(hnsw_rag, query_item, top_k, hnsw_results[i], hnsw_answers[i])
+
+        print(f"CrossRankingRAG cache: {crossranking_rag.cache.stats()}")
+        print(f"HnswRAG cache: {hnsw_rag.cache.stats()}")
+        # vreme po fazi (encode, pretraga, reranking, LLM...) i brojaci
+        telemetry.report()
                 
 
 if __name__ == "__main__":
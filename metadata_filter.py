@@ -0,0 +1,184 @@
+'''
+Filtriranje po metadata unutar FAISS pretrage.
+
+Filter je dict u stilu chroma where klauzule:
+    {"chapter": 20}
+    {"chapter": {"$in": [6, 17]}, "source": "data/crafting-interpreters.pdf"}
+    {"page_start": {"$gte": 100, "$lte": 200}}
+    {"pages": [349, 373]}            # chunk se preklapa sa opsegom strana
+    {"$or": [{"chapter": 6}, {"chapter": 17}]}
+
+Filter se racuna nad tipiziranim kolonama DocStore-a u bitmapu po labeli:
+- int kolone (chapter, page_start...) imaju range index - sortirane vrednosti
+  + permutaciju labela, pa je svaki uslov jedan searchsorted
+- string kolone (subchapter, source) imaju recnik vrednost -> labele
+
+Bitmapa ide u FAISS kao IDSelectorBitmap (pretraga preskace ostale labele),
+a za vrlo selektivne filtere VectorIndex pretrazuje egzaktno samo vektore
+te particije (vidi VectorIndex.search).
+'''
+
+import json
+from typing import Dict, List, Optional
+import faiss
+import numpy as np
+from doc_store import DocStore, INT_COLUMNS, MISSING, STRING_COLUMNS
+
+OPERATORS = ("$eq", "$ne", "$in", "$nin", "$gt", "$gte", "$lt", "$lte")
+
+
+def filter_key(spec: Optional[Dict]) -> Optional[str]:
+    # stabilan kljuc za keseve (redosled kljuceva ne utice)
+    return json.dumps(spec, sort_keys=True) if spec else None
+
+
+def _check_int(field: str, value):
+    try:
+        int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Filter value for '{field}' must be an integer, got {value!r}")
+
+
+def _validate_field(field: str, condition):
+    if field == "pages":
+        if not isinstance(condition, (list, tuple)) or len(condition) != 2:
+            raise ValueError(f"'pages' filter must be [first, last], got {condition!r}")
+        for value in condition:
+            _check_int(field, value)
+        return
+    if field not in INT_COLUMNS and field not in STRING_COLUMNS:
+        raise ValueError(f"Cannot filter on '{field}', supported fields: "
+                         f"{INT_COLUMNS + STRING_COLUMNS + ('pages',)}")
+    conditions = condition if isinstance(condition, dict) else {"$eq": condition}
+    for op, value in conditions.items():
+        if op not in OPERATORS:
+            raise ValueError(f"Unknown filter operator {op}, expected one of {OPERATORS}")
+        if field in STRING_COLUMNS and op not in ("$eq", "$ne", "$in", "$nin"):
+            raise ValueError(f"Operator {op} is not supported for string field '{field}'")
+        values = value if op in ("$in", "$nin") else [value]
+        if op in ("$in", "$nin") and not isinstance(value, (list, tuple)):
+            raise ValueError(f"Operator {op} expects a list, got {value!r}")
+        if field in INT_COLUMNS:
+            for v in values:
+                _check_int(field, v)
+
+
+def validate(spec: Dict):
+    """
+    Provera filtera bez indexa (npr. u serveru pre batchovanja) - ValueError za neispravan filter.
+    """
+    if not isinstance(spec, dict):
+        raise ValueError(f"Filter must be an object, got {spec!r}")
+    for field, condition in spec.items():
+        if field in ("$and", "$or"):
+            if not isinstance(condition, (list, tuple)):
+                raise ValueError(f"{field} expects a list of filters")
+            for sub in condition:
+                validate(sub)
+        else:
+            _validate_field(field, condition)
+
+
+def bitmap_selector(mask: np.ndarray):
+    """
+    IDSelectorBitmap nad bool maskom; vraca (selektor, bitovi) - bitove treba drzati dok traje pretraga.
+    """
+    bits = np.packbits(mask, bitorder='little')
+    return faiss.IDSelectorBitmap(len(mask), faiss.swig_ptr(bits)), bits
+
+
+class FilterIndex:
+    def __init__(self, docs: DocStore, alive: np.ndarray):
+        # alive - labele koje nisu obrisane
+        self.docs = docs
+        self.alive = alive
+        self.size = len(alive)
+        self._ranges = {}
+        self._values = {}
+
+    def _range(self, column: str):
+        # labele bez vrednosti (MISSING) nisu u range indexu - ne prolaze ni jedan uslov
+        if column not in self._ranges:
+            values = np.asarray(self.docs.int_columns[column])
+            present = values != MISSING
+            labels = np.flatnonzero(present)
+            order = labels[np.argsort(values[labels], kind='stable')]
+            self._ranges[column] = (values[order], order, self._labels_mask(labels))
+        return self._ranges[column]
+
+    def _value_labels(self, column: str) -> Dict[str, np.ndarray]:
+        if column not in self._values:
+            strings = self.docs.string_columns[column]
+            groups: Dict[str, List[int]] = {}
+            for label in range(len(strings)):
+                groups.setdefault(strings.get(label), []).append(label)
+            self._values[column] = {value: np.array(labels, dtype='int64') for value, labels in groups.items()}
+        return self._values[column]
+
+    def _labels_mask(self, labels: np.ndarray) -> np.ndarray:
+        mask = np.zeros(self.size, dtype=bool)
+        mask[labels] = True
+        return mask
+
+    def _int_condition(self, column: str, op: str, value) -> np.ndarray:
+        sorted_values, order, present = self._range(column)
+        if op in ("$in", "$nin"):
+            mask = np.zeros(self.size, dtype=bool)
+            for v in value:
+                mask |= self._int_condition(column, "$eq", v)
+            return mask if op == "$in" else ~mask & present
+        value = int(value)
+        if op in ("$eq", "$ne"):
+            lo, hi = np.searchsorted(sorted_values, value, 'left'), np.searchsorted(sorted_values, value, 'right')
+        elif op in ("$gt", "$gte"):
+            lo, hi = np.searchsorted(sorted_values, value, 'right' if op == "$gt" else 'left'), len(sorted_values)
+        else:
+            lo, hi = 0, np.searchsorted(sorted_values, value, 'left' if op == "$lt" else 'right')
+        mask = self._labels_mask(order[lo:hi])
+        return ~mask & present if op == "$ne" else mask
+
+    def _string_condition(self, column: str, op: str, value) -> np.ndarray:
+        index = self._value_labels(column)
+        if op in ("$eq", "$ne", "$in", "$nin"):
+            values = value if op in ("$in", "$nin") else [value]
+            labels = [index[str(v)] for v in values if str(v) in index]
+            mask = self._labels_mask(np.concatenate(labels)) if labels else np.zeros(self.size, dtype=bool)
+            return mask if op in ("$eq", "$in") else ~mask
+        raise ValueError(f"Operator {op} is not supported for string field '{column}'")
+
+    def _field(self, field: str, condition) -> np.ndarray:
+        if field == "pages":
+            # preklapanje sa opsegom [first, last]
+            first, last = condition
+            return self._int_condition("page_start", "$lte", last) & self._int_condition("page_end", "$gte", first)
+        conditions = condition if isinstance(condition, dict) else {"$eq": condition}
+        mask = np.ones(self.size, dtype=bool)
+        for op, value in conditions.items():
+            if op not in OPERATORS:
+                raise ValueError(f"Unknown filter operator {op}, expected one of {OPERATORS}")
+            if field in INT_COLUMNS:
+                mask &= self._int_condition(field, op, value)
+            elif field in STRING_COLUMNS:
+                mask &= self._string_condition(field, op, value)
+            else:
+                raise ValueError(f"Cannot filter on '{field}', supported fields: "
+                                 f"{INT_COLUMNS + STRING_COLUMNS + ('pages',)}")
+        return mask
+
+    def _evaluate(self, spec: Dict) -> np.ndarray:
+        mask = np.ones(self.size, dtype=bool)
+        for field, condition in spec.items():
+            if field == "$and":
+                for sub in condition:
+                    mask &= self._evaluate(sub)
+            elif field == "$or":
+                any_mask = np.zeros(self.size, dtype=bool)
+                for sub in condition:
+                    any_mask |= self._evaluate(sub)
+                mask &= any_mask
+            else:
+                mask &= self._field(field, condition)
+        return mask
+
+    def mask(self, spec: Dict) -> np.ndarray:
+        return self._evaluate(spec) & self.alive
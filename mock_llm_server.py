@@ -0,0 +1,114 @@
+'''
+Lokalni OpenAI kompatibilni mock server za testove i benchmark bez mreze.
+
+Podrzava POST /v1/chat/completions (stream i bez streama) i GET /v1/models.
+Kasnjenje prvog tokena, kasnjenje po tokenu i udeo gresaka (503) se
+podesavaju, pa se na njemu mogu meriti ttft, konkurentnost i retry:
+
+    python mock_llm_server.py --port 8001 --ttft-ms 300 --token-ms 20 --fail-rate 0.1
+    LLM_BASE_URL=http://127.0.0.1:8001/v1 python main.py
+'''
+
+import json
+import time
+import random
+import argparse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PORT = 8001
+TTFT_MS = 300
+TOKEN_MS = 20
+TOKENS = 64
+
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # podesava se iz main-a
+    ttft_ms = TTFT_MS
+    token_ms = TOKEN_MS
+    tokens = TOKENS
+    fail_rate = 0.0
+
+    def log_message(self, format, *args):
+        pass
+
+    def _json(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        if self.path.rstrip("/") == "/v1/models":
+            self._json(200, {"object": "list", "data": [{"id": "mock", "object": "model"}]})
+        else:
+            self._json(404, {"error": {"message": "not found"}})
+
+    def do_POST(self):
+        if self.path.rstrip("/") != "/v1/chat/completions":
+            self._json(404, {"error": {"message": "not found"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if random.random() < self.fail_rate:
+            self._json(503, {"error": {"message": "mock overloaded"}})
+            return
+
+        prompt = request["messages"][-1]["content"]
+        count = min(self.tokens, request.get("max_tokens") or self.tokens)
+        words = prompt.split() or ["mock"]
+        tokens = [words[i % len(words)] + " " for i in range(count)]
+        model = request.get("model", "mock")
+        time.sleep(self.ttft_ms / 1000)
+
+        if not request.get("stream"):
+            time.sleep(self.token_ms * count / 1000)
+            self._json(200, {
+                "id": "mock", "object": "chat.completion", "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)},
+                             "finish_reason": "stop"}]
+            })
+            return
+
+        # server-sent events u chunked transfer enkodingu
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for i, token in enumerate(tokens):
+            if i:
+                time.sleep(self.token_ms / 1000)
+            self._event({"id": "mock", "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]})
+        self._event("[DONE]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _event(self, payload):
+        data = payload if isinstance(payload, str) else json.dumps(payload)
+        chunk = f"data: {data}\n\n".encode("utf-8")
+        self.wfile.write(f"{len(chunk):x}\r\n".encode("ascii") + chunk + b"\r\n")
+        self.wfile.flush()
+
+
+def serve(port: int = PORT, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), MockLLMHandler)
+    server.daemon_threads = True
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible LLM server")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--ttft-ms", type=float, default=TTFT_MS)
+    parser.add_argument("--token-ms", type=float, default=TOKEN_MS)
+    parser.add_argument("--tokens", type=int, default=TOKENS)
+    parser.add_argument("--fail-rate", type=float, default=0.0)
+    args = parser.parse_args()
+
+    MockLLMHandler.ttft_ms = args.ttft_ms
+    MockLLMHandler.token_ms = args.token_ms
+    MockLLMHandler.tokens = args.tokens
+    MockLLMHandler.fail_rate = args.fail_rate
+    print(f"Mock LLM listening on http://127.0.0.1:{args.port}/v1")
+    serve(args.port).serve_forever()
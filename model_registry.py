@@ -0,0 +1,125 @@
+'''
+Deljeni registar modela - svaki model se ucitava jednom, tek kad zatreba.
+
+Kljuc je (vrsta, ime, backend, niti), pa oba raga, server i benchmark dele
+istu instancu modela. Vise niti koje traze isti model cekaju na isti lock,
+pa se model nikad ne ucitava dvaput.
+
+warmup() ucitava modele paralelno u pozadinskim nitima (ucitavanje tezina
+i inicijalizacija torch/onnxruntime vecinom rade bez GIL-a), a prva
+upotreba modela ceka samo ako ucitavanje jos nije gotovo.
+
+Dimenzije embedding modela se pamte u DIMS_PATH, pa FAISS index i kes
+upita znaju dimenziju bez ucitavanja modela.
+'''
+
+import os
+import json
+import time
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+EMBEDDING = "embedding"
+CROSS_ENCODER = "cross_encoder"
+DIMS_PATH = "./model_dims.json"
+WARMUP_WORKERS = 4
+
+_models: Dict[Tuple, object] = {}
+_locks: Dict[Tuple, threading.Lock] = {}
+_registry_lock = threading.Lock()
+_executor: Optional[ThreadPoolExecutor] = None
+# sekunde ucitavanja po kljucu (za startup_benchmark.py)
+load_times: Dict[Tuple, float] = {}
+
+
+def _key(kind: str, model_name: str, backend: str, threads: Optional[int]) -> Tuple:
+    return (kind, model_name, backend, threads)
+
+
+def _read_dims() -> Dict[str, int]:
+    try:
+        with open(DIMS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _remember_dim(model_name: str, dim: int):
+    with _registry_lock:
+        dims = _read_dims()
+        if dims.get(model_name) == dim:
+            return
+        dims[model_name] = dim
+        tmp = DIMS_PATH + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(dims, f, indent=2)
+        os.replace(tmp, DIMS_PATH)
+
+
+def _load(kind: str, model_name: str, backend: str, threads: Optional[int]):
+    key = _key(kind, model_name, backend, threads)
+    model = _models.get(key)
+    if model is not None:
+        return model
+    with _registry_lock:
+        lock = _locks.setdefault(key, threading.Lock())
+    with lock:
+        if key not in _models:
+            # onnx_backend uvozi sentence_transformers/onnxruntime tek u loaderu
+            from onnx_backend import load_embedding_model, load_cross_encoder
+            start = time.perf_counter()
+            loader = load_embedding_model if kind == EMBEDDING else load_cross_encoder
+            model = loader(model_name, backend, threads)
+            load_times[key] = time.perf_counter() - start
+            if kind == EMBEDDING:
+                _remember_dim(model_name, model.get_sentence_embedding_dimension())
+            _models[key] = model
+        return _models[key]
+
+
+def get_embedding_model(model_name: str, backend: str = "torch", threads: Optional[int] = None):
+    return _load(EMBEDDING, model_name, backend, threads)
+
+
+def get_cross_encoder(model_name: str, backend: str = "torch", threads: Optional[int] = None):
+    return _load(CROSS_ENCODER, model_name, backend, threads)
+
+
+def is_loaded(kind: str, model_name: str, backend: str = "torch", threads: Optional[int] = None) -> bool:
+    return _key(kind, model_name, backend, threads) in _models
+
+
+def embedding_dim(model_name: str, backend: str = "torch", threads: Optional[int] = None) -> int:
+    """
+    Dimenzija embeddinga; model se ucitava samo ako je dimenzija nepoznata (prvi start).
+    """
+    key = _key(EMBEDDING, model_name, backend, threads)
+    if key in _models:
+        return _models[key].get_sentence_embedding_dimension()
+    dim = _read_dims().get(model_name)
+    if dim is not None:
+        return dim
+    return get_embedding_model(model_name, backend, threads).get_sentence_embedding_dimension()
+
+
+def run_in_background(fn: Callable, *args) -> Future:
+    # zajednicki pool za warmup (modeli, indexi)
+    global _executor
+    with _registry_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=WARMUP_WORKERS, thread_name_prefix="warmup")
+    return _executor.submit(fn, *args)
+
+
+def warmup(specs: List[Tuple[str, str, str, Optional[int]]]) -> List[Future]:
+    """
+    Paralelno ucitavanje modela; specs su (vrsta, ime, backend, niti).
+    Vec ucitani modeli se preskacu, a isti model trazen dvaput se ucitava jednom.
+    """
+    return [run_in_background(_load, *spec) for spec in specs if not is_loaded(*spec)]
+
+
+def stats() -> Dict:
+    return {f"{kind}:{name}[{backend}]": round(seconds, 3)
+            for (kind, name, backend, _), seconds in load_times.items()}
@@ -0,0 +1,273 @@
+'''
+ONNX Runtime backend za embedding i cross-encoder modele.
+
+Modeli se jednom izvezu iz PyTorch-a u ONNX (opciono sa dinamickom int8
+kvantizacijom tezina) i cuvaju u ONNX_DIR. Posle toga inference ide kroz
+onnxruntime na CPU sa podesivim brojem intra-op niti, bez torch-a.
+Parity provera naspram PyTorch modela: python onnx_backend.py
+
+backend:
+- "torch"     - SentenceTransformer / CrossEncoder kao do sada
+- "onnx"      - ONNX fp32
+- "onnx-int8" - ONNX sa int8 dinamickom kvantizacijom
+'''
+
+import os
+import json
+from typing import Dict, List, Optional
+import numpy as np
+
+ONNX_DIR = "./onnx"
+BACKENDS = ("torch", "onnx", "onnx-int8")
+OPSET = 17
+PARITY_SAMPLES = [
+    "How does the book implement string interning in the hash table?",
+    "A closure captures the variables of its enclosing scope.",
+    "The resolver walks the syntax tree once before the interpreter runs."
+]
+# dozvoljeno odstupanje ONNX od PyTorch (int8 je gruba aproksimacija)
+PARITY_TOLERANCE = {"onnx": 1e-3, "onnx-int8": 0.1}
+
+
+def _model_dir(model_name: str, kind: str) -> str:
+    return os.path.join(ONNX_DIR, kind, model_name.replace("/", "__"))
+
+
+def _session(path: str, threads: Optional[int]):
+    import onnxruntime as ort
+    options = ort.SessionOptions()
+    options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    if threads:
+        options.intra_op_num_threads = threads
+    options.inter_op_num_threads = 1
+    return ort.InferenceSession(path, sess_options=options, providers=["CPUExecutionProvider"])
+
+
+def _export(model, tokenizer, out_dir: str, config: Dict):
+    import torch
+
+    os.makedirs(out_dir, exist_ok=True)
+    sample = tokenizer(["hello world"], ["hello"] if config.get("pairs") else None,
+                       padding=True, truncation=True, return_tensors="pt")
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in sample]
+    dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+    # embedding izlaz je [batch, sequence, dim], cross-encoder [batch, labels]
+    dynamic_axes["output"] = {0: "batch"} if config.get("pairs") else {0: "batch", 1: "sequence"}
+
+    model.eval()
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[name] for name in input_names),
+            os.path.join(out_dir, "model.onnx"),
+            input_names=input_names,
+            output_names=["output"],
+            dynamic_axes=dynamic_axes,
+            opset_version=OPSET,
+            do_constant_folding=True,
+            dynamo=False
+        )
+    tokenizer.save_pretrained(out_dir)
+
+    # int8 varijanta se pravi odmah, da izbor backenda ne trazi ponovni izvoz
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+    quantize_dynamic(os.path.join(out_dir, "model.onnx"), os.path.join(out_dir, "model_int8.onnx"),
+                     weight_type=QuantType.QInt8)
+
+    config["inputs"] = input_names
+    with open(os.path.join(out_dir, "config.json"), "w", encoding="utf-8") as f:
+        json.dump(config, f)
+
+
+def _model_file(out_dir: str, backend: str) -> str:
+    return os.path.join(out_dir, "model_int8.onnx" if backend == "onnx-int8" else "model.onnx")
+
+
+class OnnxSentenceEncoder:
+    """
+    Zamena za SentenceTransformer.encode preko onnxruntime.
+    """
+    def __init__(self, model_dir: str, backend: str = "onnx", threads: Optional[int] = None):
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = _session(_model_file(model_dir, backend), threads)
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.config["dim"]
+
+    def encode(self, sentences, batch_size: int = 32, show_progress_bar: bool = False,
+               convert_to_numpy: bool = True, normalize_embeddings: bool = False) -> np.ndarray:
+        if isinstance(sentences, str):
+            sentences = [sentences]
+        outputs = []
+        for i in range(0, len(sentences), batch_size):
+            batch = self.tokenizer(sentences[i:i + batch_size], padding=True, truncation=True,
+                                   max_length=self.config["max_seq_length"], return_tensors="np")
+            feeds = {name: batch[name].astype('int64') for name in self.config["inputs"]}
+            hidden = self.session.run(None, feeds)[0]
+
+            if self.config["pooling"] == "cls":
+                pooled = hidden[:, 0]
+            else:
+                mask = batch["attention_mask"][..., None].astype('float32')
+                pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            outputs.append(pooled.astype('float32'))
+
+        embeddings = np.vstack(outputs) if outputs else np.zeros((0, self.config["dim"]), dtype='float32')
+        if normalize_embeddings or self.config["normalize"]:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings
+
+
+class OnnxCrossEncoder:
+    """
+    Zamena za CrossEncoder.predict preko onnxruntime.
+    """
+    def __init__(self, model_dir: str, backend: str = "onnx", threads: Optional[int] = None):
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(model_dir, "config.json"), "r", encoding="utf-8") as f:
+            self.config = json.load(f)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.session = _session(_model_file(model_dir, backend), threads)
+
+    def predict(self, pairs, batch_size: int = 32, show_progress_bar: bool = False) -> np.ndarray:
+        scores = []
+        for i in range(0, len(pairs), batch_size):
+            batch_pairs = pairs[i:i + batch_size]
+            batch = self.tokenizer([p[0] for p in batch_pairs], [p[1] for p in batch_pairs],
+                                   padding=True, truncation="longest_first",
+                                   max_length=self.config["max_length"], return_tensors="np")
+            feeds = {name: batch[name].astype('int64') for name in self.config["inputs"]}
+            logits = self.session.run(None, feeds)[0]
+            scores.append(logits[:, 0] if logits.shape[1] == 1 else logits)
+
+        scores = np.concatenate(scores) if scores else np.zeros(0, dtype='float32')
+        if self.config["activation"] == "sigmoid":
+            scores = 1 / (1 + np.exp(-scores))
+        return scores
+
+
+def export_sentence_encoder(model_name: str) -> str:
+    from sentence_transformers import SentenceTransformer
+    from sentence_transformers.models import Normalize, Pooling
+    import torch
+
+    out_dir = _model_dir(model_name, "embedding")
+    st = SentenceTransformer(model_name, device="cpu")
+    pooling = next(m for m in st if isinstance(m, Pooling))
+
+    class _Hidden(torch.nn.Module):
+        # izvozimo samo transformer, pooling radimo u numpy
+        def __init__(self, auto_model):
+            super().__init__()
+            self.auto_model = auto_model
+
+        def forward(self, *inputs):
+            return self.auto_model(*inputs).last_hidden_state
+
+    print(f"Exporting {model_name} to ONNX...")
+    _export(_Hidden(st[0].auto_model), st.tokenizer, out_dir, {
+        "model_name": model_name,
+        "dim": st.get_sentence_embedding_dimension(),
+        "max_seq_length": st.max_seq_length,
+        "pooling": "cls" if pooling.pooling_mode_cls_token else "mean",
+        "normalize": any(isinstance(m, Normalize) for m in st)
+    })
+    return out_dir
+
+
+def export_cross_encoder(model_name: str) -> str:
+    from sentence_transformers import CrossEncoder
+    import torch
+
+    out_dir = _model_dir(model_name, "cross_encoder")
+    ce = CrossEncoder(model_name, device="cpu")
+    activation = getattr(ce, "activation_fn", None) or getattr(ce, "default_activation_function", None)
+
+    class _Logits(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(*inputs).logits
+
+    print(f"Exporting {model_name} to ONNX...")
+    _export(_Logits(ce.model), ce.tokenizer, out_dir, {
+        "model_name": model_name,
+        "pairs": True,
+        "max_length": ce.max_length or ce.tokenizer.model_max_length,
+        "activation": "sigmoid" if isinstance(activation, torch.nn.Sigmoid) else "identity"
+    })
+    return out_dir
+
+
+def check_embedding_parity(model_name: str, backend: str, texts: List[str] = PARITY_SAMPLES) -> Dict:
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(model_name, device="cpu").encode(texts, convert_to_numpy=True)
+    candidate = load_embedding_model(model_name, backend).encode(texts)
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    return {
+        "max_abs_diff": float(np.abs(reference - candidate).max()),
+        "min_cosine": float((reference * candidate).sum(axis=1).min())
+    }
+
+
+def check_cross_encoder_parity(model_name: str, backend: str, texts: List[str] = PARITY_SAMPLES) -> Dict:
+    from sentence_transformers import CrossEncoder
+
+    pairs = [[q, d] for q in texts for d in texts]
+    reference = np.asarray(CrossEncoder(model_name, device="cpu").predict(pairs))
+    candidate = load_cross_encoder(model_name, backend).predict(pairs)
+    return {
+        "max_abs_diff": float(np.abs(reference - candidate).max()),
+        "same_ranking": bool((np.argsort(-reference.reshape(len(texts), -1), axis=1) ==
+                              np.argsort(-candidate.reshape(len(texts), -1), axis=1)).all())
+    }
+
+
+def _report_parity(model_name: str, backend: str, result: Dict):
+    status = "OK" if result["max_abs_diff"] <= PARITY_TOLERANCE[backend] else "WARNING: over tolerance"
+    print(f"Parity {model_name} [{backend}] vs torch: {result} {status}")
+
+
+def load_embedding_model(model_name: str, backend: str = "torch", threads: Optional[int] = None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+    if backend == "torch":
+        from sentence_transformers import SentenceTransformer
+        return SentenceTransformer(model_name)
+
+    model_dir = _model_dir(model_name, "embedding")
+    if not os.path.exists(os.path.join(model_dir, "config.json")):
+        export_sentence_encoder(model_name)
+    return OnnxSentenceEncoder(model_dir, backend, threads)
+
+
+def load_cross_encoder(model_name: str, backend: str = "torch", threads: Optional[int] = None):
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend}, expected one of {BACKENDS}")
+    if backend == "torch":
+        from sentence_transformers import CrossEncoder
+        return CrossEncoder(model_name)
+
+    model_dir = _model_dir(model_name, "cross_encoder")
+    if not os.path.exists(os.path.join(model_dir, "config.json")):
+        export_cross_encoder(model_name)
+    return OnnxCrossEncoder(model_dir, backend, threads)
+
+
+if __name__ == "__main__":
+    # python onnx_backend.py - izvoz i parity provera za modele oba raga
+    for name in ("BAAI/bge-large-en-v1.5", "all-MiniLM-L6-v2"):
+        for b in ("onnx", "onnx-int8"):
+            _report_parity(name, b, check_embedding_parity(name, b))
+    for b in ("onnx", "onnx-int8"):
+        name = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+        _report_parity(name, b, check_cross_encoder_parity(name, b))
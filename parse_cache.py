@@ -0,0 +1,128 @@
+'''
+Kes parsiranih PDF-ova na disku.
+
+Kljuc je sha256 sadrzaja PDF-a + podesavanja parsera, pa promena fajla ili
+podesavanja automatski pravi novi unos. Za svaki PDF cuvamo:
+- elements.jsonl.gz                   - elementi iz partition_pdf
+- paragraphs_<min_len>.jsonl.gz       - rezultat extract_paragraphs
+- chunks_<size>_<overlap>_<pages>.jsonl.gz - chunkovi (pages - strana po shardu)
+
+Svaki fajl je gzip sa jednim json objektom po redu, pa streaming parsiranje
+pise element po element (writer) a citanje ide red po red (iter_load) -
+ni jedno ni drugo ne drzi ceo PDF u memoriji. Fajl se pise u .tmp i
+preimenuje tek kad je ceo PDF prosao.
+
+Sve se ucitava lenjo - ako su paragrafi/chunkovi vec u kesu, elementi se
+uopste ne citaju, a novi chunk_size/overlap ne trazi ponovni layout.
+'''
+
+import os
+import gzip
+import json
+import hashlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+CACHE_DIR = "./parse_cache"
+# povecati kad se promeni logika parsera
+PARSER_VERSION = 1
+
+
+def file_hash(path: str) -> str:
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def _read_lines(path: str) -> Iterator:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            yield json.loads(line)
+
+
+class CacheWriter:
+    """
+    Dopisuje stavke u .tmp fajl; commit() ga preimenuje u pravi, abort() brise.
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.tmp = path + ".tmp"
+        self._file = gzip.open(self.tmp, "wt", encoding="utf-8")
+
+    def write(self, item):
+        self._file.write(json.dumps(item))
+        self._file.write("\n")
+
+    def extend(self, items: Iterable):
+        for item in items:
+            self.write(item)
+
+    def commit(self):
+        self._file.close()
+        os.replace(self.tmp, self.path)
+
+    def abort(self):
+        if not self._file.closed:
+            self._file.close()
+            os.remove(self.tmp)
+
+
+class ParseCache:
+    def __init__(self, cache_dir: str = CACHE_DIR):
+        self.cache_dir = cache_dir
+
+    def entry_dir(self, pdf_path: str, settings: Dict) -> str:
+        settings_hash = hashlib.sha1(json.dumps({**settings, "version": PARSER_VERSION},
+                                                sort_keys=True).encode("utf-8")).hexdigest()[:12]
+        return os.path.join(self.cache_dir, f"{file_hash(pdf_path)[:32]}_{settings_hash}")
+
+    def _path(self, entry: str, name: str) -> str:
+        return os.path.join(entry, name + ".jsonl.gz")
+
+    def iter_load(self, entry: str, name: str) -> Optional[Iterator]:
+        """
+        Stavke red po red; None ako unosa nema.
+        """
+        path = self._path(entry, name)
+        if not os.path.exists(path):
+            return None
+        return _read_lines(path)
+
+    def load(self, entry: str, name: str) -> Optional[List]:
+        items = self.iter_load(entry, name)
+        if items is None:
+            return None
+        try:
+            return list(items)
+        except (OSError, ValueError, EOFError):
+            return None
+
+    def writer(self, entry: str, name: str) -> CacheWriter:
+        os.makedirs(entry, exist_ok=True)
+        return CacheWriter(self._path(entry, name))
+
+    def save(self, entry: str, name: str, data: Iterable):
+        writer = self.writer(entry, name)
+        try:
+            writer.extend(data)
+            writer.commit()
+        finally:
+            writer.abort()
+
+    def iter_elements(self, entry: str) -> Optional[Iterator]:
+        # elementi jedan po jedan (streaming)
+        from unstructured.staging.base import elements_from_dicts
+        dicts = self.iter_load(entry, "elements")
+        if dicts is None:
+            return None
+        return (elements_from_dicts([d])[0] for d in dicts)
+
+    def load_elements(self, entry: str) -> Optional[list]:
+        from unstructured.staging.base import elements_from_dicts
+        dicts = self.load(entry, "elements")
+        return elements_from_dicts(dicts) if dicts is not None else None
+
+    def save_elements(self, entry: str, elements: list):
+        from unstructured.staging.base import elements_to_dicts
+        self.save(entry, "elements", elements_to_dicts(elements))
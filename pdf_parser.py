@@ -1,36 +1,263 @@
 """
 PDF Parser for extracting chapters, subchapters, and paragraphs with metadata.
 Uses the unstructured library for better document structure detection.
+
+Sa workers > 1 PDF se deli na opsege strana koji se parsiraju paralelno u
+process poolu i spajaju po redosledu strana.
+
+Sa cache (ParseCache) elementi, paragrafi i chunkovi se cuvaju na disku po
+hash-u PDF-a, i elementi se parsiraju tek kad zatrebaju. Streaming putanja
+(iter_*) pise u kes dok ide, bez skupljanja celog PDF-a u listu.
 """
 
-from typing import List, Dict
-from unstructured.partition.pdf import partition_pdf
-from unstructured.documents.elements import Title, NarrativeText, Text
-from unstructured.chunking.basic import chunk_elements
+import os
+import time
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
+from parse_cache import ParseCache
+import telemetry
 import re
 
 MIN_PARAGRAPH_LENGTH = 50
 CHUNK_SIZE = 4
+PAGES_PER_SHARD = 50
+# podesavanja partition_pdf (deo kljuca u kesu parsiranja)
+PARSE_SETTINGS = {
+    "strategy": "fast",
+    "infer_table_structure": False,
+    "extract_images_in_pdf": False,
+    "include_page_breaks": True
+}
+
+
+def _partition(filename: str, starting_page_number: int = 1):
+    # unstructured se uvozi tek kad stvarno parsiramo (import traje sekundama)
+    from unstructured.partition.pdf import partition_pdf
+    # nema slika i tabela
+    return partition_pdf(
+        filename=filename,
+        starting_page_number=starting_page_number,
+        **PARSE_SETTINGS
+    )
+
+
+def _page_count(pdf_path: str) -> int:
+    from pypdf import PdfReader
+    return len(PdfReader(pdf_path).pages)
+
+
+def _partition_shard(pdf_path: str, start: int, end: int) -> Tuple[int, int, list, float]:
+    """
+    Parsira strane [start, end] (od 1) u zasebnom procesu.
+    Opseg se prepisuje u privremeni PDF, a starting_page_number cuva prave brojeve strana.
+    """
+    from pypdf import PdfReader, PdfWriter
+
+    started = time.perf_counter()
+    reader = PdfReader(pdf_path)
+    writer = PdfWriter()
+    for page in reader.pages[start - 1:end]:
+        writer.add_page(page)
+    fd, shard_path = tempfile.mkstemp(suffix=".pdf")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            writer.write(f)
+        elements = _partition(shard_path, starting_page_number=start)
+    finally:
+        os.remove(shard_path)
+    return start, end, elements, time.perf_counter() - started
+
+
+def _page_of(element) -> Optional[int]:
+    metadata = getattr(element, "metadata", None)
+    return getattr(metadata, "page_number", None)
+
+
+def _group_by_shard(elements: Iterable, pages_per_shard: int) -> Iterator[list]:
+    """
+    Deli elemente (po redosledu strana) na opsege od pages_per_shard strana -
+    iste granice kao paralelno parsiranje, pa i isti chunkovi.
+    Element bez broja strane ide u opseg prethodnog.
+    """
+    group, current = [], None
+    for element in elements:
+        page = _page_of(element)
+        shard = (page - 1) // pages_per_shard if page else current
+        if group and shard != current:
+            yield group
+            group = []
+        current = shard
+        group.append(element)
+    if group:
+        yield group
+
+
+class ParagraphState:
+    """
+    Stanje chapter/subchapter masine koje se prenosi izmedju grupa elemenata (shardova).
+    """
+    def __init__(self):
+        self.current_chapter = "0"
+        self.current_subchapter = None
+        self.current_page = 1
+
 
 class PDFParser:
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: str, workers: Optional[int] = None, pages_per_shard: int = PAGES_PER_SHARD,
+                 cache: Optional[ParseCache] = None):
         self.pdf_path = pdf_path
-        # nema slika i tabela
-        self.elements = partition_pdf(
-            filename=pdf_path,
-            strategy="fast",  
-            infer_table_structure=False,  
-            extract_images_in_pdf=False,
-            include_page_breaks=True
-        )
-        print(f"Total elements from PDF: {len(self.elements)}")
+        self.workers = workers
+        self.pages_per_shard = pages_per_shard
+        self.shard_timings = []
+        self.cache = cache
+        self.cache_entry = cache.entry_dir(pdf_path, PARSE_SETTINGS) if cache else None
+        self._elements = None
+
+    @property
+    def elements(self) -> list:
+        # parsiramo tek kad elementi zatrebaju (i samo ako nisu u kesu)
+        if self._elements is None:
+            if self.cache:
+                self._elements = self.cache.load_elements(self.cache_entry)
+            if self._elements is None:
+                with telemetry.span("pdf_partition", source=self.pdf_path, workers=self.workers or 1):
+                    if self.workers is not None and self.workers > 1:
+                        self._elements = self._partition_parallel(self.workers, self.pages_per_shard)
+                    else:
+                        self._elements = _partition(self.pdf_path)
+                if self.cache:
+                    self.cache.save_elements(self.cache_entry, self._elements)
+            print(f"Total elements from PDF: {len(self._elements)}")
+        return self._elements
+
+    def _cached(self, name: str, compute) -> List[Dict]:
+        if self.cache is None:
+            return compute()
+        result = self.cache.load(self.cache_entry, name)
+        if result is None:
+            result = compute()
+            self.cache.save(self.cache_entry, name, result)
+        return result
+
+    def iter_shards(self) -> Iterator[list]:
+        """
+        Elementi shard po shard (po redosledu strana) bez drzanja celog PDF-a u memoriji.
+        Sa workers > 1 najvise workers shardova se parsira unapred.
+        Sa kesom se elementi dopisuju u kes shard po shard, a kesirani PDF se
+        cita red po red i deli na iste opsege strana.
+        """
+        if self._elements is not None:
+            yield from _group_by_shard(self._elements, self.pages_per_shard)
+            return
+        if self.cache:
+            cached = self.cache.iter_elements(self.cache_entry)
+            if cached is not None:
+                # vec parsiran PDF - nema potrebe za layoutom
+                yield from _group_by_shard(cached, self.pages_per_shard)
+                return
+
+        pages = _page_count(self.pdf_path)
+        ranges = [(start, min(start + self.pages_per_shard - 1, pages))
+                  for start in range(1, pages + 1, self.pages_per_shard)]
+        workers = self.workers or 1
+        writer = self.cache.writer(self.cache_entry, "elements") if self.cache else None
+        try:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = deque()
+                for start, end in ranges:
+                    pending.append(pool.submit(_partition_shard, self.pdf_path, start, end))
+                    if len(pending) >= workers:
+                        yield self._shard_done(pending.popleft().result(), writer)
+                while pending:
+                    yield self._shard_done(pending.popleft().result(), writer)
+            if writer is not None:
+                writer.commit()
+        finally:
+            # prekinut PDF ne ostavlja polovican unos u kesu
+            if writer is not None:
+                writer.abort()
+
+    def _shard_done(self, shard, writer=None) -> list:
+        start, end, elements, seconds = shard
+        if writer is not None:
+            from unstructured.staging.base import elements_to_dicts
+            writer.extend(elements_to_dicts(elements))
+        self.shard_timings.append({"pages": (start, end), "elements": len(elements), "seconds": seconds})
+        # shard se parsira u drugom procesu, pa samo belezimo njegovo vreme
+        telemetry.record("pdf_shard", seconds, pages=f"{start}-{end}")
+        print(f"  Shard pages {start}-{end}: {len(elements)} elements in {seconds:.2f}s")
+        return elements
+
+    def _iter_cached(self, name: str, compute: Iterator[Dict]) -> Iterator[Dict]:
+        # kao _cached, ali za streaming - stavke se dopisuju u kes dok prolaze
+        if self.cache is None:
+            yield from compute
+            return
+        cached = self.cache.iter_load(self.cache_entry, name)
+        if cached is not None:
+            yield from cached
+            return
+        writer = self.cache.writer(self.cache_entry, name)
+        try:
+            for item in compute:
+                writer.write(item)
+                yield item
+            writer.commit()
+        finally:
+            writer.abort()
+
+    def iter_paragraphs(self) -> Iterator[Dict]:
+        # stanje poglavlja se prenosi preko granica shardova
+        def compute():
+            state = ParagraphState()
+            for elements in self.iter_shards():
+                yield from self.paragraphs_from(elements, state)
+        return self._iter_cached(f"paragraphs_{MIN_PARAGRAPH_LENGTH}", compute())
+
+    def iter_fixed_size_chunks(self, chunk_size: int = 512, overlap: int = 64) -> Iterator[Dict]:
+        # chunk ne prelazi granicu sharda (granice su na kraju strane)
+        def compute():
+            for elements in self.iter_shards():
+                yield from self._fixed_size_chunks(chunk_size, overlap, elements)
+        return self._iter_cached(self._chunks_name(chunk_size, overlap), compute())
+
+    def _chunks_name(self, chunk_size: int, overlap: int) -> str:
+        # chunkovi zavise i od granica shardova, pa je velicina sharda deo kljuca
+        return f"chunks_{chunk_size}_{overlap}_{self.pages_per_shard}"
+
+    def _partition_parallel(self, workers: int, pages_per_shard: int) -> list:
+        pages = _page_count(self.pdf_path)
+        ranges = [(start, min(start + pages_per_shard - 1, pages)) for start in range(1, pages + 1, pages_per_shard)]
+        print(f"Parsing {pages} pages in {len(ranges)} shards with {workers} workers...")
+
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(_partition_shard, self.pdf_path, start, end) for start, end in ranges]
+            shards = [future.result() for future in futures]
+
+        # spajamo po redosledu strana
+        elements = []
+        for shard in sorted(shards, key=lambda shard: shard[0]):
+            elements.extend(self._shard_done(shard))
+        return elements
     
     
     def extract_fixed_size_chunks(self, chunk_size: int = 512, overlap: int = 64) -> List[Dict]:
         """
         Extracts fixed-size text chunks from the PDF elements using unstructured library.
         """
-        chunks = chunk_elements(self.elements, max_characters=chunk_size, new_after_n_chars=chunk_size, overlap=overlap)
+        with telemetry.span("pdf_chunks", source=self.pdf_path, chunk_size=chunk_size, overlap=overlap):
+            # po opsezima strana kao iter_fixed_size_chunks - obe putanje daju iste chunkove
+            return self._cached(self._chunks_name(chunk_size, overlap), lambda: [
+                chunk for elements in _group_by_shard(self.elements, self.pages_per_shard)
+                for chunk in self._fixed_size_chunks(chunk_size, overlap, elements)
+            ])
+
+    def _fixed_size_chunks(self, chunk_size: int, overlap: int, elements=None) -> List[Dict]:
+        from unstructured.chunking.basic import chunk_elements
+        elements = self.elements if elements is None else elements
+        chunks = chunk_elements(elements, max_characters=chunk_size, new_after_n_chars=chunk_size, overlap=overlap)
         
         formatted_chunks = []
         
@@ -58,18 +285,26 @@ class PDFParser:
         """
         Uzima paragrafe iz PDFa
         """
+        with telemetry.span("pdf_paragraphs", source=self.pdf_path):
+            return self._cached(f"paragraphs_{MIN_PARAGRAPH_LENGTH}",
+                                lambda: self.paragraphs_from(self.elements, ParagraphState()))
+
+    @staticmethod
+    def paragraphs_from(elements, state: ParagraphState) -> List[Dict]:
+        """
+        Paragrafi iz niza elemenata; state se azurira, pa sledeca grupa
+        elemenata (npr. sledeci shard) nastavlja od istog poglavlja.
+        """
+        from unstructured.documents.elements import NarrativeText, Text
         paragraphs = []
-        current_chapter = "0"
-        current_subchapter = None
-        current_page = 1
         
-        for element in self.elements:
+        for element in elements:
             # metadata
             metadata = element.metadata if hasattr(element, 'metadata') else None
-            page_num = metadata.page_number if metadata and hasattr(metadata, 'page_number') else current_page
+            page_num = metadata.page_number if metadata and hasattr(metadata, 'page_number') else state.current_page
             
-            if page_num != current_page:
-                current_page = page_num
+            if page_num != state.current_page:
+                state.current_page = page_num
             
             text = str(element).strip()
             
@@ -80,11 +315,11 @@ class PDFParser:
                 section_num = section_match.group(1).replace(' ', '')
                 parts = section_num.split('.')
                 if len(parts) == 1:
-                    current_chapter = section_num
-                    current_subchapter = None
+                    state.current_chapter = section_num
+                    state.current_subchapter = None
                 else:
-                    current_chapter = parts[0]
-                    current_subchapter = section_num
+                    state.current_chapter = parts[0]
+                    state.current_subchapter = section_num
                 continue
             
             # paragrafi
@@ -94,9 +329,9 @@ class PDFParser:
                     
                     paragraphs.append({
                         'content': text,
-                        'chapter': current_chapter,
-                        'chapter_number': current_chapter,
-                        'subchapter': current_subchapter or "",
+                        'chapter': state.current_chapter,
+                        'chapter_number': state.current_chapter,
+                        'subchapter': state.current_subchapter or "",
                         'page_start': page_num,
                         'page_end': page_num
                     })
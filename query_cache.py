@@ -0,0 +1,234 @@
+'''
+Kes za upite ispred retrievala i generisanja odgovora.
+
+Dva nivoa:
+- exact: LRU sa TTL po tekstu upita (bez enkodiranja upita)
+- semanticki: mali FAISS IndexFlatIP nad embeddingzima ranijih upita; ako je
+  novi upit dovoljno slican (cosine >= threshold) vracamo ranije rezultate
+
+Kes je vezan za verziju indexa - svaka izmena indexa (add/update/delete)
+povecava verziju i kes se prazni.
+'''
+
+import time
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import telemetry
+
+MAX_ENTRIES = 1024
+TTL_SECONDS = 3600
+SIMILARITY_THRESHOLD = 0.95
+# koliko najblizih ranijih upita proveravamo u semantickom nivou
+SEMANTIC_CANDIDATES = 4
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def _normalized(query_emb: np.ndarray) -> np.ndarray:
+    emb = np.array(query_emb, dtype='float32').reshape(1, -1)
+    return emb / max(float(np.linalg.norm(emb)), 1e-12)
+
+
+def _slice_results(results: Dict, top_k: int) -> Dict:
+    return {key: value[:top_k] if isinstance(value, list) else value for key, value in results.items()}
+
+
+class QueryCache:
+    def __init__(self, dim: int, max_entries: int = MAX_ENTRIES, ttl: float = TTL_SECONDS,
+                 similarity_threshold: float = SIMILARITY_THRESHOLD, semantic: bool = True,
+                 reuse_answers: bool = False):
+        self.dim = dim
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.semantic = semantic
+        # da li i odgovor LLM-a vazi za semanticki slican upit
+        self.reuse_answers = reuse_answers
+
+        self.version = None
+        self._entries = OrderedDict()
+        self._emb_keys = {}
+        self._next_emb_id = 0
+        # faiss se uvozi tek ovde, da import main-a ostane brz
+        import faiss
+        self._semantic_index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        self._lock = threading.Lock()
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.answer_hits = 0
+        self.answer_misses = 0
+        self.evictions = 0
+
+    def _key(self, query: str, top_k: int):
+        return (_normalize_query(query), top_k)
+
+    def _check_version(self, version):
+        if version != self.version:
+            self._clear()
+            self.version = version
+
+    def _clear(self):
+        self._entries.clear()
+        self._emb_keys.clear()
+        self._semantic_index.reset()
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        emb_id = entry.get("emb_id")
+        if emb_id is not None:
+            self._semantic_index.remove_ids(np.array([emb_id], dtype='int64'))
+            del self._emb_keys[emb_id]
+
+    def _get_entry(self, key) -> Optional[Dict]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry["time"] > self.ttl:
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def _put_entry(self, key, entry: Dict):
+        if key in self._entries:
+            self._drop(key)
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            self._drop(next(iter(self._entries)))
+            self.evictions += 1
+            telemetry.count("query_cache", state="eviction")
+
+    def get(self, query: str, top_k: int, version) -> Optional[Dict]:
+        with self._lock:
+            self._check_version(version)
+            entry = self._get_entry(self._key(query, top_k))
+            if entry is None:
+                return None
+            self.exact_hits += 1
+            telemetry.count("query_cache", state="exact_hit")
+            return _slice_results(entry["results"], top_k)
+
+    def get_similar(self, query: str, query_emb: np.ndarray, top_k: int, version) -> Optional[Dict]:
+        if not self.semantic:
+            return None
+        with self._lock:
+            self._check_version(version)
+            if self._semantic_index.ntotal == 0:
+                return None
+            emb = _normalized(query_emb)
+            sims, emb_ids = self._semantic_index.search(emb, min(SEMANTIC_CANDIDATES, self._semantic_index.ntotal))
+            for sim, emb_id in zip(sims[0], emb_ids[0]):
+                if emb_id < 0 or sim < self.similarity_threshold:
+                    break
+                source_key = self._emb_keys[emb_id]
+                entry = self._get_entry(source_key)
+                if entry is None or source_key[1] < top_k:
+                    continue
+                # exact alias da sledeci isti upit ne mora da se enkodira
+                alias = {"results": entry["results"], "time": entry["time"]}
+                if self.reuse_answers and "answer" in entry:
+                    alias["answer"] = entry["answer"]
+                self._put_entry(self._key(query, top_k), alias)
+                self.semantic_hits += 1
+                telemetry.count("query_cache", state="semantic_hit")
+                return _slice_results(entry["results"], top_k)
+            return None
+
+    def put(self, query: str, top_k: int, version, results: Dict, query_emb: Optional[np.ndarray] = None):
+        with self._lock:
+            self._check_version(version)
+            entry = {"results": results, "time": time.monotonic()}
+            key = self._key(query, top_k)
+            if self.semantic and query_emb is not None:
+                emb = _normalized(query_emb)
+                emb_id = self._next_emb_id
+                self._next_emb_id += 1
+                if key in self._entries:
+                    self._drop(key)
+                self._semantic_index.add_with_ids(emb, np.array([emb_id], dtype='int64'))
+                self._emb_keys[emb_id] = key
+                entry["emb_id"] = emb_id
+            self._put_entry(key, entry)
+
+    def miss(self, count: int = 1):
+        with self._lock:
+            self.misses += count
+        telemetry.count("query_cache", count, state="miss")
+
+    def get_answer(self, query: str, top_k: int, version) -> Optional[str]:
+        with self._lock:
+            self._check_version(version)
+            entry = self._get_entry(self._key(query, top_k))
+            if entry is None or "answer" not in entry:
+                self.answer_misses += 1
+                telemetry.count("answer_cache", state="miss")
+                return None
+            self.answer_hits += 1
+            telemetry.count("answer_cache", state="hit")
+            return entry["answer"]
+
+    def put_answer(self, query: str, top_k: int, version, answer: str):
+        with self._lock:
+            self._check_version(version)
+            entry = self._get_entry(self._key(query, top_k))
+            if entry is not None:
+                entry["answer"] = answer
+
+    def retrieve_many(self, version, queries: List[str], top_k: int,
+                      encode: Callable[[List[str]], np.ndarray],
+                      search: Callable[[List[str], np.ndarray], List[Dict]]) -> List[Dict]:
+        """
+        Retrieval kroz kes: exact pogoci ne enkoduju upit, semanticki
+        pogoci preskacu pretragu, a samo promasaji idu u search.
+        """
+        results = [None] * len(queries)
+        pending = []
+        for i, query in enumerate(queries):
+            hit = self.get(query, top_k, version)
+            if hit is not None:
+                results[i] = hit
+            else:
+                pending.append(i)
+        if not pending:
+            return results
+
+        query_embs = encode([queries[i] for i in pending])
+        miss_rows = []
+        for row, i in enumerate(pending):
+            hit = self.get_similar(queries[i], query_embs[row], top_k, version)
+            if hit is not None:
+                results[i] = hit
+            else:
+                miss_rows.append(row)
+        if not miss_rows:
+            return results
+
+        self.miss(len(miss_rows))
+        fresh = search([queries[pending[row]] for row in miss_rows], query_embs[miss_rows])
+        for row, result in zip(miss_rows, fresh):
+            i = pending[row]
+            results[i] = result
+            # delimicni rezultati (probijen budzet rerankinga) se ne kesiraju
+            if not result.get("partial"):
+                self.put(queries[i], top_k, version, result, query_embs[row])
+        return results
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.exact_hits + self.semantic_hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "exact_hits": self.exact_hits,
+                "semantic_hits": self.semantic_hits,
+                "misses": self.misses,
+                "hit_rate": (self.exact_hits + self.semantic_hits) / lookups if lookups else 0.0,
+                "answer_hits": self.answer_hits,
+                "answer_misses": self.answer_misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,24 @@
+"""
+Pitanja za evaluaciju sa oznakama relevantnosti.
+
+relevant_chapters - relevantna poglavlja (za CrossRankingRAG, paragrafi imaju chapter)
+relevant_pages    - relevantni intervali strana [od, do] (za HnswRAG, chunkovi imaju samo stranu)
+"""
+
+QUESTIONS = [
+    {
+        "query": "How does the book implement string interning in the hash table, and what performance benefits does this optimization provide?",
+        "relevant_chapters": [20],
+        "relevant_pages": [[349, 373]]
+    },
+    {
+        "query": "Compare the parsing strategies of jlox and clox: which algorithms are used and how do they represent grammar rules?",
+        "relevant_chapters": [6, 17],
+        "relevant_pages": [[76, 94], [297, 318]]
+    },
+    {
+        "query": "Why does jlox require a separate 'Resolver' pass before interpretation, and how does it use 'distance' (or hops) to fix the closure binding problem?",
+        "relevant_chapters": [11],
+        "relevant_pages": [[175, 190]]
+    }
+]
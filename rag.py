@@ -4,40 +4,148 @@ RAG sa:
 IndexFlatL2 indexom
 Vektorima malih dimenzija 384
 semanticnim chunkingom
-re-rankingom/cross encodingom
+kaskadnim re-rankingom/cross encodingom (vidi reranker.py)
+hibridnim kandidatima (dense + BM25, reciprocal rank fusion)
 '''
-from chromadb.config import Settings
-import chromadb
+import time
+import threading
+from concurrent.futures import Future
 from typing import List, Optional, Dict
-import faiss
 import numpy as np
-from sentence_transformers import SentenceTransformer, CrossEncoder
+import model_registry
+import telemetry
+from lexical_index import reciprocal_rank_fusion
+from query_cache import QueryCache
+from embedding_cache import EmbeddingCache
+from reranker import CascadeReranker, MARGIN, PATIENCE
 
 COLLECTION_NAME = "reorder"
 PATH = "./rag"
+# podrazumevano egzaktna pretraga; tuning (ann_index.py) cuva izabrani u PATH/index_config.json
+INDEX_CONFIG = {"type": "flat"}
+# dvostepena pretraga za vece korpuse: CrossRankingRAG(index_config=BINARY_INDEX_CONFIG)
+BINARY_INDEX_CONFIG = {"type": "binary", "binary_index": "flat", "oversample": 4, "rescore_dtype": "float16"}
+# sa BM25 kandidatima fuzija je preciznija, pa cross encoder dobija manje parova
+RERANK_FACTOR = 2
 
 
 class CrossRankingRAG:
         def __init__(self, 
                      embedding_model: str = "all-MiniLM-L6-v2",
-                     cross_encoder_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"):
-                self.embedding_model = SentenceTransformer(embedding_model)
-                self.embedding_dim = self.embedding_model.get_sentence_embedding_dimension()
-                self.cross_encoder = CrossEncoder(cross_encoder_model)
-                self.index = None
-
-                self.chroma = chromadb.PersistentClient(path=PATH)
-                self.collection = self.chroma.get_or_create_collection(COLLECTION_NAME)
-                
-                # ako vec postoje informacije odmah buildamo index
-                self._build_index()
+                     cross_encoder_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2",
+                     cache: Optional[QueryCache] = None,
+                     backend: str = "torch",
+                     threads: Optional[int] = None,
+                     index_config: Optional[Dict] = None,
+                     hybrid: bool = True,
+                     shards: int = 1,
+                     shard_by: str = "source",
+                     reranker: Optional[CascadeReranker] = None,
+                     rerank_budget_ms: Optional[float] = None,
+                     embedding_cache: Optional[EmbeddingCache] = None):
+                # backend: "torch", "onnx" ili "onnx-int8" (vidi onnx_backend.py)
+                # shards > 1 - index podeljen po izvornom PDF-u ili hash-u id-ja (vidi sharded_index.py)
+                # modeli, chroma i FAISS se ucitavaju tek pri prvoj upotrebi (ili u warmup())
+                self.embedding_model_name = embedding_model
+                self.cross_encoder_model_name = cross_encoder_model
+                self.backend = backend
+                self.threads = threads
+                self.index_config = index_config
+                self.shards = shards
+                self.shard_by = shard_by
+                self.cache = cache
+                # embeddinzi dokumenata po sadrzaju, deljeni izmedju ragova i pokretanja (vidi embedding_cache.py)
+                self.embedding_cache = embedding_cache
+                # hybrid - dense i BM25 kandidati spojeni sa RRF pre rerankinga
+                self.hybrid = hybrid
+                # kaskadni reranking (vidi reranker.py); budzet u ms po zahtevu, None - bez budzeta
+                # odsecanje po marginu i rani izlaz su ukljuceni - cross encoder ne skoruje kandidate
+                # koji ne mogu u top_k; pun reranking je reranker=CascadeReranker()
+                self.reranker = reranker or CascadeReranker(margin=MARGIN, patience=PATIENCE)
+                self.rerank_budget_ms = rerank_budget_ms
+                self.chroma = None
+                self._collection = None
+                self._vector_index = None
+                self._lock = threading.RLock()
 
-        def add_documents(self, documents: List[str], ids: Optional[List[str]] = None,
-                         metadatas: Optional[List[Dict]] = None):
-                # id-jevi ako nisu dostavljeni
-                if ids is None:
-                        ids = [str(i) for i in range(len(documents))]
-                
+        @property
+        def embedding_model(self):
+                # deljen sa drugim instancama kroz registar (vidi model_registry.py)
+                return model_registry.get_embedding_model(self.embedding_model_name, self.backend, self.threads)
+
+        @property
+        def cross_encoder(self):
+                return model_registry.get_cross_encoder(self.cross_encoder_model_name, self.backend, self.threads)
+
+        @property
+        def embedding_dim(self) -> int:
+                return model_registry.embedding_dim(self.embedding_model_name, self.backend, self.threads)
+
+        @property
+        def collection(self):
+                if self._collection is None:
+                        with self._lock:
+                                if self._collection is None:
+                                        import chromadb
+                                        self.chroma = chromadb.PersistentClient(path=PATH)
+                                        self._collection = self.chroma.get_or_create_collection(COLLECTION_NAME)
+                return self._collection
+
+        @property
+        def vector_index(self):
+                # lock jer warmup() ucitava index u pozadinskoj niti (RLock - _load_index trazi i kolekciju)
+                if self._vector_index is None:
+                        with self._lock:
+                                if self._vector_index is None:
+                                        self._vector_index = self._load_index()
+                return self._vector_index
+
+        def _load_index(self):
+                from ann_index import load_config
+
+                config = self.index_config or load_config(PATH, INDEX_CONFIG)
+                if self.shards > 1:
+                        from sharded_index import ShardedVectorIndex
+                        index = ShardedVectorIndex(
+                                PATH, self.embedding_dim, self.collection, config,
+                                shards=self.shards, shard_by=self.shard_by, lexical=self.hybrid
+                        )
+                else:
+                        from vector_index import VectorIndex
+                        index = VectorIndex(
+                                PATH, self.embedding_dim, self.collection,
+                                config=config, lexical=self.hybrid
+                        )
+                # ako vec postoje informacije odmah buildamo index (ili ucitamo sa diska)
+                with telemetry.span("build_index", rag=COLLECTION_NAME):
+                        index.load_or_build()
+                if index.index is None:
+                        print("No embeddings in ChromaDB yet. FAISS index will be built after adding documents.")
+                return index
+
+        def warmup(self, index: bool = True) -> List[Future]:
+                # embedding model i cross encoder se ucitavaju paralelno (i index, dok oni traju)
+                futures = model_registry.warmup([
+                        (model_registry.EMBEDDING, self.embedding_model_name, self.backend, self.threads),
+                        (model_registry.CROSS_ENCODER, self.cross_encoder_model_name, self.backend, self.threads)
+                ])
+                if index:
+                        futures.append(model_registry.run_in_background(lambda: self.vector_index))
+                return futures
+
+        def encode_documents(self, documents: List[str], show_progress_bar: bool = False) -> np.ndarray:
+                def encode(texts: List[str]) -> np.ndarray:
+                        return self.embedding_model.encode(texts, show_progress_bar=show_progress_bar).astype('float32')
+
+                with telemetry.span("encode_documents", rag=COLLECTION_NAME, documents=len(documents)):
+                        if self.embedding_cache is None:
+                                return encode(documents)
+                        # model dobija samo tekstove kojih nema u kesu
+                        return self.embedding_cache.encode(self.embedding_model_name, self.backend, False,
+                                                           documents, encode)
+
+        def _write_to_chroma(self, write, documents: List[str], ids: List[str],
+                             metadatas: Optional[List[Dict]], embeddings: np.ndarray):
                 # size batcha za chroma db je 5000
                 batch_size = 5000
                 total_docs = len(documents)
@@ -47,63 +155,170 @@ class CrossRankingRAG:
                         batch_docs = documents[i:end_idx]
                         batch_ids = ids[i:end_idx]
                         batch_metadatas = metadatas[i:end_idx] if metadatas else None
-                        
-                        embeddings = self.embedding_model.encode(batch_docs).tolist()
+                        # chroma prima numpy direktno, bez .tolist() kopije
+                        batch_embeddings = embeddings[i:end_idx]
                         
                         # dodajemo u chroma db sa metadata
                         if batch_metadatas:
-                                self.collection.add(documents=batch_docs, embeddings=embeddings, 
-                                                  ids=batch_ids, metadatas=batch_metadatas)
+                                write(documents=batch_docs, embeddings=batch_embeddings, 
+                                      ids=batch_ids, metadatas=batch_metadatas)
                         else:
-                                self.collection.add(documents=batch_docs, embeddings=embeddings, ids=batch_ids)
+                                write(documents=batch_docs, embeddings=batch_embeddings, ids=batch_ids)
                         
                         print(f"Added batch {i//batch_size + 1}: {len(batch_docs)} documents ({i+1}-{end_idx} of {total_docs})")
+
+        def add_documents(self, documents: List[str], ids: Optional[List[str]] = None,
+                         metadatas: Optional[List[Dict]] = None):
+                # id-jevi ako nisu dostavljeni
+                if ids is None:
+                        ids = [str(i) for i in range(len(documents))]
+                if not documents:
+                        return
                 
+                with telemetry.span("add_documents", rag=COLLECTION_NAME, documents=len(documents)):
+                        embeddings = self.encode_documents(documents)
+                        self.add_encoded(documents, ids, metadatas, embeddings)
                 print(f"Total: Added {len(documents)} documents to ChromaDB")
-                self._build_index()
 
-        def _build_index(self):
-                results = self.collection.get(include=['embeddings', 'documents'])
-        
-                if results['embeddings'] is None or len(results['embeddings']) == 0:
-                        print("No embeddings in ChromaDB yet. FAISS index will be built after adding documents.")
+        def add_encoded(self, documents: List[str], ids: List[str], metadatas: Optional[List[Dict]],
+                        embeddings: np.ndarray, save: bool = True):
+                # vec enkodirani dokumenti - chroma pa index (koristi i ingest_pipeline)
+                with telemetry.span("chroma_write", rag=COLLECTION_NAME, documents=len(documents)):
+                        self._write_to_chroma(self.collection.add, documents, ids, metadatas, embeddings)
+
+                # u index dodajemo samo nove vektore
+                with telemetry.span("index_add", rag=COLLECTION_NAME, documents=len(documents)):
+                        self.vector_index.add(ids, embeddings, documents, metadatas)
+                if save:
+                        # snimanje u pozadini - add ne ceka na prepisivanje indexa, docstore-a i BM25
+                        self.vector_index.save_in_background()
+
+        def update_documents(self, documents: List[str], ids: List[str],
+                             metadatas: Optional[List[Dict]] = None):
+                if not documents:
                         return
-                embeddings = np.array(results['embeddings']).astype('float32')
-                
-                self.index = faiss.IndexFlatL2(self.embedding_dim)
-                self.index.add(embeddings)
-                self.doc_id_mapping = results['ids']
-                print(f"FAISS index built with {len(embeddings)} vectors")
-
-        def retrieve(self, query: str, top_k: int = 5) -> Dict:
-                # nadjemo vise kandidata
-                query_emb = self.embedding_model.encode([query]).astype('float32')
-                candidate_count = min(len(self.doc_id_mapping), max(top_k * 3, top_k + 5))
-                distances, indices = self.index.search(query_emb, candidate_count)
-                
-                doc_ids = []
-                seen = set()
-                for i in indices[0]:
-                        doc_id = self.doc_id_mapping[i]
-                        if doc_id not in seen:
-                                doc_ids.append(doc_id)
-                                seen.add(doc_id)
-                
-                # i onda ih rerankujemo
-                chroma_results = self.collection.get(ids=doc_ids, include=['documents', 'metadatas'])
-                docs = chroma_results['documents']
-                metadatas = chroma_results.get('metadatas', [])
-                pairs = [[query, doc] for doc in docs]
-                scores = self.cross_encoder.predict(pairs)
-                scores_with_index = [[score, index] for index, score in enumerate(scores)]
-                indexes = sorted(scores_with_index,key=lambda x: x[0], reverse=True)[:top_k]
-                
-                return {
-                        "documents": [docs[index] for score,index in indexes],
-                        "doc_ids": [doc_ids[index] for score,index in indexes],
-                        "metadatas": [metadatas[index] for score,index in indexes] if metadatas else [],
-                        "scores": [float(score) for score,index in indexes]
-                }
+                embeddings = self.encode_documents(documents)
+                self._write_to_chroma(self.collection.upsert, documents, ids, metadatas, embeddings)
+                self.vector_index.remove(ids)
+                self.vector_index.add(ids, embeddings, documents, metadatas)
+                self.vector_index.save_in_background()
+
+        def update_metadata(self, ids: List[str], metadatas: List[Dict]):
+                # menja se samo metadata - tekst i vektori se citaju iz chroma db, bez enkodiranja
+                batch_size = 5000
+                for i in range(0, len(ids), batch_size):
+                        batch_ids = ids[i:i + batch_size]
+                        batch_metadatas = metadatas[i:i + batch_size]
+                        rows = self.collection.get(ids=batch_ids, include=['embeddings', 'documents'])
+                        by_id = {doc_id: (emb, doc) for doc_id, emb, doc
+                                 in zip(rows['ids'], rows['embeddings'], rows['documents'])}
+                        embeddings = np.array([by_id[doc_id][0] for doc_id in batch_ids], dtype='float32')
+                        documents = [by_id[doc_id][1] for doc_id in batch_ids]
+
+                        self.collection.update(ids=batch_ids, metadatas=batch_metadatas)
+                        self.vector_index.remove(batch_ids)
+                        self.vector_index.add(batch_ids, embeddings, documents, batch_metadatas)
+                if ids:
+                        self.vector_index.save_in_background()
+
+        def delete_documents(self, ids: List[str]):
+                self.collection.delete(ids=ids)
+                self.vector_index.remove(ids)
+                self.vector_index.save_in_background()
+
+        def _build_index(self, force: bool = False):
+                with telemetry.span("build_index", rag=COLLECTION_NAME, force=force):
+                        self.vector_index.load_or_build(force=force)
+                if self.vector_index.index is None:
+                        print("No embeddings in ChromaDB yet. FAISS index will be built after adding documents.")
+
+        def retrieve(self, query: str, top_k: int = 5, filter: Optional[Dict] = None,
+                     budget_ms: Optional[float] = None) -> Dict:
+                # filter po metadata, npr. {"chapter": 20} ili {"pages": [349, 373]} (vidi metadata_filter.py)
+                return self.retrieve_many([query], top_k=top_k, filter=filter, budget_ms=budget_ms)[0]
 
+        def _encode_queries(self, queries: List[str]) -> np.ndarray:
+                with telemetry.span("encode_queries", rag=COLLECTION_NAME, queries=len(queries)):
+                        return self.embedding_model.encode(queries, batch_size=64).astype('float32')
 
-            
+        def retrieve_many(self, queries: List[str], top_k: int = 5, filter: Optional[Dict] = None,
+                          budget_ms: Optional[float] = None) -> List[Dict]:
+                # budzet racunamo od pocetka zahteva - enkodiranje i pretraga trose isti budzet
+                budget_ms = budget_ms if budget_ms is not None else self.rerank_budget_ms
+                deadline = time.perf_counter() + budget_ms / 1000 if budget_ms is not None else None
+                with telemetry.span("retrieve", rag=COLLECTION_NAME, queries=len(queries), top_k=top_k,
+                                    filtered=bool(filter)):
+                        # kes je po (upit, top_k), pa filtrirani upiti idu mimo njega
+                        if self.cache is None or filter:
+                                return self._search_batch(queries, self._encode_queries(queries), top_k, filter, deadline)
+                        # kes preskace enkodiranje, pretragu i reranking za ponovljene upite
+                        return self.cache.retrieve_many(
+                                self.vector_index.version, queries, top_k,
+                                self._encode_queries,
+                                lambda batch, embs: self._search_batch(batch, embs, top_k, deadline=deadline)
+                        )
+
+        def _search_batch(self, queries: List[str], query_embs: np.ndarray, top_k: int,
+                          filter: Optional[Dict] = None, deadline: Optional[float] = None) -> List[Dict]:
+                # nadjemo vise kandidata za sve queryje odjednom
+                candidate_count = max(top_k * 3, top_k + 5)
+                # pretraga i citanje kandidata nad istim stanjem indexa (add/remove cekaju);
+                # reranking ide van locka, nad uzetim docstore-om i id-jevima
+                with self.vector_index.lock:
+                        per_query_labels, dense_distances, lexical_only = self._candidates(
+                                queries, query_embs, candidate_count, top_k, filter)
+                        docs = self.vector_index.docs
+                        candidates = [row_labels.tolist() for row_labels in per_query_labels]
+                        candidate_ids = [self.vector_index.doc_ids(row_labels) for row_labels in candidates]
+
+                # kaskadno rerankujemo - runde malih batcheva, jedan predict poziv po rundi za sve upite
+                with telemetry.span("rerank", rag=COLLECTION_NAME, candidates=sum(map(len, candidates))) as span:
+                        reranked = self.reranker.rerank(
+                                lambda pairs: self.cross_encoder.predict(pairs), queries, candidates,
+                                candidate_ids, docs.document, top_k, distances=dense_distances, keep=lexical_only,
+                                deadline=deadline
+                        )
+                        pairs_scored = sum(r["stats"]["pairs_scored"] for r in reranked)
+                        span.set(pairs=pairs_scored)
+                telemetry.count("candidates_scored", pairs_scored, rag=COLLECTION_NAME)
+
+                results = []
+                with telemetry.span("docstore_fetch", rag=COLLECTION_NAME):
+                        for r, row_labels, row_ids in zip(reranked, candidates, candidate_ids):
+                                top_labels = r["labels"]
+                                id_of = dict(zip(row_labels, row_ids))
+                                results.append({
+                                        "documents": docs.documents(top_labels),
+                                        "doc_ids": [id_of[label] for label in top_labels],
+                                        "metadatas": docs.metadatas(top_labels),
+                                        "scores": [float(score) for score in r["scores"]],
+                                        # parovi skorovani po upitu, kes, odsecanje, rani izlaz, fallback
+                                        "rerank": r["stats"],
+                                        "partial": r["stats"]["fallback"]
+                                })
+                return results
+
+        def _candidates(self, queries: List[str], query_embs: np.ndarray, candidate_count: int, top_k: int,
+                        filter: Optional[Dict]):
+                with telemetry.span("faiss_search", rag=COLLECTION_NAME, queries=len(queries), k=candidate_count):
+                        distances, labels = self.vector_index.search(query_embs, candidate_count, filter=filter)
+                
+                # labele su jedinstvene po vektoru, -1 znaci da nema vise kandidata
+                per_query_labels = [row[row >= 0] for row in labels]
+                dense_distances = [dict(zip(row_labels.tolist(), row_distances[row >= 0].tolist()))
+                                   for row_labels, row, row_distances in zip(per_query_labels, labels, distances)]
+                lexical_only = None
+                if self.hybrid:
+                        # BM25 hvata tacne identifikatore (npr. tableFindString) koje dense promasi
+                        with telemetry.span("lexical_search", rag=COLLECTION_NAME, queries=len(queries)):
+                                _, lexical_labels = self.vector_index.lexical_search(queries, candidate_count, filter=filter)
+                        rerank_count = max(top_k * RERANK_FACTOR, top_k + 3)
+                        with telemetry.span("fusion", rag=COLLECTION_NAME):
+                                per_query_labels = [
+                                        np.array([label for label, _ in reciprocal_rank_fusion(
+                                                [dense, lexical[lexical >= 0]])[:rerank_count]], dtype='int64')
+                                        for dense, lexical in zip(per_query_labels, lexical_labels)
+                                ]
+                        # kandidati koje je BM25 nasao se ne odsecaju po dense marginu
+                        lexical_only = [set(lexical[lexical >= 0].tolist()) for lexical in lexical_labels]
+                return per_query_labels, dense_distances, lexical_only
@@ -0,0 +1,237 @@
+'''
+Kaskadni reranking - cross encoder skoruje samo kandidate koji mogu da promene top_k.
+
+Kandidati dolaze u redosledu prve faze (dense, ili RRF kod hibridnog raga).
+CascadeReranker() skoruje sve kandidate (isti rezultat kao pun reranking);
+odsecanje po marginu i rani izlaz menjaju rezultat, pa se ukljucuju
+eksplicitno (CascadeReranker(margin=MARGIN, patience=PATIENCE) - tako ga
+pravi CrossRankingRAG), a njihov trosak u recall-u pokazuje
+python benchmark.py --cascade:
+- margin: dense kandidati cija je slicnost za vise od margin ispod najboljeg
+  se ne skoruju (idu na kraj, u dense redosledu); ako ostane jedan kandidat,
+  reranking se preskace
+- prva runda skoruje top_k kandidata, dalje po batch_size (samo sa patience;
+  sa budzetom bez patience runde su po predict_batch_size, inace je sve
+  jedna runda); upit staje kad
+  patience uzastopnih batcheva ne ubaci nijednog kandidata u top_k (cross
+  encoder skorovi nisu ograniceni, pa je ovo pravilo stabilnosti, ne dokaz)
+- kes (upit, doc_id) -> skor, proveren crc-om teksta (update_documents)
+- budzet: rok se proverava pred svaku rundu - runda se ne pokrece ako
+  procenjeno vreme (ewma po paru) probija rok; neskorovani kandidati
+  ostaju u dense redosledu (fallback)
+
+Runde su zajednicke za sve upite iz batcha - jedan predict poziv po rundi.
+Neskorovani kandidati dobijaju skor ispod svih skorovanih (samo za redosled).
+'''
+
+import time
+import zlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Set
+import numpy as np
+import telemetry
+
+# velicina runde za rani izlaz (patience)
+BATCH_SIZE = 4
+# velicina runde kad se samo proverava rok (kao batch_size u CrossEncoder.predict)
+PREDICT_BATCH_SIZE = 32
+# preporuceni parametri kaskade (menjaju rezultat u odnosu na pun reranking, vidi CrossRankingRAG)
+# razlika u cosine slicnosti (L2 distance na normalizovanim vektorima: sim = 1 - d / 2)
+MARGIN = 0.2
+PATIENCE = 1
+CACHE_ENTRIES = 50_000
+# tezina nove vrednosti u proceni vremena po paru
+EWMA_ALPHA = 0.2
+
+
+def _crc(text: str) -> int:
+    return zlib.crc32(text.encode("utf-8"))
+
+
+class _QueryState:
+    def __init__(self, query: str, labels: List[int], doc_ids: List[str], pruned: List[int], top_k: int):
+        self.query = query
+        self.labels = labels
+        self.doc_ids = doc_ids
+        self.pruned = pruned
+        self.top_k = top_k
+        self.cursor = 0
+        self.scores: Dict[int, float] = {}
+        self.unchanged = 0
+        self.done = len(labels) <= 1
+        self.stats = {"candidates": len(labels) + len(pruned), "pruned": len(pruned), "pairs_scored": 0,
+                      "cache_hits": 0, "skipped": self.done, "early_stop": False, "fallback": False}
+
+    def top(self) -> Set[int]:
+        return set(sorted(self.scores, key=self.scores.get, reverse=True)[:self.top_k])
+
+    def result(self) -> Dict:
+        scored = sorted(self.scores, key=self.scores.get, reverse=True)
+        rest = [label for label in self.labels if label not in self.scores] + self.pruned
+        floor = min(self.scores.values()) if self.scores else 0.0
+        labels = (scored + rest)[:self.top_k]
+        scores = [self.scores[label] for label in scored] + [floor - 1 - i for i in range(len(rest))]
+        return {"labels": labels, "scores": scores[:self.top_k], "stats": self.stats}
+
+
+class CascadeReranker:
+    def __init__(self, batch_size: int = BATCH_SIZE, margin: Optional[float] = None,
+                 patience: Optional[int] = None, cache_entries: int = CACHE_ENTRIES,
+                 predict_batch_size: int = PREDICT_BATCH_SIZE):
+        # margin=None - bez odsecanja po dense skoru, patience=None - bez ranog izlaza
+        # cache_entries=0 - bez kesa skorova (npr. za benchmark)
+        self.batch_size = batch_size
+        self.predict_batch_size = predict_batch_size
+        self.margin = margin
+        self.patience = patience
+        self.cache_entries = cache_entries
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+        self._pair_seconds: Optional[float] = None
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def _prune(self, labels: Sequence[int], distances: Dict[int, float], keep: Set[int]):
+        known = [distances[label] for label in labels if label in distances]
+        if self.margin is None or not known:
+            return list(labels), []
+        best = min(known)
+        kept, pruned = [], []
+        for label in labels:
+            d = distances.get(label)
+            # leksicki kandidati (BM25) nemaju dense skor i ne odsecaju se
+            if d is not None and label not in keep and (d - best) / 2 > self.margin:
+                pruned.append(label)
+            else:
+                kept.append(label)
+        return kept, pruned
+
+    def _cached(self, query: str, doc_id: str, crc: int) -> Optional[float]:
+        with self._lock:
+            entry = self._cache.get((query, doc_id))
+            if entry is None or entry[0] != crc:
+                return None
+            self._cache.move_to_end((query, doc_id))
+            return entry[1]
+
+    def _remember(self, query: str, doc_id: str, crc: int, score: float):
+        if self.cache_entries <= 0:
+            return
+        with self._lock:
+            self._cache[(query, doc_id)] = (crc, score)
+            self._cache.move_to_end((query, doc_id))
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+
+    def _round_fits(self, pairs: int, deadline: Optional[float]) -> bool:
+        if deadline is None:
+            return True
+        estimate = (self._pair_seconds or 0.0) * pairs
+        return time.perf_counter() + estimate <= deadline
+
+    def rerank(self, predict: Callable[[List[List[str]]], np.ndarray], queries: List[str],
+               candidates: List[Sequence[int]], doc_ids: List[List[str]], document: Callable[[int], str],
+               top_k: int, distances: Optional[List[Dict[int, float]]] = None,
+               keep: Optional[List[Set[int]]] = None, deadline: Optional[float] = None) -> List[Dict]:
+        """
+        Za svaki upit {"labels", "scores", "stats"}; stats["pairs_scored"] je broj parova
+        koje je cross encoder stvarno skorovao (bez pogodaka u kesu).
+        distances - dense distanca po labeli, keep - labele koje se ne odsecaju (BM25).
+        deadline - time.perf_counter() rok za ceo zahtev.
+        """
+        states = []
+        for i, (query, labels, ids) in enumerate(zip(queries, candidates, doc_ids)):
+            id_of = dict(zip(labels, ids))
+            kept, pruned = self._prune(labels, distances[i] if distances else {}, keep[i] if keep else set())
+            state = _QueryState(query, kept, [id_of[label] for label in kept], pruned, top_k)
+            states.append(state)
+
+        while True:
+            active = [s for s in states if not s.done]
+            if not active:
+                break
+            # sledeci batch po upitu: prva runda popuni top_k, dalje po batch_size
+            # (bez ranog izlaza i budzeta male runde nemaju svrhu - sve u jednoj;
+            # samo budzet - pune predict runde, rok se proverava izmedju njih)
+            batches = {}
+            for s in active:
+                if self.patience is None and deadline is None:
+                    size = len(s.labels)
+                elif self.patience is None:
+                    size = max(self.predict_batch_size, s.top_k - len(s.scores))
+                else:
+                    size = max(self.batch_size, s.top_k - len(s.scores))
+                batches[id(s)] = list(range(s.cursor, min(s.cursor + size, len(s.labels))))
+
+            pending, pending_meta = [], []
+            for s in active:
+                for position in batches[id(s)]:
+                    label = s.labels[position]
+                    text = document(label)
+                    crc = _crc(text)
+                    score = self._cached(s.query, s.doc_ids[position], crc)
+                    if score is not None:
+                        s.stats["cache_hits"] += 1
+                        pending_meta.append((s, position, crc, score))
+                    else:
+                        pending.append([s.query, text])
+                        pending_meta.append((s, position, crc, None))
+
+            if pending and not self._round_fits(len(pending), deadline):
+                for s in active:
+                    s.stats["fallback"] = True
+                    s.done = True
+                break
+
+            before = {id(s): s.top() for s in active}
+            if pending:
+                start = time.perf_counter()
+                scores = predict(pending)
+                per_pair = (time.perf_counter() - start) / len(pending)
+                self._pair_seconds = per_pair if self._pair_seconds is None else \
+                    EWMA_ALPHA * per_pair + (1 - EWMA_ALPHA) * self._pair_seconds
+            scored = iter(scores if pending else [])
+            for s, position, crc, score in pending_meta:
+                if score is None:
+                    score = float(next(scored))
+                    s.stats["pairs_scored"] += 1
+                    self._remember(s.query, s.doc_ids[position], crc, score)
+                s.scores[s.labels[position]] = score
+
+            for s in active:
+                s.cursor += len(batches[id(s)])
+                if s.cursor >= len(s.labels):
+                    s.done = True
+                elif self.patience is not None and len(before[id(s)]) >= s.top_k and s.top() == before[id(s)]:
+                    s.unchanged += 1
+                    if s.unchanged >= self.patience:
+                        s.stats["early_stop"] = True
+                        s.done = True
+                else:
+                    s.unchanged = 0
+
+        with self._lock:
+            for s in states:
+                self.cache_hits += s.stats["cache_hits"]
+                self.cache_misses += s.stats["pairs_scored"]
+        for state in ("skipped", "early_stop", "fallback"):
+            hits = sum(s.stats[state] for s in states)
+            if hits:
+                telemetry.count("rerank", hits, state=state)
+        return [s.result() for s in states]
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            return {
+                "entries": len(self._cache),
+                "cache_hits": self.cache_hits,
+                "pairs_scored": self.cache_misses,
+                "hit_rate": self.cache_hits / lookups if lookups else 0.0,
+                "pair_ms": self._pair_seconds * 1000 if self._pair_seconds is not None else None
+            }
@@ -0,0 +1,232 @@
+'''
+HTTP servis za upite - modeli i indexi se ucitaju jednom i ostaju topli.
+
+Endpointi (JSON):
+- POST /retrieve  {"query": "...", "top_k": 10, "rag": "hnsw" | "crossranking", "filter": {"chapter": 20},
+                  "budget_ms": 50}  (budzet rerankinga, samo crossranking)
+- POST /answer    isto + opciono "stream": true (server-sent events sa tokenima)
+- GET  /metrics   batcher metrike (queue depth, velicine batcheva), kes
+- GET  /health
+
+Retrieval zahtevi idu kroz MicroBatcher po ragu, pa konkurentni korisnici
+dele jedan embedding forward pass, FAISS batch pretragu i cross-encoder batch.
+Aplikacija je cist ASGI (bez frameworka), pokrece se uvicornom:
+
+    python server.py --port 8000 --max-batch-size 32 --max-wait-ms 5
+'''
+
+import json
+import asyncio
+import argparse
+from typing import Dict, List, Optional, Tuple
+from batching import MicroBatcher, MAX_BATCH_SIZE, MAX_WAIT_MS
+from metadata_filter import filter_key, validate
+import telemetry
+from main import load_pdf_into_rags, build_context, build_prompt, get_generator
+
+PORT = 8000
+DEFAULT_TOP_K = 10
+MAX_TOP_K = 100
+
+
+def _retrieve_batch(rag, items: List[Tuple[str, int, Optional[Dict], Optional[float]]]) -> List[Dict]:
+    # jedan retrieve_many po (top_k, filter, budzet) (obicno svi zahtevi imaju isti)
+    results = [None] * len(items)
+    groups = {}
+    for i, (_, top_k, spec, budget_ms) in enumerate(items):
+        groups.setdefault((top_k, filter_key(spec), budget_ms), []).append(i)
+    for positions in groups.values():
+        _, top_k, spec, budget_ms = items[positions[0]]
+        extra = {"budget_ms": budget_ms} if budget_ms is not None else {}
+        queries = [items[i][0] for i in positions]
+        try:
+            group_results = rag.retrieve_many(queries, top_k=top_k, filter=spec, **extra)
+        except Exception as e:
+            # greska jedne grupe ide samo njenim zahtevima (MicroBatcher je postavlja na njihove future)
+            group_results = [e] * len(positions)
+        for i, result in zip(positions, group_results):
+            results[i] = result
+    return results
+
+
+class BadRequest(Exception):
+    pass
+
+
+class RAGServer:
+    def __init__(self, max_batch_size: int = MAX_BATCH_SIZE, max_wait_ms: float = MAX_WAIT_MS):
+        # isto ucitavanje kao u main.py (sync korpusa, kesevi)
+        hnsw_rag, crossranking_rag = load_pdf_into_rags()
+        self.rags = {"hnsw": hnsw_rag, "crossranking": crossranking_rag}
+        self.batchers = {
+            name: MicroBatcher(lambda items, rag=rag: _retrieve_batch(rag, items),
+                               max_batch_size=max_batch_size, max_wait_ms=max_wait_ms, name=f"batch-{name}")
+            for name, rag in self.rags.items()
+        }
+
+    def _parse(self, body: Dict):
+        query = body.get("query")
+        if not isinstance(query, str) or not query.strip():
+            raise BadRequest("'query' must be a non-empty string")
+        name = body.get("rag", "crossranking")
+        if name not in self.rags:
+            raise BadRequest(f"'rag' must be one of {sorted(self.rags)}")
+        top_k = body.get("top_k", DEFAULT_TOP_K)
+        if not isinstance(top_k, int) or not 1 <= top_k <= MAX_TOP_K:
+            raise BadRequest(f"'top_k' must be an integer between 1 and {MAX_TOP_K}")
+        spec = body.get("filter")
+        if spec is not None:
+            # neispravan filter odbijamo ovde, pre nego sto udje u batch sa tudjim zahtevima
+            try:
+                validate(spec)
+            except ValueError as e:
+                raise BadRequest(str(e))
+        budget_ms = body.get("budget_ms")
+        if budget_ms is not None and (name != "crossranking" or not isinstance(budget_ms, (int, float))
+                                      or budget_ms <= 0):
+            raise BadRequest("'budget_ms' must be a positive number (crossranking only)")
+        return query, name, top_k, spec, budget_ms
+
+    async def retrieve(self, body: Dict) -> Dict:
+        query, name, top_k, spec, budget_ms = self._parse(body)
+        return await self.batchers[name].submit((query, top_k, spec, budget_ms))
+
+    async def _answer_context(self, body: Dict):
+        query, name, top_k, spec, budget_ms = self._parse(body)
+        rag = self.rags[name]
+        results = await self.batchers[name].submit((query, top_k, spec, budget_ms))
+        context = await asyncio.to_thread(build_context, results)
+        # kes odgovora je po (upit, top_k) - filtrirani i delimicni (budzet) rezultati ga ne koriste
+        cache = rag.cache if not spec and not results.get("partial") else None
+        return query, rag, cache, top_k, results, context, build_prompt(query, context.text)
+
+    async def answer(self, body: Dict) -> Dict:
+        query, rag, cache, top_k, results, context, prompt = await self._answer_context(body)
+        version = rag.vector_index.version
+        response = cache.get_answer(query, top_k, version) if cache else None
+        generation = None
+        if response is None:
+            generation = await get_generator().agenerate(prompt)
+            response = generation.text
+            if cache:
+                cache.put_answer(query, top_k, version, response)
+        return {
+            "answer": response,
+            "metadatas": results["metadatas"],
+            "doc_ids": results["doc_ids"],
+            "context": context.stats(),
+            "generation": {k: v for k, v in generation.as_dict().items() if k != "text"} if generation else None
+        }
+
+    async def answer_stream(self, body: Dict, send):
+        query, rag, cache, top_k, results, context, prompt = await self._answer_context(body)
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"text/event-stream"), (b"cache-control", b"no-cache")]})
+
+        tokens = asyncio.Queue()
+        generation = asyncio.ensure_future(get_generator().agenerate(prompt, on_token=tokens.put_nowait))
+        generation.add_done_callback(lambda _: tokens.put_nowait(None))
+        while True:
+            token = await tokens.get()
+            if token is None:
+                break
+            await send({"type": "http.response.body", "body": _event({"token": token}), "more_body": True})
+        try:
+            stats = generation.result().as_dict()
+            stats.pop("text")
+            done = {"done": True, "generation": stats, "context": context.stats(), "metadatas": results["metadatas"]}
+        except Exception as e:
+            done = {"done": True, "error": str(e)}
+        await send({"type": "http.response.body", "body": _event(done), "more_body": False})
+
+    def metrics(self) -> Dict:
+        return {
+            "batchers": {name: batcher.stats() for name, batcher in self.batchers.items()},
+            "caches": {name: rag.cache.stats() for name, rag in self.rags.items() if rag.cache},
+            # kaskadni reranking - kes skorova i procena vremena po paru
+            "rerank": {name: rag.reranker.stats() for name, rag in self.rags.items()
+                       if getattr(rag, "reranker", None)},
+            "index_versions": {name: rag.vector_index.version for name, rag in self.rags.items()},
+            # histogrami po fazi i brojaci (telemetry.py)
+            "telemetry": telemetry.stats()
+        }
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            while True:
+                message = await receive()
+                if message["type"] == "lifespan.startup":
+                    await send({"type": "lifespan.startup.complete"})
+                elif message["type"] == "lifespan.shutdown":
+                    await send({"type": "lifespan.shutdown.complete"})
+                    return
+        if scope["type"] != "http":
+            return
+
+        method, path = scope["method"], scope["path"].rstrip("/")
+        try:
+            if method == "GET" and path == "/health":
+                await _respond(send, 200, {"status": "ok"})
+            elif method == "GET" and path == "/metrics":
+                await _respond(send, 200, self.metrics())
+            elif method == "POST" and path in ("/retrieve", "/answer"):
+                body = await _read_json(receive)
+                if path == "/retrieve":
+                    await _respond(send, 200, await self.retrieve(body))
+                elif body.get("stream"):
+                    await self.answer_stream(body, send)
+                else:
+                    await _respond(send, 200, await self.answer(body))
+            else:
+                await _respond(send, 404, {"error": "not found"})
+        except BadRequest as e:
+            # samo greske validacije zahteva (_parse, _read_json) su 400 - interni ValueError je 500
+            await _respond(send, 400, {"error": str(e)})
+        except Exception as e:
+            await _respond(send, 500, {"error": f"{type(e).__name__}: {e}"})
+
+
+async def _read_json(receive) -> Dict:
+    chunks = []
+    while True:
+        message = await receive()
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body"):
+            break
+    try:
+        body = json.loads(b"".join(chunks) or b"{}")
+    except ValueError:
+        raise BadRequest("body must be JSON")
+    if not isinstance(body, dict):
+        raise BadRequest("body must be a JSON object")
+    return body
+
+
+def _encode(payload) -> bytes:
+    # numpy vrednosti (labele, skorovi) kao obicni brojevi/stringovi
+    return json.dumps(payload, default=lambda o: o.tolist() if hasattr(o, "tolist") else str(o)).encode("utf-8")
+
+
+def _event(payload) -> bytes:
+    return b"data: " + _encode(payload) + b"\n\n"
+
+
+async def _respond(send, status: int, payload):
+    body = _encode(payload)
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+if __name__ == "__main__":
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="RAG query server with dynamic micro-batching")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=PORT)
+    parser.add_argument("--max-batch-size", type=int, default=MAX_BATCH_SIZE)
+    parser.add_argument("--max-wait-ms", type=float, default=MAX_WAIT_MS)
+    args = parser.parse_args()
+
+    app = RAGServer(max_batch_size=args.max_batch_size, max_wait_ms=args.max_wait_ms)
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
@@ -0,0 +1,368 @@
+'''
+Shardovan vektorski index - vise nezavisnih VectorIndex-a iza istog interfejsa.
+
+Vektori se dele na shardove po izvornom dokumentu (metadata "source", pa
+je ceo PDF u jednom shardu) ili po hash-u id-ja. Svaki shard je obican
+VectorIndex sa svojim direktorijumom (PATH/shards/NNN), DocStore-om, BM25
+indexom i snimljenim FAISS indexom, pa se builda, snima i rebuilda sam -
+dodavanje jednog PDF-a ne dira ostale shardove.
+
+Pretraga ide paralelno na sve shardove (FAISS oslobadja GIL, a jedan upit
+se inace pretrazuje na jednoj niti), a rezultati se spajaju u globalni
+top-k. Globalna labela je offset sharda + labela u shardu; offseti se
+menjaju sa izmenama, ali labele i inace vaze samo za jednu verziju indexa.
+
+BM25 skorovi se racunaju po shardu (idf iz sharda, kao query_then_fetch u
+Elasticsearch-u), pa su uporedivi samo priblizno - za RRF fuziju je dovoljno.
+'''
+
+import os
+import json
+import zlib
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+import numpy as np
+from index_store import BackgroundSaver
+from vector_index import VectorIndex, locked
+
+SHARD_BY = ("source", "hash")
+# najvise niti za fan-out pretragu i paralelan build
+SEARCH_WORKERS = 8
+# chroma get po ovoliko id-jeva
+GET_BATCH = 5000
+ASSIGNMENT_FILE = "shards.json"
+
+
+def shard_of(key: str, shards: int) -> int:
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+
+def merge_topk(parts: List[Tuple[np.ndarray, np.ndarray]], k: int,
+               descending: bool = False) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Spaja (skorovi, globalne labele) iz shardova u top-k po upitu; labela -1 se preskace.
+    descending - veci skor je bolji (BM25), inace manja distanca.
+    """
+    scores = np.hstack([p[0] for p in parts]).astype('float32')
+    labels = np.hstack([p[1] for p in parts]).astype('int64')
+    key = np.where(labels < 0, np.inf, -scores if descending else scores)
+    k = min(k, key.shape[1])
+    order = np.argsort(key, axis=1, kind='stable')[:, :k]
+    return np.take_along_axis(scores, order, axis=1), np.take_along_axis(labels, order, axis=1)
+
+
+class ShardCollection:
+    """
+    Pogled na id-jeve jednog sharda u chroma kolekciji; VectorIndex ga koristi umesto kolekcije.
+    """
+    def __init__(self, collection, ids: Sequence[str] = ()):
+        self.collection = collection
+        # dict kao skup koji cuva redosled
+        self.ids = dict.fromkeys(ids)
+
+    def add_ids(self, ids: Sequence[str]):
+        for doc_id in ids:
+            self.ids[doc_id] = None
+
+    def remove_ids(self, ids: Sequence[str]):
+        for doc_id in ids:
+            self.ids.pop(doc_id, None)
+
+    def get(self, ids: Optional[List[str]] = None, include: Optional[List[str]] = None) -> Dict:
+        include = ['documents', 'metadatas'] if include is None else include
+        ids = list(self.ids) if ids is None else list(ids)
+        if not include:
+            return {"ids": ids}
+        result = {"ids": []}
+        result.update({field: [] for field in include})
+        for i in range(0, len(ids), GET_BATCH):
+            batch = self.collection.get(ids=ids[i:i + GET_BATCH], include=include)
+            result["ids"].extend(batch["ids"])
+            for field in include:
+                result[field].extend(list(batch[field]))
+        return result
+
+
+class ShardedDocs:
+    """
+    DocStore interfejs nad DocStore-ovima shardova (globalne labele).
+    """
+    def __init__(self, shards: List[VectorIndex], offsets: np.ndarray):
+        self.shards = shards
+        self.offsets = offsets
+        self._int_columns = None
+
+    def __len__(self) -> int:
+        return int(self.offsets[-1])
+
+    def _locate(self, label: int) -> Tuple[VectorIndex, int]:
+        shard = int(np.searchsorted(self.offsets, label, side='right')) - 1
+        return self.shards[shard], int(label) - int(self.offsets[shard])
+
+    def document(self, label: int) -> str:
+        shard, local = self._locate(label)
+        return shard.docs.document(local)
+
+    def documents(self, labels: Sequence[int]) -> List[str]:
+        return [self.document(label) for label in labels]
+
+    def metadata(self, label: int) -> Dict:
+        shard, local = self._locate(label)
+        return shard.docs.metadata(local)
+
+    def metadatas(self, labels: Sequence[int]) -> List[Dict]:
+        return [self.metadata(label) for label in labels]
+
+    @property
+    def int_columns(self) -> Dict[str, np.ndarray]:
+        # spojene kolone po globalnoj labeli (benchmark.RelevanceIndex)
+        if self._int_columns is None:
+            names = self.shards[0].docs.int_columns.keys()
+            self._int_columns = {
+                name: np.concatenate([np.asarray(s.docs.int_columns[name])[:len(s.doc_id_mapping)]
+                                      for s in self.shards]).astype('int32')
+                for name in names
+            }
+        return self._int_columns
+
+
+class ShardedVectorIndex:
+    def __init__(self, path: str, dim: int, collection, config: Dict, shards: int,
+                 shard_by: str = "source", retrain_threshold: Optional[float] = None, lexical: bool = False):
+        if shard_by not in SHARD_BY:
+            raise ValueError(f"Unknown shard_by {shard_by}, expected one of {SHARD_BY}")
+        self.path = path
+        self.dim = dim
+        self.collection = collection
+        self.config = config
+        self.shard_by = shard_by
+        self.assignment_path = os.path.join(path, ASSIGNMENT_FILE)
+        # doc_id -> shard
+        self.assignment: Dict[str, int] = {}
+        self.views = [ShardCollection(collection) for _ in range(shards)]
+        self.shards = [
+            VectorIndex(os.path.join(path, "shards", f"{i:03d}"), dim, view, config,
+                        retrain_threshold=retrain_threshold, lexical=lexical)
+            for i, view in enumerate(self.views)
+        ]
+        self._pool = ThreadPoolExecutor(max_workers=min(shards, SEARCH_WORKERS), thread_name_prefix="shard")
+        self._version = 0
+        self._saved_versions = [None] * shards
+        # (version, offsets, ShardedDocs, doc_id_mapping)
+        self._layout = None
+        self.lock = threading.RLock()
+        self._saver = BackgroundSaver(self.save, self.lock, name="shards-save")
+
+    def __len__(self) -> int:
+        return sum(len(shard) for shard in self.shards)
+
+    @property
+    def version(self) -> int:
+        # zbir verzija shardova raste sa svakom izmenom bilo kog sharda
+        return self._version + sum(shard.version for shard in self.shards)
+
+    @property
+    def index(self):
+        # samo za proveru "ima li index" (prvi shard sa vektorima)
+        return next((shard.index for shard in self.shards if shard.index is not None), None)
+
+    def _map(self, fn: Callable, shards: Optional[List[int]] = None) -> List:
+        shards = range(len(self.shards)) if shards is None else shards
+        return list(self._pool.map(lambda i: fn(self.shards[i]), shards))
+
+    def _shard_for(self, doc_id: str, metadata: Optional[Dict]) -> int:
+        key = doc_id
+        if self.shard_by == "source" and metadata and metadata.get("source"):
+            key = str(metadata["source"])
+        return shard_of(key, len(self.shards))
+
+    def _load_assignment(self) -> Dict[str, int]:
+        try:
+            with open(self.assignment_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if saved.get("shards") != len(self.shards) or saved.get("shard_by") != self.shard_by:
+            return {}
+        return saved["assignment"]
+
+    def _save_assignment(self):
+        os.makedirs(self.path, exist_ok=True)
+        tmp = self.assignment_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"shards": len(self.shards), "shard_by": self.shard_by, "assignment": self.assignment}, f)
+        os.replace(tmp, self.assignment_path)
+
+    def _assign(self, ids: List[str]) -> Dict[str, int]:
+        # snimljena raspodela, pa se metadata cita samo za nove id-jeve
+        saved = self._load_assignment()
+        assignment = {doc_id: saved[doc_id] for doc_id in ids if doc_id in saved}
+        unknown = [doc_id for doc_id in ids if doc_id not in assignment]
+        if unknown and self.shard_by == "source":
+            for i in range(0, len(unknown), GET_BATCH):
+                batch = self.collection.get(ids=unknown[i:i + GET_BATCH], include=['metadatas'])
+                for doc_id, metadata in zip(batch["ids"], batch["metadatas"]):
+                    assignment[doc_id] = self._shard_for(doc_id, metadata)
+        else:
+            for doc_id in unknown:
+                assignment[doc_id] = self._shard_for(doc_id, None)
+        return assignment
+
+    @locked
+    def load_or_build(self, force: bool = False):
+        ids = self.collection.get(include=[])['ids']
+        self.assignment = self._assign(ids)
+        groups = [[] for _ in self.shards]
+        for doc_id in ids:
+            groups[self.assignment[doc_id]].append(doc_id)
+        for view, shard_ids in zip(self.views, groups):
+            view.ids = dict.fromkeys(shard_ids)
+        # svaki shard proverava svoj snimljeni index i po potrebi se builda (paralelno)
+        self._map(lambda shard: shard.load_or_build(force=force))
+        self._saved_versions = [shard.version for shard in self.shards]
+        self._save_assignment()
+        self._version += 1
+        print(f"Sharded index: {len(self)} vectors in {len(self.shards)} shards "
+              f"{[len(shard) for shard in self.shards]}")
+
+    @locked
+    def rebuild_shard(self, shard: int):
+        """
+        Ponovni build jednog sharda iz chroma db, bez diranja ostalih.
+        """
+        self.shards[shard].load_or_build(force=True)
+        self._saved_versions[shard] = self.shards[shard].version
+
+    @locked
+    def retrain_if_needed(self) -> bool:
+        # samo shardovi trenirani na premalo vektora (paralelno)
+        retrained = [i for i, shard in enumerate(self.shards) if shard.index is not None and shard.undertrained()]
+        self._map(lambda shard: shard.retrain_if_needed(), retrained)
+        for i in retrained:
+            self._saved_versions[i] = self.shards[i].version
+        if retrained:
+            # ostali izmenjeni shardovi
+            self.save()
+        return bool(retrained)
+
+    @locked
+    def set_config(self, config: Dict):
+        self.config = config
+        self._map(lambda shard: shard.set_config(config))
+
+    @locked
+    def save(self):
+        # snimaju se samo shardovi koji su se promenili od poslednjeg snimanja
+        dirty = [i for i, shard in enumerate(self.shards) if shard.version != self._saved_versions[i]]
+        self._map(lambda shard: shard.save(), dirty)
+        for i in dirty:
+            self._saved_versions[i] = self.shards[i].version
+        self._save_assignment()
+
+    def save_in_background(self):
+        self._saver.request()
+
+    def flush(self):
+        self._saver.flush()
+
+    @locked
+    def add(self, ids: List[str], embeddings: np.ndarray, documents: List[str],
+            metadatas: Optional[List[Dict]] = None):
+        groups: Dict[int, List[int]] = {}
+        for row, doc_id in enumerate(ids):
+            shard = self.assignment.get(doc_id)
+            if shard is None:
+                shard = self.assignment[doc_id] = self._shard_for(doc_id, metadatas[row] if metadatas else None)
+            groups.setdefault(shard, []).append(row)
+        for shard, rows in groups.items():
+            shard_ids = [ids[row] for row in rows]
+            self.views[shard].add_ids(shard_ids)
+            self.shards[shard].add(shard_ids, embeddings[rows], [documents[row] for row in rows],
+                                   [metadatas[row] for row in rows] if metadatas else None)
+
+    @locked
+    def remove(self, ids: List[str]):
+        groups: Dict[int, List[str]] = {}
+        for doc_id in ids:
+            shard = self.assignment.pop(doc_id, None)
+            if shard is not None:
+                groups.setdefault(shard, []).append(doc_id)
+        for shard, shard_ids in groups.items():
+            self.views[shard].remove_ids(shard_ids)
+            self.shards[shard].remove(shard_ids)
+
+    def _current_layout(self):
+        version = self.version
+        if self._layout is None or self._layout[0] != version:
+            sizes = [len(shard.doc_id_mapping) for shard in self.shards]
+            offsets = np.concatenate([[0], np.cumsum(sizes)]).astype('int64')
+            mapping = [doc_id for shard in self.shards for doc_id in shard.doc_id_mapping]
+            self._layout = (version, offsets, ShardedDocs(self.shards, offsets), mapping)
+        return self._layout
+
+    @property
+    def offsets(self) -> np.ndarray:
+        return self._current_layout()[1]
+
+    @property
+    def docs(self) -> ShardedDocs:
+        return self._current_layout()[2]
+
+    @property
+    def doc_id_mapping(self) -> List[Optional[str]]:
+        return self._current_layout()[3]
+
+    @locked
+    def doc_ids(self, labels: Sequence[int]) -> List[str]:
+        mapping = self.doc_id_mapping
+        return [mapping[label] for label in labels]
+
+    def _globalize(self, parts: List, live: List[int]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        offsets = self.offsets
+        return [(scores, np.where(labels >= 0, labels + offsets[i], -1))
+                for i, (scores, labels) in zip(live, parts)]
+
+    def _live(self, usable: Callable, filter: Optional[Dict]) -> List[int]:
+        # shardovi bez zivih dokumenata (ili bez ijednog koji prolazi filter) se ne pretrazuju -
+        # vratili bi k=0 kolone, a i dalje zauzimali mesto u poolu
+        live = [i for i, shard in enumerate(self.shards) if usable(shard) and len(shard)]
+        if filter:
+            live = [i for i in live if self.shards[i].filter_mask(filter).any()]
+        return live
+
+    @locked
+    def search(self, query_embs: np.ndarray, k: int, filter: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Isto kao VectorIndex.search, ali preko svih shardova paralelno; labele su globalne.
+        """
+        live = self._live(lambda shard: shard.index is not None, filter)
+        if not live:
+            if filter:
+                return np.full((len(query_embs), k), np.inf, dtype='float32'), np.full((len(query_embs), k), -1, dtype='int64')
+            return np.zeros((len(query_embs), 0), dtype='float32'), np.zeros((len(query_embs), 0), dtype='int64')
+        parts = self._map(lambda shard: shard.search(query_embs, k, filter=filter), live)
+        return merge_topk(self._globalize(parts, live), k)
+
+    @locked
+    def lexical_search(self, queries: List[str], k: int, filter: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        live = self._live(lambda shard: shard.lexical is not None, filter)
+        if not live:
+            return np.zeros((len(queries), k), dtype='float32'), np.full((len(queries), k), -1, dtype='int64')
+        parts = self._map(lambda shard: shard.lexical_search(queries, k, filter=filter), live)
+        return merge_topk(self._globalize(parts, live), k, descending=True)
+
+    @locked
+    def filter_mask(self, spec: Dict) -> np.ndarray:
+        return np.concatenate([shard.filter_mask(spec) for shard in self.shards])
+
+    @locked
+    def vectors(self, labels: np.ndarray) -> np.ndarray:
+        labels = np.asarray(labels, dtype='int64')
+        offsets = self.offsets
+        shard_of_label = np.searchsorted(offsets, labels, side='right') - 1
+        out = np.zeros((len(labels), self.dim), dtype='float32')
+        for shard in np.unique(shard_of_label):
+            rows = np.flatnonzero(shard_of_label == shard)
+            out[rows] = self.shards[shard].vectors(labels[rows] - offsets[shard])
+        return out
@@ -0,0 +1,177 @@
+'''
+Benchmark startupa - koliko prodje pre nego sto proces uradi bilo sta korisno.
+
+Svako merenje ide u novom python procesu (hladni importi, prazan registar
+modela), i ponavlja se --repeats puta (prijavljuje se medijana):
+- import: svaka biblioteka i modul projekta posebno
+- modeli: sva tri modela redom vs paralelno kroz model_registry.warmup()
+  (biblioteke modela su vec uvezene, pa je ovo samo ucitavanje tezina)
+- prvi upit: od konstrukcije raga do prvog rezultata, lazy vs warmup()
+
+    python startup_benchmark.py --backend torch --repeats 3 --output startup.json
+'''
+
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+from typing import Dict, List, Optional
+
+IMPORTS = [
+    "numpy", "faiss", "httpx", "chromadb", "torch", "sentence_transformers", "onnxruntime",
+    "unstructured.partition.pdf",
+    # moduli projekta - posle lazy importa treba da budu jeftini
+    "hnsw", "rag", "main", "server"
+]
+QUERY = "How does the book implement string interning in the hash table?"
+RESULT_MARKER = "STARTUP_RESULT "
+
+
+def _child(args: List[str]) -> Optional[Dict]:
+    # novo merenje u novom procesu; None ako nije uspelo (npr. biblioteka nije instalirana)
+    proc = subprocess.run([sys.executable, __file__, "--child"] + args, capture_output=True, text=True)
+    for line in reversed(proc.stdout.splitlines()):
+        if line.startswith(RESULT_MARKER):
+            return json.loads(line[len(RESULT_MARKER):])
+    return None
+
+
+def _median(runs: List[Optional[Dict]], field: str) -> Optional[float]:
+    values = [run[field] for run in runs if run is not None]
+    return statistics.median(values) if values else None
+
+
+def _specs(backend: str):
+    import model_registry
+    from hnsw import HnswRAG
+    from rag import CrossRankingRAG
+
+    hnsw_rag, crossranking_rag = HnswRAG(backend=backend), CrossRankingRAG(backend=backend)
+    return [
+        (model_registry.EMBEDDING, hnsw_rag.embedding_model_name, backend, None),
+        (model_registry.EMBEDDING, crossranking_rag.embedding_model_name, backend, None),
+        (model_registry.CROSS_ENCODER, crossranking_rag.cross_encoder_model_name, backend, None)
+    ]
+
+
+def _run_child(kind: str, target: str, backend: str) -> Dict:
+    if kind == "import":
+        import importlib
+        start = time.perf_counter()
+        importlib.import_module(target)
+        return {"seconds": time.perf_counter() - start}
+
+    if kind == "models":
+        import model_registry
+        start = time.perf_counter()
+        if backend == "torch":
+            import sentence_transformers  # noqa: F401
+        else:
+            import onnxruntime, transformers  # noqa: F401
+        import_seconds = time.perf_counter() - start
+
+        specs = _specs(backend)
+        start = time.perf_counter()
+        if target == "serial":
+            for spec in specs:
+                model_registry.warmup([spec])[0].result()
+        else:
+            for future in model_registry.warmup(specs):
+                future.result()
+        return {"seconds": time.perf_counter() - start, "import_seconds": import_seconds,
+                "models": model_registry.stats()}
+
+    # prvi upit: target je "<rag>-<lazy|warmup>"
+    name, mode = target.split("-")
+    start = time.perf_counter()
+    if name == "hnsw":
+        from hnsw import HnswRAG
+        rag = HnswRAG(backend=backend)
+    else:
+        from rag import CrossRankingRAG
+        rag = CrossRankingRAG(backend=backend)
+    constructed = time.perf_counter() - start
+    if mode == "warmup":
+        rag.warmup()
+    rag.retrieve(QUERY, top_k=10)
+    return {"seconds": time.perf_counter() - start, "construct_seconds": constructed}
+
+
+def run(backend: str = "torch", repeats: int = 3) -> Dict:
+    report = {"backend": backend, "imports": {}, "models": {}, "first_query": {}}
+
+    baseline = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", "pass"], check=True)
+        baseline.append(time.perf_counter() - start)
+    report["interpreter_seconds"] = statistics.median(baseline)
+
+    for module in IMPORTS:
+        runs = [_child(["import", module, backend]) for _ in range(repeats)]
+        report["imports"][module] = _median(runs, "seconds")
+
+    for mode in ("serial", "concurrent"):
+        runs = [_child(["models", mode, backend]) for _ in range(repeats)]
+        done = [run for run in runs if run is not None]
+        report["models"][mode] = {
+            "seconds": _median(runs, "seconds"),
+            "import_seconds": _median(runs, "import_seconds"),
+            "per_model": done[-1]["models"] if done else None
+        }
+
+    for name in ("hnsw", "crossranking"):
+        for mode in ("lazy", "warmup"):
+            runs = [_child(["first_query", f"{name}-{mode}", backend]) for _ in range(repeats)]
+            report["first_query"][f"{name}-{mode}"] = {
+                "seconds": _median(runs, "seconds"),
+                "construct_seconds": _median(runs, "construct_seconds")
+            }
+    return report
+
+
+def _fmt(seconds: Optional[float]) -> str:
+    return "failed / not installed" if seconds is None else f"{seconds * 1000:9.1f} ms"
+
+
+def print_report(report: Dict):
+    print("=" * 80)
+    print(f"Startup benchmark [{report['backend']}]")
+    print(f"  python interpreter: {_fmt(report['interpreter_seconds'])}")
+    print("Imports (each in a fresh process):")
+    for module, seconds in report["imports"].items():
+        print(f"  {module:<30} {_fmt(seconds)}")
+    print("Model loads (libraries already imported):")
+    for mode, result in report["models"].items():
+        print(f"  {mode:<30} {_fmt(result['seconds'])}  (library import {_fmt(result['import_seconds']).strip()})")
+        for model, seconds in (result["per_model"] or {}).items():
+            print(f"    {model:<60} {seconds * 1000:9.1f} ms")
+    print("First query (construct + load + retrieve):")
+    for target, result in report["first_query"].items():
+        print(f"  {target:<30} {_fmt(result['seconds'])}  (constructor {_fmt(result['construct_seconds']).strip()})")
+    print("=" * 80)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Startup time benchmark: imports and model loads")
+    parser.add_argument("--backend", choices=["torch", "onnx", "onnx-int8"], default="torch")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="JSON fajl za rezultate")
+    parser.add_argument("--child", nargs=3, metavar=("KIND", "TARGET", "BACKEND"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(RESULT_MARKER + json.dumps(_run_child(*args.child)))
+        return
+
+    report = run(args.backend, args.repeats)
+    print_report(report)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
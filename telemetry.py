@@ -0,0 +1,384 @@
+'''
+Tracing i metrike za retrieval, ingest i generisanje.
+
+    with telemetry.span("faiss_search", rag="hnsw"):
+        ...
+    telemetry.count("rerank.pairs_scored", len(pairs), rag="reorder")
+
+Svaki span meri jednu fazu: trajanje ide u histogram po imenu faze, a
+zavrsen span (trace id, roditelj, atributi) u exportere. Spanovi se
+ugnjezdavaju preko contextvars, pa rade i u asyncio taskovima. Histogrami
+i brojaci se pune i bez exportera (stats(), report(), /metrics u serveru).
+
+Exporteri - RAG_TELEMETRY (zarezom odvojeno) ili configure():
+- console            - jedan red po spanu na stdout
+- jsonl:<putanja>    - span / brojac po redu, za kasniju analizu
+- otlp[:<endpoint>]  - OpenTelemetry SDK, OTLP/gRPC ka lokalnom kolektoru
+
+Sampling profiler (opt-in, RAG_PROFILE=<putanja>[:hz]) uzorkuje stekove
+niti koje su unutar spana i grupise ih po putanji spanova; izlaz je
+"folded" format (flamegraph.pl, speedscope).
+'''
+
+import os
+import sys
+import json
+import time
+import atexit
+import itertools
+import threading
+from collections import Counter, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+# koliko poslednjih trajanja po fazi cuvamo za percentile
+HISTOGRAM_SAMPLES = 10_000
+OTLP_ENDPOINT = "localhost:4317"
+SERVICE_NAME = "nbp-rag"
+PROFILE_HZ = 100
+
+_current: ContextVar[Optional["Span"]] = ContextVar("telemetry_span", default=None)
+_ids = itertools.count(1)
+_lock = threading.Lock()
+_exporters: List = []
+_histograms: Dict[str, "Histogram"] = {}
+_counters: Dict[Tuple[str, Tuple], float] = {}
+# najdublji aktivni span po niti (za profiler)
+_thread_spans: Dict[int, "Span"] = {}
+_profiler: Optional["SamplingProfiler"] = None
+
+
+class Span:
+    __slots__ = ("name", "path", "span_id", "parent_id", "trace_id", "attributes",
+                 "start_ns", "duration_s", "error", "_start")
+
+    def __init__(self, name: str, parent: Optional["Span"], attributes: Dict):
+        self.name = name
+        # putanja faza od korena, npr. retrieve;rerank (za profiler)
+        self.path = f"{parent.path};{name}" if parent else name
+        self.span_id = next(_ids)
+        self.parent_id = parent.span_id if parent else None
+        self.trace_id = parent.trace_id if parent else self.span_id
+        self.attributes = attributes
+        self.start_ns = time.time_ns()
+        self.duration_s = None
+        self.error = None
+        self._start = time.perf_counter()
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def as_dict(self) -> Dict:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start_ns": self.start_ns,
+            "duration_ms": self.duration_s * 1000,
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class Histogram:
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.samples = deque(maxlen=HISTOGRAM_SAMPLES)
+
+    def add(self, seconds: float):
+        self.count += 1
+        self.total += seconds
+        self.samples.append(seconds)
+
+    def stats(self) -> Dict:
+        from latency import latency_stats
+        stats = latency_stats(list(self.samples))
+        stats.pop("qps")
+        stats["count"] = self.count
+        stats["total_s"] = self.total
+        return stats
+
+
+@contextmanager
+def span(name: str, **attributes):
+    parent = _current.get()
+    current = Span(name, parent, attributes)
+    token = _current.set(current)
+    thread = threading.get_ident()
+    previous = _thread_spans.get(thread)
+    _thread_spans[thread] = current
+    try:
+        yield current
+    except BaseException as e:
+        current.error = type(e).__name__
+        raise
+    finally:
+        current.duration_s = time.perf_counter() - current._start
+        _current.reset(token)
+        if previous is None:
+            _thread_spans.pop(thread, None)
+        else:
+            _thread_spans[thread] = previous
+        _finish(current)
+
+
+def _finish(finished: Span):
+    record(finished.name, finished.duration_s, _export=False)
+    for exporter in _exporters:
+        exporter.export_span(finished)
+
+
+def record(name: str, seconds: float, _export: bool = True, **attributes):
+    """
+    Trajanje izmereno van spana (npr. shard parsiran u drugom procesu).
+    """
+    with _lock:
+        histogram = _histograms.get(name)
+        if histogram is None:
+            histogram = _histograms[name] = Histogram()
+        histogram.add(seconds)
+    if _export:
+        for exporter in _exporters:
+            exporter.export_metric("duration", name, seconds, attributes)
+
+
+def count(name: str, value: float = 1, **attributes):
+    key = (name, tuple(sorted(attributes.items())))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    for exporter in _exporters:
+        exporter.export_metric("counter", name, value, attributes)
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+async def with_parent(parent: Optional[Span], coro):
+    # coroutine koja se izvrsava u drugoj niti (npr. LLM event loop) nastavlja trace pozivaoca
+    token = _current.set(parent)
+    try:
+        return await coro
+    finally:
+        _current.reset(token)
+
+
+def _counter_name(name: str, attributes: Tuple) -> str:
+    if not attributes:
+        return name
+    return name + "{" + ",".join(f"{k}={v}" for k, v in attributes) + "}"
+
+
+def stats() -> Dict:
+    with _lock:
+        histograms = dict(_histograms)
+        counters = dict(_counters)
+    return {
+        "stages": {name: histogram.stats() for name, histogram in sorted(histograms.items())},
+        "counters": {_counter_name(name, attributes): value for (name, attributes), value in sorted(counters.items())}
+    }
+
+
+def report():
+    current = stats()
+    print("Stage latency (ms):")
+    for name, s in current["stages"].items():
+        print(f"  {name:<28} n={s['count']:<6} mean={s['mean_ms']:9.2f} p50={s['p50_ms']:9.2f} "
+              f"p95={s['p95_ms']:9.2f} p99={s['p99_ms']:9.2f} total={s['total_s']:8.2f}s")
+    print("Counters:")
+    for name, value in current["counters"].items():
+        print(f"  {name:<50} {value:g}")
+
+
+def _plain(value):
+    # OTLP/JSON atributi: brojevi, stringovi, bool; ostalo kao JSON string
+    if isinstance(value, (str, bool, int, float)):
+        return value
+    return json.dumps(value, sort_keys=True, default=str)
+
+
+class ConsoleExporter:
+    def export_span(self, finished: Span):
+        depth = finished.path.count(";")
+        attributes = " ".join(f"{k}={_plain(v)}" for k, v in finished.attributes.items())
+        error = f" error={finished.error}" if finished.error else ""
+        print(f"[trace {finished.trace_id}] {'  ' * depth}{finished.name} "
+              f"{finished.duration_s * 1000:.2f} ms {attributes}{error}")
+
+    def export_metric(self, kind: str, name: str, value: float, attributes: Dict):
+        pass
+
+    def close(self):
+        pass
+
+
+class JsonlExporter:
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def _write(self, record: Dict):
+        line = json.dumps(record, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+
+    def export_span(self, finished: Span):
+        self._write({"type": "span", **finished.as_dict()})
+
+    def export_metric(self, kind: str, name: str, value: float, attributes: Dict):
+        self._write({"type": kind, "name": name, "value": value, "attributes": attributes, "time_ns": time.time_ns()})
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class OtlpExporter:
+    """
+    Spanovi i metrike kroz OpenTelemetry SDK (OTLP/gRPC, npr. lokalni otel-collector ili Jaeger).
+    """
+    def __init__(self, endpoint: str = OTLP_ENDPOINT, service_name: str = SERVICE_NAME):
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+        from opentelemetry.sdk.metrics import MeterProvider
+        from opentelemetry.sdk.metrics.export import PeriodicExportingMetricReader
+        from opentelemetry.exporter.otlp.proto.grpc.trace_exporter import OTLPSpanExporter
+        from opentelemetry.exporter.otlp.proto.grpc.metric_exporter import OTLPMetricExporter
+
+        resource = Resource.create({"service.name": service_name})
+        self._tracer_provider = TracerProvider(resource=resource)
+        self._tracer_provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter(endpoint=endpoint, insecure=True)))
+        self._tracer = self._tracer_provider.get_tracer(__name__)
+        reader = PeriodicExportingMetricReader(OTLPMetricExporter(endpoint=endpoint, insecure=True))
+        self._meter_provider = MeterProvider(resource=resource, metric_readers=[reader])
+        self._meter = self._meter_provider.get_meter(__name__)
+        self._instruments = {}
+        # deca se zavrse pre roditelja, pa trace saljemo tek kad se zavrsi koren
+        self._pending: Dict[int, List[Span]] = {}
+        self._lock = threading.Lock()
+
+    def _instrument(self, kind: str, name: str):
+        with self._lock:
+            instrument = self._instruments.get((kind, name))
+            if instrument is None:
+                if kind == "counter":
+                    instrument = self._meter.create_counter(name)
+                else:
+                    instrument = self._meter.create_histogram(name, unit="ms")
+                self._instruments[(kind, name)] = instrument
+        return instrument
+
+    def export_span(self, finished: Span):
+        from opentelemetry import trace
+        from opentelemetry.trace import Status, StatusCode
+
+        self._instrument("duration", "rag.stage.duration").record(finished.duration_s * 1000, {"stage": finished.name})
+        with self._lock:
+            self._pending.setdefault(finished.trace_id, []).append(finished)
+            if finished.parent_id is not None:
+                return
+            spans = self._pending.pop(finished.trace_id)
+
+        contexts = {}
+        for s in sorted(spans, key=lambda s: s.start_ns):
+            otel_span = self._tracer.start_span(
+                s.name, context=contexts.get(s.parent_id), start_time=s.start_ns,
+                attributes={k: _plain(v) for k, v in s.attributes.items()}
+            )
+            if s.error:
+                otel_span.set_status(Status(StatusCode.ERROR, s.error))
+            contexts[s.span_id] = trace.set_span_in_context(otel_span)
+            otel_span.end(end_time=s.start_ns + int(s.duration_s * 1e9))
+
+    def export_metric(self, kind: str, name: str, value: float, attributes: Dict):
+        attributes = {k: _plain(v) for k, v in attributes.items()}
+        if kind == "counter":
+            self._instrument("counter", name).add(value, attributes)
+        else:
+            self._instrument("duration", name).record(value * 1000, attributes)
+
+    def close(self):
+        self._tracer_provider.shutdown()
+        self._meter_provider.shutdown()
+
+
+class SamplingProfiler:
+    """
+    Uzorkuje stekove niti koje su unutar nekog spana, hz puta u sekundi.
+    Koren svakog steka je putanja spanova, pa se vidi gde unutar faze ide vreme.
+    """
+    def __init__(self, path: str, hz: int = PROFILE_HZ):
+        self.path = path
+        self.interval = 1.0 / hz
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                active = _thread_spans.get(thread_id)
+                if thread_id == me or active is None:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                    frame = frame.f_back
+                self.samples[";".join([active.path] + stack[::-1])] += 1
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        with open(self.path, "w", encoding="utf-8") as f:
+            for stack, samples in self.samples.most_common():
+                f.write(f"{stack} {samples}\n")
+        print(f"Profile: {sum(self.samples.values())} samples written to {self.path}")
+
+
+def make_exporter(spec: str):
+    kind, _, arg = spec.strip().partition(":")
+    if kind == "console":
+        return ConsoleExporter()
+    if kind == "jsonl":
+        return JsonlExporter(arg or "telemetry.jsonl")
+    if kind == "otlp":
+        return OtlpExporter(arg or OTLP_ENDPOINT)
+    raise ValueError(f"Unknown telemetry exporter '{kind}', expected console, jsonl[:path] or otlp[:endpoint]")
+
+
+def configure(exporters: Optional[str] = None, profile: Optional[str] = None):
+    """
+    exporters - npr. "console,jsonl:trace.jsonl"; profile - "<putanja>[:hz]" za sampling profiler.
+    """
+    global _profiler
+    if exporters:
+        _exporters.extend(make_exporter(spec) for spec in exporters.split(",") if spec.strip())
+    if profile and _profiler is None:
+        path, _, hz = profile.partition(":")
+        _profiler = SamplingProfiler(path, int(hz) if hz else PROFILE_HZ)
+        _profiler.start()
+
+
+def shutdown():
+    global _profiler
+    if _profiler is not None:
+        _profiler.stop()
+        _profiler = None
+    while _exporters:
+        _exporters.pop().close()
+
+
+configure(os.environ.get("RAG_TELEMETRY"), os.environ.get("RAG_PROFILE"))
+atexit.register(shutdown)
@@ -0,0 +1,61 @@
+'''
+Zajednicki fixture-i: moduli projekta su u korenu repozitorijuma, a umesto
+chroma kolekcije testovi koriste FakeCollection (samo add/delete/get).
+'''
+
+import os
+import sys
+from typing import Dict, List, Optional
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeCollection:
+    """
+    Kolekcija u memoriji sa podskupom chroma API-ja koji koristi VectorIndex.
+    """
+    def __init__(self):
+        self.rows: Dict[str, tuple] = {}
+
+    def add(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        for doc_id, emb, doc, meta in zip(ids, embeddings, documents, metadatas):
+            self.rows[doc_id] = (np.asarray(emb, dtype='float32'), doc, meta)
+
+    def delete(self, ids: List[str]):
+        for doc_id in ids:
+            self.rows.pop(doc_id, None)
+
+    def count(self) -> int:
+        return len(self.rows)
+
+    def get(self, ids: Optional[List[str]] = None, include=("documents", "metadatas")) -> Dict:
+        ids = list(self.rows) if ids is None else [doc_id for doc_id in ids if doc_id in self.rows]
+        result = {"ids": ids}
+        for field, position in (("embeddings", 0), ("documents", 1), ("metadatas", 2)):
+            if field in include:
+                result[field] = [self.rows[doc_id][position] for doc_id in ids]
+        return result
+
+
+def make_corpus(n: int, dim: int, seed: int = 0, sources: int = 3):
+    rng = np.random.default_rng(seed)
+    embeddings = rng.standard_normal((n, dim)).astype('float32')
+    ids = [f"doc{i}" for i in range(n)]
+    documents = [f"paragraph {i} about topic{i % 7} tableFind{i % 3}" for i in range(n)]
+    metadatas = [{"source": f"book{i % sources}.pdf", "chapter": str(i % 10),
+                  "page_start": str(i), "page_end": str(i + 1)} for i in range(n)]
+    return ids, embeddings, documents, metadatas
+
+
+@pytest.fixture
+def corpus():
+    return make_corpus(400, 16)
+
+
+@pytest.fixture
+def collection(corpus):
+    collection = FakeCollection()
+    collection.add(*corpus)
+    return collection
@@ -0,0 +1,118 @@
+import json
+import asyncio
+import pytest
+from batching import MicroBatcher
+from server import RAGServer, _retrieve_batch
+
+
+def _run_all(batcher: MicroBatcher, items):
+    async def run():
+        return await asyncio.gather(*(batcher.submit(item) for item in items), return_exceptions=True)
+    return asyncio.run(run())
+
+
+def test_concurrent_requests_share_a_batch():
+    calls = []
+
+    def process(items):
+        calls.append(list(items))
+        return [item * 2 for item in items]
+
+    batcher = MicroBatcher(process, max_batch_size=8, max_wait_ms=50)
+    assert _run_all(batcher, range(5)) == [0, 2, 4, 6, 8]
+    assert calls == [[0, 1, 2, 3, 4]]
+    assert batcher.stats()["mean_batch_size"] == 5
+
+
+def test_max_batch_size_splits_batches():
+    calls = []
+
+    def process(items):
+        calls.append(len(items))
+        return list(items)
+
+    batcher = MicroBatcher(process, max_batch_size=4, max_wait_ms=50)
+    assert _run_all(batcher, range(10)) == list(range(10))
+    assert max(calls) <= 4 and sum(calls) == 10
+
+
+def test_batch_error_fails_every_request():
+    def process(items):
+        raise RuntimeError("model failed")
+
+    results = _run_all(MicroBatcher(process, max_wait_ms=20), ["a", "b"])
+    assert all(isinstance(r, RuntimeError) for r in results)
+
+
+def test_result_count_mismatch_fails_every_request():
+    def process(items):
+        return [item.upper() for item in items][:-1]
+
+    results = _run_all(MicroBatcher(process, max_batch_size=8, max_wait_ms=20), ["a", "b", "c"])
+    assert all(isinstance(r, RuntimeError) and "2 results for 3 items" in str(r) for r in results)
+
+
+def test_per_item_error_fails_only_that_request():
+    def process(items):
+        return [ValueError(item) if item == "bad" else item.upper() for item in items]
+
+    results = _run_all(MicroBatcher(process, max_wait_ms=20), ["ok", "bad", "fine"])
+    assert results[0] == "OK" and results[2] == "FINE"
+    assert isinstance(results[1], ValueError)
+
+
+class FakeRag:
+    def __init__(self):
+        self.calls = []
+
+    def retrieve_many(self, queries, top_k, filter=None, **extra):
+        self.calls.append((list(queries), top_k, filter))
+        if filter == {"chapter": "broken"}:
+            raise ValueError("bad filter")
+        return [{"query": q, "top_k": top_k} for q in queries]
+
+
+def test_retrieve_batch_groups_by_top_k_and_filter():
+    rag = FakeRag()
+    items = [("q1", 5, None, None), ("q2", 10, None, None), ("q3", 5, None, None),
+             ("q4", 5, {"chapter": 3}, None)]
+    results = _retrieve_batch(rag, items)
+    assert [r["query"] for r in results] == ["q1", "q2", "q3", "q4"]
+    assert sorted(len(call[0]) for call in rag.calls) == [1, 1, 2]
+
+
+def test_retrieve_batch_isolates_failing_group():
+    rag = FakeRag()
+    results = _retrieve_batch(rag, [("q1", 5, None, None), ("q2", 5, {"chapter": "broken"}, None)])
+    assert results[0]["query"] == "q1"
+    assert isinstance(results[1], ValueError)
+
+
+def _post(app: RAGServer, path: str, body) -> tuple:
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": json.dumps(body).encode(), "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    asyncio.run(app({"type": "http", "method": "POST", "path": path}, receive, send))
+    return messages[0]["status"], json.loads(messages[1]["body"])
+
+
+def test_only_validation_errors_are_bad_requests():
+    def process(items):
+        raise ValueError("internal failure")
+
+    # bez ucitavanja modela - samo rutiranje i mapiranje gresaka
+    app = RAGServer.__new__(RAGServer)
+    app.rags = {"hnsw": FakeRag()}
+    app.batchers = {"hnsw": MicroBatcher(process, max_wait_ms=1)}
+
+    status, payload = _post(app, "/retrieve", {"query": "", "rag": "hnsw"})
+    assert status == 400 and "query" in payload["error"]
+    status, _ = _post(app, "/retrieve", {"query": "q", "rag": "hnsw", "filter": {"chapter": {"$bad": 1}}})
+    assert status == 400
+    status, payload = _post(app, "/retrieve", {"query": "q", "rag": "hnsw"})
+    assert status == 500 and payload["error"] == "ValueError: internal failure"
@@ -0,0 +1,60 @@
+from context_builder import ContextBuilder, Tokenizer, minhash, similarity
+
+TEXT = ("The hash table uses open addressing with linear probing, and the load factor "
+        "is kept below three quarters so that lookups stay fast even for long chains")
+
+
+class WordTokenizer(Tokenizer):
+    # bez transformers tokenizera - token je rec
+    def count(self, texts):
+        return [len(t.split()) for t in texts]
+
+
+def _builder(max_tokens: int = 1000) -> ContextBuilder:
+    return ContextBuilder(max_tokens=max_tokens, tokenizer=WordTokenizer())
+
+
+def test_minhash_similarity():
+    assert similarity(minhash(TEXT), minhash(TEXT)) == 1.0
+    assert similarity(minhash(TEXT), minhash(TEXT.replace("fast", "quick"))) > 0.6
+    assert similarity(minhash(TEXT), minhash("completely unrelated text about garbage collection roots")) < 0.2
+
+
+def test_near_duplicates_keep_best_scored_copy():
+    results = {
+        "documents": [TEXT + " indeed", "A different paragraph about closures and upvalues in the virtual machine", TEXT],
+        "metadatas": [{"source": "a.pdf", "page_start": "5", "page_end": "5"},
+                      {"source": "a.pdf", "page_start": "40", "page_end": "40"},
+                      {"source": "b.pdf", "page_start": "9", "page_end": "9"}],
+        "scores": [0.2, 0.5, 0.9]
+    }
+    context = _builder().build(results)
+    assert context.duplicates == 1
+    assert [p.text for p in context.passages] == [TEXT, results["documents"][1]]
+
+
+def test_overlapping_chunks_are_merged():
+    first = "Chunk one text that ends with a long shared overlap region"
+    second = "a long shared overlap region and then continues further"
+    results = {
+        "documents": [first, second],
+        "metadatas": [{"source": "a.pdf", "page_start": "3", "page_end": "3"},
+                      {"source": "a.pdf", "page_start": "3", "page_end": "4"}],
+        "distances": [0.1, 0.2]
+    }
+    context = _builder().build(results)
+    assert context.merged == 1
+    assert context.passages[0].text == first + " and then continues further"
+    assert context.passages[0].metadata["page_end"] == "4"
+
+
+def test_budget_skips_passages_that_do_not_fit():
+    results = {
+        "documents": ["short best passage", " ".join(["long"] * 50), "another short one"],
+        "scores": [3.0, 2.0, 1.0]
+    }
+    context = _builder(max_tokens=10).build(results)
+    assert [p.text for p in context.passages] == ["short best passage", "another short one"]
+    assert context.dropped == 1
+    assert context.tokens <= 10
+    assert context.tokens_saved == context.naive_tokens - context.tokens
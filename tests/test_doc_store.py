@@ -0,0 +1,74 @@
+import numpy as np
+from doc_store import DocStore, GrowableArray, StringColumn, MISSING
+
+DOCS = ["first paragraph", "drugi pasus sa čćž", ""]
+METAS = [
+    {"chapter": "3", "page_start": "10", "page_end": "12", "source": "book.pdf", "subchapter": "3.1", "type": "text"},
+    {"chapter": "x", "page_start": "11", "subchapter": ""},
+    {},
+]
+
+
+def _store() -> DocStore:
+    store = DocStore()
+    store.append(DOCS[:2], METAS[:2])
+    store.append(DOCS[2:], METAS[2:])
+    return store
+
+
+def test_metadata_roundtrip_in_memory():
+    store = _store()
+    assert len(store) == 3
+    assert store.documents(range(3)) == DOCS
+    assert store.metadatas(range(3)) == METAS
+    # nebrojevna vrednost nije u int koloni (filter je ne vidi), ali se vraca nepromenjena
+    assert store.int_columns["chapter"][1] == MISSING
+
+
+def test_metadata_values_survive_roundtrip():
+    metas = [{"chapter": "007", "page_start": 5, "page_end": "-1", "subchapter": "", "source": "a.pdf"},
+             {"chapter": "Appendix A", "subchapter": None, "position": 3}]
+    store = DocStore()
+    store.append(["a", "b"], metas)
+    assert store.metadatas(range(2)) == metas
+    # brojevi i dalje idu u int kolone
+    assert store.int_columns["chapter"][0] == 7
+    assert store.int_columns["page_start"][0] == 5
+
+
+def test_save_and_mmap_load(tmp_path):
+    _store().save(str(tmp_path))
+    loaded = DocStore.load(str(tmp_path))
+    assert isinstance(loaded.text.blob, np.memmap)
+    assert loaded.documents(range(3)) == DOCS
+    assert loaded.metadatas(range(3)) == _store().metadatas(range(3))
+
+
+def test_append_after_mmap_load(tmp_path):
+    _store().save(str(tmp_path))
+    loaded = DocStore.load(str(tmp_path))
+    loaded.append(["appended"], [{"chapter": "7", "source": "other.pdf"}])
+    assert loaded.document(3) == "appended"
+    assert loaded.metadata(3) == {"chapter": "7", "source": "other.pdf"}
+    assert loaded.documents(range(3)) == DOCS
+    # fajl na disku se ne menja dok se ponovo ne snimi
+    assert len(DocStore.load(str(tmp_path))) == 3
+
+
+def test_load_missing_directory(tmp_path):
+    assert DocStore.load(str(tmp_path / "missing")) is None
+
+
+def test_growable_array_reserves_capacity():
+    array = GrowableArray(np.zeros(0, dtype='int32'))
+    for i in range(100):
+        array.append(np.array([i], dtype='int32'))
+    assert array.values.tolist() == list(range(100))
+    assert len(array._data) < 200
+
+
+def test_string_column_offsets():
+    column = StringColumn()
+    column.append(["a", "", "ččč"])
+    assert [column.get(i) for i in range(len(column))] == ["a", "", "ččč"]
+    assert column.offsets.tolist() == [0, 1, 1, 7]
@@ -0,0 +1,68 @@
+import os
+import numpy as np
+from embedding_cache import EmbeddingCache, INDEX_FILE, VECTORS_FILE, _space_name
+
+DIM = 8
+
+
+class Encoder:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, texts):
+        self.calls.append(list(texts))
+        return np.array([[len(text) + i for i in range(DIM)] for text in texts], dtype='float32')
+
+
+def _encode(cache: EmbeddingCache, texts, encoder) -> np.ndarray:
+    return cache.encode("model", "torch", True, texts, encoder)
+
+
+def _space_dir(cache_dir) -> str:
+    return os.path.join(str(cache_dir), _space_name("model", "torch", True))
+
+
+def test_hits_skip_the_model(tmp_path):
+    cache, encoder = EmbeddingCache(str(tmp_path)), Encoder()
+    first = _encode(cache, ["a", "bb", "a"], encoder)
+    # ponovljeni tekst u istom pozivu se enkoduje jednom
+    assert encoder.calls == [["a", "bb"]]
+    second = _encode(cache, ["bb", "ccc", "a"], encoder)
+    assert encoder.calls[1] == ["ccc"]
+    np.testing.assert_array_equal(second[[0, 2]], first[[1, 0]])
+    stats = cache.stats()["model[torch/normalized]"]
+    assert stats["entries"] == 3 and stats["hits"] == 2 and stats["misses"] == 3
+
+
+def test_reload_after_restart(tmp_path):
+    expected = _encode(EmbeddingCache(str(tmp_path)), ["a", "bb", "ccc"], Encoder())
+    encoder = Encoder()
+    again = _encode(EmbeddingCache(str(tmp_path)), ["ccc", "a", "bb"], encoder)
+    assert encoder.calls == []
+    np.testing.assert_array_equal(again, expected[[2, 0, 1]])
+
+
+def test_truncated_vectors_are_reencoded(tmp_path):
+    _encode(EmbeddingCache(str(tmp_path)), ["a", "bb", "ccc"], Encoder())
+    # prekinut upis - poslednji red vektora je polovican
+    path = os.path.join(_space_dir(tmp_path), VECTORS_FILE)
+    with open(path, "r+b") as f:
+        f.truncate(2 * DIM * 2 + 3)
+    encoder = Encoder()
+    cache = EmbeddingCache(str(tmp_path))
+    result = _encode(cache, ["a", "bb", "ccc"], encoder)
+    assert encoder.calls == [["ccc"]]
+    np.testing.assert_array_equal(result, Encoder()(["a", "bb", "ccc"]))
+    assert os.path.getsize(os.path.join(_space_dir(tmp_path), INDEX_FILE)) == 3 * 8
+
+
+def test_adds_reuse_the_mapping_until_capacity(tmp_path):
+    cache, encoder = EmbeddingCache(str(tmp_path)), Encoder()
+    _encode(cache, ["a"], encoder)
+    space = next(iter(cache._spaces.values()))
+    mapping = space.vectors
+    for i in range(10):
+        _encode(cache, [f"text {i}"], encoder)
+    assert space.vectors is mapping
+    _encode(cache, [f"bulk {i}" for i in range(space.capacity)], encoder)
+    assert space.vectors is not mapping and space.capacity >= len(space)
@@ -0,0 +1,71 @@
+import json
+import faiss
+import numpy as np
+import index_store
+from index_store import IndexStore, docs_fingerprint, update_fingerprint
+
+
+def _index(n: int = 10, dim: int = 4) -> faiss.Index:
+    index = faiss.IndexFlatL2(dim)
+    index.add(np.random.default_rng(0).standard_normal((n, dim)).astype('float32'))
+    return index
+
+
+def test_fingerprint_ignores_order():
+    assert docs_fingerprint(["a", "b", "c"]) == docs_fingerprint(["c", "a", "b"])
+    assert docs_fingerprint(["a", "b"]) != docs_fingerprint(["a", "c"])
+
+
+def test_update_fingerprint_matches_full_recompute():
+    base = docs_fingerprint(["a", "b", "c"], ["ta", "tb", "tc"])
+    updated = update_fingerprint(base, added=[("d", "td", None), ("e", "te", None)], removed=[("b", "tb", None)])
+    assert updated == docs_fingerprint(["a", "c", "d", "e"], ["ta", "tc", "td", "te"])
+    assert update_fingerprint(updated, removed=[("d", "td", None), ("e", "te", None)],
+                              added=[("b", "tb", None)]) == base
+
+
+def test_fingerprint_covers_content():
+    base = docs_fingerprint(["a", "b"], ["ta", "tb"], [{"page": "1"}, {"page": "2"}])
+    assert docs_fingerprint(["a", "b"], ["ta", "changed"], [{"page": "1"}, {"page": "2"}]) != base
+    assert docs_fingerprint(["a", "b"], ["ta", "tb"], [{"page": "1"}, {"page": "3"}]) != base
+
+
+def test_load_roundtrip(tmp_path):
+    store = IndexStore(str(tmp_path), "flat")
+    fingerprint = docs_fingerprint(["a", "b"])
+    store.save(_index(), {"fingerprint": fingerprint, "doc_id_mapping": ["a", "b"]})
+
+    loaded = store.load(fingerprint)
+    assert loaded is not None
+    index, meta = loaded
+    assert index.ntotal == 10
+    assert meta["doc_id_mapping"] == ["a", "b"]
+    assert meta["format_version"] == index_store.FORMAT_VERSION
+
+
+def test_load_rejects_stale_fingerprint(tmp_path):
+    store = IndexStore(str(tmp_path), "flat")
+    store.save(_index(), {"fingerprint": docs_fingerprint(["a"])})
+    assert store.load(docs_fingerprint(["a", "b"])) is None
+
+
+def test_load_rejects_other_kind(tmp_path):
+    fingerprint = docs_fingerprint(["a"])
+    IndexStore(str(tmp_path), "flat").save(_index(), {"fingerprint": fingerprint})
+    assert IndexStore(str(tmp_path), "hnsw_sq8").load(fingerprint) is None
+
+
+def test_load_rejects_old_format_version(tmp_path):
+    store = IndexStore(str(tmp_path), "flat")
+    fingerprint = docs_fingerprint(["a"])
+    store.save(_index(), {"fingerprint": fingerprint})
+    with open(store.meta_path, "r", encoding="utf-8") as f:
+        meta = json.load(f)
+    meta["format_version"] = index_store.FORMAT_VERSION - 1
+    with open(store.meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    assert store.load(fingerprint) is None
+
+
+def test_load_missing_files(tmp_path):
+    assert IndexStore(str(tmp_path), "flat").load(docs_fingerprint([])) is None
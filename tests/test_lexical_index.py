@@ -0,0 +1,86 @@
+import numpy as np
+from lexical_index import BM25Index, reciprocal_rank_fusion, tokenize
+
+DOCS = [
+    "tableFindString looks up interned strings in the hash table",
+    "the garbage collector marks roots then traces references",
+    "closures capture upvalues from the enclosing function",
+    "hash table resize doubles capacity and reinserts entries",
+]
+
+
+def _index(docs=DOCS) -> BM25Index:
+    index = BM25Index()
+    index.add(range(len(docs)), docs)
+    return index
+
+
+def _top(index: BM25Index, query: str, k: int = 4):
+    _, labels = index.search([query], k)
+    return [label for label in labels[0].tolist() if label >= 0]
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("tableFindString snake_case") == \
+        ["tablefindstring", "table", "find", "string", "snake_case", "snake", "case"]
+
+
+def test_search_ranks_matching_documents():
+    index = _index()
+    assert _top(index, "tableFindString")[0] == 0
+    assert set(_top(index, "hash table")) == {0, 3}
+    assert _top(index, "nonexistent") == []
+
+
+def test_delta_and_merged_segments_score_the_same():
+    delta = _index()
+    merged = _index()
+    merged.merge()
+    assert not merged.delta
+    for query in ("hash table", "closures upvalues", "garbage roots"):
+        s1, l1 = delta.search([query], 4)
+        s2, l2 = merged.search([query], 4)
+        assert l1.tolist() == l2.tolist()
+        assert np.allclose(s1, s2)
+
+
+def test_remove_hides_document_and_merge_drops_postings():
+    index = _index()
+    index.remove([0])
+    assert 0 not in _top(index, "hash table")
+    assert index.live_count == 3
+    index.merge()
+    assert 0 not in index.labels.tolist()
+    assert _top(index, "hash table") == [3]
+
+
+def test_add_after_merge():
+    index = _index()
+    index.merge()
+    index.add([4], ["another hash table chapter"])
+    assert set(_top(index, "hash table")) == {0, 3, 4}
+
+
+def test_mask_restricts_hits():
+    index = _index()
+    mask = np.array([False, False, False, True])
+    _, labels = index.search(["hash table"], 4, mask=mask)
+    assert [label for label in labels[0] if label >= 0] == [3]
+
+
+def test_save_and_load(tmp_path):
+    index = _index()
+    index.remove([1])
+    index.save(str(tmp_path))
+    loaded = BM25Index.load(str(tmp_path))
+    for query in ("hash table", "garbage", "closures"):
+        assert _top(loaded, query) == _top(index, query)
+    assert BM25Index.load(str(tmp_path / "missing")) is None
+
+
+def test_reciprocal_rank_fusion():
+    fused = reciprocal_rank_fusion([[1, 2, 3], [3, 1, -1]], k=60)
+    labels = [label for label, _ in fused]
+    assert labels == [1, 3, 2]
+    assert fused[0][1] == 1 / 61 + 1 / 62
+    assert reciprocal_rank_fusion([]) == []
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+import pytest
+import mock_llm_server
+from mock_llm_server import MockLLMHandler, serve
+from llm import Generator, LLMError, OpenAICompatibleProvider
+
+pytest.importorskip("httpx")
+
+PROMPT = "alpha beta gamma"
+
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    # brz mock bez gresaka; testovi menjaju atribute handlera po potrebi
+    monkeypatch.setattr(MockLLMHandler, "ttft_ms", 0)
+    monkeypatch.setattr(MockLLMHandler, "token_ms", 0)
+    monkeypatch.setattr(MockLLMHandler, "tokens", 5)
+    monkeypatch.setattr(MockLLMHandler, "fail_rate", 0.0)
+    server = serve(port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
+
+
+def _generator(base_url: str, **kwargs) -> Generator:
+    return Generator(OpenAICompatibleProvider(base_url, None, "mock"), backoff_s=0.001, **kwargs)
+
+
+def _generate(generator: Generator, coro):
+    async def run():
+        try:
+            return await coro
+        finally:
+            await generator.provider.aclose()
+    return asyncio.run(run())
+
+
+def test_streamed_text_and_ttft(mock_llm, monkeypatch):
+    monkeypatch.setattr(MockLLMHandler, "ttft_ms", 100)
+    monkeypatch.setattr(MockLLMHandler, "token_ms", 20)
+    generator = _generator(mock_llm)
+    tokens = []
+    result = _generate(generator, generator.agenerate(PROMPT, on_token=tokens.append))
+    assert result.text == "alpha beta gamma alpha beta "
+    assert tokens == ["alpha ", "beta ", "gamma ", "alpha ", "beta "]
+    assert result.attempts == 1
+    # prvi token posle ttft_ms, ostali po token_ms
+    assert 0.1 <= result.ttft_s < result.total_s
+    assert result.total_s - result.ttft_s >= 4 * 0.02 * 0.9
+
+
+def test_failures_are_retried(mock_llm, monkeypatch):
+    monkeypatch.setattr(MockLLMHandler, "fail_rate", 0.5)
+    # prva dva zahteva dobijaju 503, treci prolazi
+    draws = iter([0.0, 0.0, 0.9])
+    monkeypatch.setattr(mock_llm_server, "random", type("Draws", (), {"random": staticmethod(lambda: next(draws))}))
+    generator = _generator(mock_llm, retries=3)
+    result = _generate(generator, generator.agenerate(PROMPT))
+    assert result.attempts == 3
+    assert result.text == "alpha beta gamma alpha beta "
+
+
+def test_retries_are_bounded(mock_llm, monkeypatch):
+    monkeypatch.setattr(MockLLMHandler, "fail_rate", 1.0)
+    generator = _generator(mock_llm, retries=2)
+    with pytest.raises(LLMError, match="HTTP 503"):
+        _generate(generator, generator.agenerate(PROMPT))
+
+
+def test_max_in_flight_limits_concurrency(mock_llm, monkeypatch):
+    monkeypatch.setattr(MockLLMHandler, "ttft_ms", 50)
+    lock = threading.Lock()
+    active = [0]
+    peak = [0]
+    handle = MockLLMHandler.do_POST
+
+    def counted(self):
+        with lock:
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+        try:
+            handle(self)
+        finally:
+            with lock:
+                active[0] -= 1
+
+    monkeypatch.setattr(MockLLMHandler, "do_POST", counted)
+    generator = _generator(mock_llm, max_in_flight=2)
+    results = _generate(generator, generator.agenerate_many([f"{PROMPT} {i}" for i in range(6)]))
+    assert len(results) == 6 and all(r.text for r in results)
+    assert peak[0] == 2
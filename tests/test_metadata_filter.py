@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+from doc_store import DocStore
+from metadata_filter import FilterIndex, filter_key, validate
+
+# chunk i: chapter i % 4, strane [2i, 2i + 3], source a.pdf / b.pdf naizmenicno
+N = 20
+
+
+def _index(alive=None) -> FilterIndex:
+    docs = DocStore()
+    docs.append([f"doc {i}" for i in range(N)],
+                [{"chapter": str(i % 4), "page_start": str(2 * i), "page_end": str(2 * i + 3),
+                  "source": "a.pdf" if i % 2 == 0 else "b.pdf"} for i in range(N)])
+    return FilterIndex(docs, np.ones(N, dtype=bool) if alive is None else alive)
+
+
+def _labels(spec, index=None):
+    return np.flatnonzero((index or _index()).mask(spec)).tolist()
+
+
+@pytest.mark.parametrize("spec, expected", [
+    ({"chapter": 1}, [i for i in range(N) if i % 4 == 1]),
+    ({"chapter": {"$ne": 1}}, [i for i in range(N) if i % 4 != 1]),
+    ({"chapter": {"$in": [0, 3]}}, [i for i in range(N) if i % 4 in (0, 3)]),
+    ({"chapter": {"$nin": [0, 3]}}, [i for i in range(N) if i % 4 in (1, 2)]),
+    ({"page_start": {"$gt": 30}}, [i for i in range(N) if 2 * i > 30]),
+    ({"page_start": {"$gte": 30}}, [i for i in range(N) if 2 * i >= 30]),
+    ({"page_start": {"$lt": 6}}, [0, 1, 2]),
+    ({"page_start": {"$gte": 10, "$lte": 14}}, [5, 6, 7]),
+    ({"source": "b.pdf"}, list(range(1, N, 2))),
+    ({"source": {"$nin": ["b.pdf"]}}, list(range(0, N, 2))),
+    ({"source": "missing.pdf"}, []),
+    ({"$or": [{"chapter": 1}, {"source": "a.pdf"}]}, [i for i in range(N) if i % 4 == 1 or i % 2 == 0]),
+    ({"$and": [{"chapter": {"$in": [1, 2]}}, {"source": "a.pdf"}]}, [i for i in range(N) if i % 4 == 2]),
+])
+def test_operators(spec, expected):
+    assert _labels(spec) == expected
+
+
+def test_pages_shorthand_matches_overlapping_chunks():
+    # [2i, 2i + 3] se preklapa sa [10, 12] za i = 4, 5, 6
+    assert _labels({"pages": [10, 12]}) == [4, 5, 6]
+    assert _labels({"pages": [100, 200]}) == []
+
+
+def test_missing_values_never_match():
+    docs = DocStore()
+    docs.append(["no page", "page 3", "page -1 unknown", "page 8"],
+                [{"chapter": "1"}, {"page_start": "3", "chapter": "2"}, {"page_start": "x"}, {"page_start": "8"}])
+    index = FilterIndex(docs, np.ones(4, dtype=bool))
+    assert _labels({"page_start": {"$lt": 6}}, index) == [1]
+    assert _labels({"page_start": {"$lte": 100}}, index) == [1, 3]
+    assert _labels({"page_start": {"$gt": -5}}, index) == [1, 3]
+    assert _labels({"page_start": {"$gte": -1}}, index) == [1, 3]
+    assert _labels({"page_start": -1}, index) == []
+    assert _labels({"page_start": {"$ne": 3}}, index) == [3]
+    assert _labels({"page_start": {"$nin": [8]}}, index) == [1]
+    assert _labels({"pages": [0, 10]}, index) == []
+
+
+def test_deleted_labels_are_excluded():
+    alive = np.ones(N, dtype=bool)
+    alive[[1, 5]] = False
+    assert _labels({"chapter": 1}, _index(alive)) == [9, 13, 17]
+
+
+def test_unsupported_field_and_operator():
+    with pytest.raises(ValueError):
+        _index().mask({"title": "x"})
+    with pytest.raises(ValueError):
+        _index().mask({"source": {"$gt": "a"}})
+
+
+def test_filter_key_is_order_independent():
+    assert filter_key({"chapter": 1, "source": "a"}) == filter_key({"source": "a", "chapter": 1})
+    assert filter_key(None) is None
+
+
+@pytest.mark.parametrize("spec", [
+    {"chapter": 3},
+    {"chapter": {"$in": ["3", 4]}},
+    {"pages": [1, 2]},
+    {"$or": [{"source": "a.pdf"}, {"page_start": {"$gte": 5}}]},
+])
+def test_validate_accepts(spec):
+    validate(spec)
+
+
+@pytest.mark.parametrize("spec", [
+    {"title": "x"},
+    {"chapter": {"$like": 3}},
+    {"chapter": "three"},
+    {"chapter": {"$in": 3}},
+    {"source": {"$gt": "a"}},
+    {"pages": [1]},
+    {"$or": {"chapter": 1}},
+])
+def test_validate_rejects(spec):
+    with pytest.raises(ValueError):
+        validate(spec)
@@ -0,0 +1,82 @@
+import numpy as np
+from query_cache import QueryCache
+
+DIM = 8
+
+
+def _results(name: str, n: int = 5):
+    return {"documents": [f"{name}{i}" for i in range(n)], "doc_ids": [f"id{i}" for i in range(n)]}
+
+
+def _emb(seed: int) -> np.ndarray:
+    return np.random.default_rng(seed).standard_normal(DIM).astype('float32')
+
+
+def test_exact_hit_normalizes_query_and_slices_top_k():
+    cache = QueryCache(DIM)
+    cache.put("What is  a Hash table?", 5, 1, _results("a"))
+    assert cache.get("what is a hash table?", 5, 1)["documents"] == _results("a")["documents"]
+    assert cache.get("what is a hash table?", 3, 1) is None
+    assert cache.stats()["exact_hits"] == 1
+
+
+def test_version_change_invalidates():
+    cache = QueryCache(DIM)
+    cache.put("q", 5, 1, _results("a"), _emb(0))
+    cache.put_answer("q", 5, 1, "answer")
+    assert cache.get_answer("q", 5, 1) == "answer"
+    assert cache.get("q", 5, 2) is None
+    assert cache.get_answer("q", 5, 1) is None
+    assert cache.get_similar("q again", _emb(0), 5, 2) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_semantic_hit_for_similar_embedding():
+    cache = QueryCache(DIM)
+    cache.put("first", 10, 1, _results("a", 10), _emb(0))
+    hit = cache.get_similar("second", _emb(0) * 1.01, 5, 1)
+    assert hit["documents"] == _results("a", 10)["documents"][:5]
+    assert cache.get_similar("third", _emb(1), 5, 1) is None
+    # alias - isti upit sledeci put ide kroz exact nivo
+    assert cache.get("second", 5, 1) is not None
+
+
+def test_retrieve_many_searches_only_misses():
+    cache = QueryCache(DIM)
+    cache.put("cached", 5, 1, _results("c"), _emb(0))
+    searched = []
+
+    def search(queries, embs):
+        searched.extend(queries)
+        return [_results(q) for q in queries]
+
+    results = cache.retrieve_many(1, ["cached", "new"], 5,
+                                  lambda qs: np.stack([_emb(10 + i) for i in range(len(qs))]), search)
+    assert searched == ["new"]
+    assert results[0]["documents"][0] == "c0"
+    assert results[1]["documents"][0] == "new0"
+    assert cache.get("new", 5, 1) is not None
+
+
+def test_retrieve_many_does_not_cache_partial_results():
+    cache = QueryCache(DIM)
+    calls = []
+
+    def search(queries, embs):
+        calls.append(list(queries))
+        return [{**_results(q), "partial": True} for q in queries]
+
+    encode = lambda qs: np.stack([_emb(20 + i) for i in range(len(qs))])
+    cache.retrieve_many(1, ["slow"], 5, encode, search)
+    cache.retrieve_many(1, ["slow"], 5, encode, search)
+    assert calls == [["slow"], ["slow"]]
+    assert cache.get("slow", 5, 1) is None
+
+
+def test_lru_eviction():
+    cache = QueryCache(DIM, max_entries=2)
+    for i in range(3):
+        cache.put(f"q{i}", 5, 1, _results(str(i)), _emb(i))
+    assert cache.get("q0", 5, 1) is None
+    assert cache.get("q2", 5, 1) is not None
+    assert cache.stats()["evictions"] == 1
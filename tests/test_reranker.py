@@ -0,0 +1,118 @@
+import time
+import numpy as np
+from reranker import CascadeReranker
+
+# kandidat i ima cross encoder skor SCORES[i]; dense redosled je 0, 1, 2...
+SCORES = [0.1, 0.9, 0.3, 0.8, 0.2, 0.7, 0.0, 0.6]
+LABELS = list(range(len(SCORES)))
+DOC_IDS = [f"id{i}" for i in LABELS]
+
+
+class Predictor:
+    def __init__(self):
+        self.pairs = []
+        self.calls = 0
+
+    def __call__(self, pairs):
+        self.pairs.extend(pairs)
+        self.calls += 1
+        return np.array([SCORES[int(text.split()[-1])] for _, text in pairs], dtype='float32')
+
+
+def _rerank(reranker, predict, top_k=3, texts=None, **kwargs):
+    texts = texts or {label: f"document {label}" for label in LABELS}
+    return reranker.rerank(predict, ["query"], [LABELS], [DOC_IDS], texts.get, top_k, **kwargs)[0]
+
+
+def test_default_scores_every_candidate():
+    predict = Predictor()
+    result = _rerank(CascadeReranker(), predict)
+    assert result["labels"] == [1, 3, 5]
+    assert result["stats"]["pairs_scored"] == len(LABELS)
+    assert result["stats"]["pruned"] == 0
+
+
+def test_margin_prunes_far_dense_candidates():
+    predict = Predictor()
+    # slicnost = 1 - d / 2; kandidati 4+ su vise od margin ispod najboljeg
+    distances = {label: 0.1 * label if label < 4 else 1.5 for label in LABELS}
+    result = _rerank(CascadeReranker(margin=0.2), predict, top_k=5, distances=[distances])
+    assert result["stats"]["pruned"] == 4
+    assert result["stats"]["pairs_scored"] == 4
+    # odseceni idu posle skorovanih, u dense redosledu
+    assert result["labels"] == [1, 3, 2, 0, 4]
+
+
+def test_margin_keeps_lexical_candidates():
+    predict = Predictor()
+    distances = {label: 0.0 if label == 0 else 1.5 for label in LABELS}
+    result = _rerank(CascadeReranker(margin=0.2), predict, distances=[distances], keep=[{5}])
+    assert result["labels"][0] == 5
+
+
+def test_patience_stops_early():
+    predict = Predictor()
+    reranker = CascadeReranker(batch_size=2, patience=1)
+    # top-2 posle prve runde (0, 1) je {1, 0}; druga runda (2, 3) ubacuje 3, treca (4, 5) ne menja top
+    result = _rerank(reranker, predict, top_k=2)
+    assert result["stats"]["early_stop"]
+    assert result["stats"]["pairs_scored"] == 6
+    assert result["labels"] == [1, 3]
+
+
+def test_cache_hits_and_crc_invalidation():
+    reranker = CascadeReranker()
+    _rerank(reranker, Predictor())
+    predict = Predictor()
+    result = _rerank(reranker, predict)
+    assert result["stats"]["pairs_scored"] == 0
+    assert result["stats"]["cache_hits"] == len(LABELS)
+
+    # promenjen tekst (update_documents) - skor iz kesa vise ne vazi
+    texts = {label: f"document {label}" for label in LABELS}
+    texts[3] = "updated document 3"
+    predict = Predictor()
+    result = _rerank(reranker, predict, texts=texts)
+    assert result["stats"]["pairs_scored"] == 1
+    assert predict.pairs == [["query", "updated document 3"]]
+
+    reranker.clear()
+    assert _rerank(reranker, Predictor())["stats"]["pairs_scored"] == len(LABELS)
+
+
+def test_cache_disabled():
+    reranker = CascadeReranker(cache_entries=0)
+    _rerank(reranker, Predictor())
+    assert _rerank(reranker, Predictor())["stats"]["pairs_scored"] == len(LABELS)
+    assert reranker.stats()["entries"] == 0
+
+
+def test_deadline_falls_back_to_dense_order():
+    reranker = CascadeReranker(cache_entries=0)
+    _rerank(reranker, Predictor())
+    reranker._pair_seconds = 1.0
+    result = _rerank(reranker, Predictor(), deadline=time.perf_counter() + 0.5)
+    assert result["stats"]["fallback"]
+    assert result["labels"] == [0, 1, 2]
+
+
+def test_deadline_scores_in_full_predict_batches():
+    predict = Predictor()
+    result = _rerank(CascadeReranker(cache_entries=0), predict, deadline=time.perf_counter() + 60)
+    assert predict.calls == 1
+    assert result["stats"]["pairs_scored"] == len(LABELS)
+    assert result["labels"] == [1, 3, 5]
+
+
+def test_deadline_checked_between_predict_batches():
+    predict = Predictor()
+    reranker = CascadeReranker(cache_entries=0, predict_batch_size=4)
+
+    def slow(pairs):
+        # prva runda pojede ceo budzet - druga se ne pokrece
+        time.sleep(0.05)
+        return predict(pairs)
+
+    result = _rerank(reranker, slow, deadline=time.perf_counter() + 0.04)
+    assert predict.calls == 1
+    assert result["stats"]["fallback"] and result["stats"]["pairs_scored"] == 4
@@ -0,0 +1,126 @@
+import numpy as np
+import pytest
+from vector_index import VectorIndex
+from sharded_index import ShardedVectorIndex, merge_topk, shard_of
+from conftest import FakeCollection, make_corpus
+
+
+def test_merge_topk_ascending_skips_missing():
+    parts = [
+        (np.array([[0.1, 0.5]], dtype='float32'), np.array([[1, 2]])),
+        (np.array([[0.3, np.inf]], dtype='float32'), np.array([[7, -1]])),
+    ]
+    scores, labels = merge_topk(parts, 3)
+    assert labels.tolist() == [[1, 7, 2]]
+    assert np.allclose(scores, [[0.1, 0.3, 0.5]])
+
+
+def test_merge_topk_descending_and_empty_parts():
+    parts = [
+        (np.array([[2.0, 1.0]], dtype='float32'), np.array([[4, 5]])),
+        (np.zeros((1, 0), dtype='float32'), np.zeros((1, 0), dtype='int64')),
+        (np.array([[3.0, 0.0]], dtype='float32'), np.array([[9, -1]])),
+    ]
+    _, labels = merge_topk(parts, 2, descending=True)
+    assert labels.tolist() == [[9, 4]]
+
+
+def test_shard_of_is_stable():
+    assert shard_of("book.pdf", 4) == shard_of("book.pdf", 4)
+    assert 0 <= shard_of("book.pdf", 4) < 4
+
+
+def _pair(tmp_path, collection, shards=3, shard_by="source"):
+    single = VectorIndex(str(tmp_path / "single"), 16, collection, {"type": "flat"}, lexical=True)
+    single.load_or_build()
+    sharded = ShardedVectorIndex(str(tmp_path / "sharded"), 16, collection, {"type": "flat"},
+                                 shards=shards, shard_by=shard_by, lexical=True)
+    sharded.load_or_build()
+    return single, sharded
+
+
+def _same_results(single, sharded, queries, k, **kwargs):
+    d1, l1 = single.search(queries, k, **kwargs)
+    d2, l2 = sharded.search(queries, k, **kwargs)
+    assert [single.doc_ids(row[row >= 0]) for row in l1] == [sharded.doc_ids(row[row >= 0]) for row in l2]
+    assert np.allclose(d1[l1 >= 0], d2[l2 >= 0])
+
+
+@pytest.mark.parametrize("shard_by", ["source", "hash"])
+def test_sharded_matches_single_index(tmp_path, collection, corpus, shard_by):
+    _, embeddings, _, _ = corpus
+    single, sharded = _pair(tmp_path, collection, shard_by=shard_by)
+    assert len(sharded) == len(single)
+    _same_results(single, sharded, embeddings[:20] + 0.01, 10)
+    _same_results(single, sharded, embeddings[:20], 5, filter={"chapter": {"$in": [3, 4]}})
+    _, labels = sharded.search(embeddings[42:43], 1)
+    assert sharded.doc_ids(labels[0]) == ["doc42"]
+    assert sharded.docs.document(labels[0][0]) == single.docs.document(single.doc_id_to_label["doc42"])
+
+
+def _forbid_search(shards):
+    def fail(*args, **kwargs):
+        raise AssertionError("shard without matching documents was searched")
+    for shard in shards:
+        shard.search = fail
+        shard.lexical_search = fail
+
+
+def test_empty_shards_are_not_searched(tmp_path):
+    # book0 i book2 dele shard, book1 je sam, treci shard ostaje prazan
+    collection = FakeCollection()
+    ids, embeddings, documents, metadatas = make_corpus(60, 16, sources=3)
+    collection.add(ids, embeddings, documents, metadatas)
+    single, sharded = _pair(tmp_path, collection, shards=3)
+    assert sorted(len(shard) for shard in sharded.shards) == [0, 20, 40]
+    _forbid_search([shard for shard in sharded.shards if len(shard) == 0])
+    _same_results(single, sharded, embeddings[:10], 5)
+
+    # shard kome su obrisani svi dokumenti ima index, ali nema zivih vektora
+    removed = [doc_id for doc_id, meta in zip(ids, metadatas) if meta["source"] == "book1.pdf"]
+    collection.delete(removed)
+    single.remove(removed)
+    sharded.remove(removed)
+    emptied = [shard for shard in sharded.shards if len(shard) == 0 and shard.index is not None]
+    assert emptied
+    _forbid_search(emptied)
+    _same_results(single, sharded, embeddings[:10], 5)
+    _, labels = sharded.lexical_search(["topic3"], 5)
+    assert all("topic3" in sharded.docs.document(label) for label in labels[0] if label >= 0)
+
+
+def test_filter_skips_shards_without_matches(tmp_path):
+    collection = FakeCollection()
+    ids, embeddings, documents, metadatas = make_corpus(60, 16, sources=3)
+    collection.add(ids, embeddings, documents, metadatas)
+    single, sharded = _pair(tmp_path, collection, shards=3)
+    spec = {"source": "book1.pdf"}
+    _forbid_search([shard for shard in sharded.shards if not shard.filter_mask(spec).any()])
+    _same_results(single, sharded, embeddings[:10], 5, filter=spec)
+
+    _forbid_search(sharded.shards)
+    _, labels = sharded.search(embeddings[:2], 5, filter={"source": "missing.pdf"})
+    assert labels.shape == (2, 5) and (labels == -1).all()
+
+
+def test_add_remove_and_reload(tmp_path, collection, corpus):
+    _, embeddings, _, _ = corpus
+    single, sharded = _pair(tmp_path, collection)
+    new_ids, new_embs, new_docs, new_metas = make_corpus(40, 16, seed=3)
+    new_ids = [f"new{i}" for i in range(40)]
+    collection.add(new_ids, new_embs, new_docs, new_metas)
+    version = sharded.version
+    single.add(new_ids, new_embs, new_docs, new_metas)
+    sharded.add(new_ids, new_embs, new_docs, new_metas)
+    assert sharded.version > version
+    removed = [f"doc{i}" for i in range(30)]
+    collection.delete(removed)
+    single.remove(removed)
+    sharded.remove(removed)
+    _same_results(single, sharded, new_embs[:10], 10)
+
+    sharded.save()
+    again = ShardedVectorIndex(str(tmp_path / "sharded"), 16, collection, {"type": "flat"}, shards=3, lexical=True)
+    again.load_or_build()
+    assert len(again) == len(sharded)
+    _same_results(single, again, new_embs[:10], 10)
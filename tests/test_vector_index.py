@@ -0,0 +1,172 @@
+import numpy as np
+import pytest
+from vector_index import VectorIndex
+from conftest import make_corpus
+
+CONFIGS = [
+    {"type": "flat"},
+    {"type": "hnsw_sq8", "M": 16, "efSearch": 64},
+    {"type": "binary", "oversample": 8},
+    {"type": "ivf_flat", "nprobe": 16},
+]
+
+
+def _build(path, collection, config, lexical=False) -> VectorIndex:
+    index = VectorIndex(str(path), 16, collection, config, lexical=lexical)
+    index.load_or_build()
+    return index
+
+
+def _self_recall(index: VectorIndex, ids, embeddings) -> float:
+    _, labels = index.search(embeddings, 1)
+    return float(np.mean([index.doc_ids(row)[0] == doc_id for row, doc_id in zip(labels, ids)]))
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=lambda c: c["type"])
+def test_build_and_search(tmp_path, collection, corpus, config):
+    ids, embeddings, documents, _ = corpus
+    index = _build(tmp_path, collection, config)
+    assert len(index) == len(ids)
+    assert _self_recall(index, ids[:50], embeddings[:50]) >= 0.9
+    _, labels = index.search(embeddings[:1], 3)
+    assert index.docs.documents(labels[0]) == [documents[i] for i in (
+        ids.index(doc_id) for doc_id in index.doc_ids(labels[0]))]
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=lambda c: c["type"])
+def test_add_and_remove(tmp_path, collection, config):
+    index = _build(tmp_path, collection, config)
+    version = index.version
+    new_ids, new_embs, new_docs, new_metas = make_corpus(30, 16, seed=1)
+    new_ids = [f"new{i}" for i in range(30)]
+    collection.add(new_ids, new_embs, new_docs, new_metas)
+    index.add(new_ids, new_embs, new_docs, new_metas)
+    assert index.version > version
+    assert len(index) == 430
+    assert _self_recall(index, new_ids, new_embs) >= 0.9
+
+    removed = new_ids[:10] + [f"doc{i}" for i in range(10)]
+    collection.delete(removed)
+    index.remove(removed)
+    assert len(index) == 410
+    _, labels = index.search(new_embs[:10], 5)
+    found = {doc_id for row in labels for doc_id in index.doc_ids(row[row >= 0])}
+    assert not found & set(removed)
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=lambda c: c["type"])
+def test_filtered_search(tmp_path, collection, corpus, config):
+    _, embeddings, _, _ = corpus
+    index = _build(tmp_path, collection, config)
+    spec = {"chapter": {"$in": [3, 4]}, "source": "book1.pdf"}
+    _, labels = index.search(embeddings[:5], 10, filter=spec)
+    for row in labels:
+        hits = row[row >= 0]
+        assert len(hits)
+        for meta in index.docs.metadatas(hits):
+            assert meta["chapter"] in ("3", "4") and meta["source"] == "book1.pdf"
+
+    _, labels = index.search(embeddings[:2], 10, filter={"source": "missing.pdf"})
+    assert (labels == -1).all()
+
+
+@pytest.mark.parametrize("config", CONFIGS, ids=lambda c: c["type"])
+def test_reload_from_mmap(tmp_path, collection, corpus, config):
+    ids, embeddings, documents, metadatas = corpus
+    index = _build(tmp_path, collection, config, lexical=True)
+    collection.delete(ids[:5])
+    index.remove(ids[:5])
+    index.save()
+    _, expected = index.search(embeddings[5:25], 5)
+
+    again = _build(tmp_path, collection, config, lexical=True)
+    assert again._mmapped
+    assert len(again) == len(index)
+    _, labels = again.search(embeddings[5:25], 5)
+    assert [again.doc_ids(row) for row in labels] == [index.doc_ids(row) for row in expected]
+    assert again.docs.metadata(again.doc_id_to_label["doc7"]) == metadatas[7]
+    scores, labels = again.lexical_search(["topic3"], 3)
+    assert all("topic3" in again.docs.document(label) for label in labels[0])
+
+    # prvi add posle mmap ucitavanja prepisuje index i docstore u memoriju
+    collection.add(["extra"], embeddings[:1] + 0.5, ["extra text"], [{"chapter": "1"}])
+    again.add(["extra"], embeddings[:1] + 0.5, ["extra text"], [{"chapter": "1"}])
+    assert again.docs.document(again.doc_id_to_label["extra"]) == "extra text"
+    assert len(again) == len(index) + 1
+
+
+def test_save_skipped_without_changes(tmp_path, collection):
+    index = _build(tmp_path, collection, {"type": "flat"})
+    mtime = (tmp_path / "faiss_meta.json").stat().st_mtime_ns
+    index.save()
+    assert (tmp_path / "faiss_meta.json").stat().st_mtime_ns == mtime
+
+
+def test_changed_document_invalidates_persisted_index(tmp_path, collection, corpus):
+    ids, embeddings, documents, metadatas = corpus
+    index = _build(tmp_path, collection, {"type": "flat"})
+    # isti id, drugi tekst - upisano mimo indexa (npr. drugi proces)
+    collection.add([ids[3]], embeddings[3:4], ["rewritten paragraph"], [metadatas[3]])
+    again = _build(tmp_path, collection, {"type": "flat"})
+    assert not again._mmapped
+    assert again.docs.document(again.doc_id_to_label[ids[3]]) == "rewritten paragraph"
+
+
+def test_remove_and_add_keep_fingerprint_in_sync(tmp_path, collection, corpus):
+    ids, embeddings, documents, metadatas = corpus
+    index = _build(tmp_path, collection, {"type": "flat"})
+    changed = dict(metadatas[3], position=7)
+    collection.add([ids[3]], embeddings[3:4], [documents[3]], [changed])
+    index.remove([ids[3]])
+    index.add([ids[3]], embeddings[3:4], [documents[3]], [changed])
+    index.save()
+    assert _build(tmp_path, collection, {"type": "flat"})._mmapped
+
+
+def test_background_save_is_reloaded(tmp_path, collection):
+    index = _build(tmp_path, collection, {"type": "flat"})
+    new_ids, new_embs, new_docs, new_metas = make_corpus(5, 16, seed=2)
+    new_ids = [f"bg{i}" for i in range(5)]
+    collection.add(new_ids, new_embs, new_docs, new_metas)
+    index.add(new_ids, new_embs, new_docs, new_metas)
+    index.save_in_background()
+    index.flush()
+    again = _build(tmp_path, collection, {"type": "flat"})
+    assert again._mmapped and len(again) == 405
+
+
+def test_search_during_concurrent_adds(tmp_path, collection, corpus):
+    import threading
+    _, embeddings, _, _ = corpus
+    index = _build(tmp_path, collection, {"type": "flat"}, lexical=True)
+    new_ids, new_embs, new_docs, new_metas = make_corpus(200, 16, seed=4)
+    new_ids = [f"c{i}" for i in range(200)]
+    collection.add(new_ids, new_embs, new_docs, new_metas)
+    errors = []
+
+    def writer():
+        for start in range(0, 200, 10):
+            batch = slice(start, start + 10)
+            index.add(new_ids[batch], new_embs[batch], new_docs[batch], new_metas[batch])
+            index.save_in_background()
+
+    def reader():
+        try:
+            for _ in range(50):
+                for method, query in ((index.search, new_embs[:5]), (index.lexical_search, ["topic3 tableFind1"])):
+                    with index.lock:
+                        _, labels = method(query, 10)
+                        hits = labels[labels >= 0]
+                        assert (hits < len(index.docs)).all()
+                        assert None not in index.doc_ids(hits)
+        except AssertionError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=writer)] + [threading.Thread(target=reader) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    index.flush()
+    assert not errors
+    assert len(index) == 600
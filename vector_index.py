@@ -0,0 +1,430 @@
+'''
+FAISS index sa id mapiranjem koji se azurira inkrementalno.
+
+Vektori se u FAISS dodaju sa labelama (pozicija u doc_id_mapping), pa
+add_documents dodaje samo nove vektore umesto da builda sve iz pocetka.
+Brisanje ide preko remove_ids gde index to podrzava (flat), a za HNSW
+ostaju "tombstone" labele koje se preskacu pri pretrazi. Kada se obrisanih
+skupi previse, ili kada novi vektori izadju iz opsega na kom je kvantizator
+treniran (drift), index se builda ponovo iz chroma db.
+
+Uz index se drzi i DocStore (tekst i metadata po labeli), pa pretraga
+vraca dokumente bez chroma upita. Sa lexical=True uz njega se odrzava i
+BM25 index (lexical_index.py) sa istim labelama.
+
+Chroma kolekcija se uvek azurira PRE poziva add/remove, jer je ona izvor
+za rebuild.
+'''
+
+import os
+import functools
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Sequence, Tuple
+import faiss
+import numpy as np
+from index_store import BackgroundSaver, IndexStore, collection_fingerprint, docs_fingerprint, update_fingerprint
+from doc_store import DocStore
+from lexical_index import BM25Index
+from ann_index import apply_search_params, config_kind, make_factory, make_loader
+from binary_index import BinaryRescoreIndex
+from metadata_filter import FilterIndex, bitmap_selector, filter_key
+
+# rebuild kad tombstone-ova ima vise od ovog udela zivih vektora
+TOMBSTONE_REBUILD_RATIO = 0.2
+# filter koji propusta najvise ovoliko vektora (ili ovaj udeo) ide na egzaktnu pretragu particije
+PARTITION_MAX_SIZE = 4096
+PARTITION_MAX_RATIO = 0.05
+# koliko particija (po filteru) drzimo u memoriji
+MAX_PARTITIONS = 32
+# index koji trazi trening (IVF, SQ8, PQ) se trenira ponovo kad naraste ovoliko puta od treninga
+RETRAIN_GROWTH = 2.0
+
+
+def locked(method):
+    # izmene, snimanje (i u pozadinskoj niti) i citanja pod istim lockom - pretraga
+    # ne vidi labele koje add jos nije upisao u docstore ni polovicno spojen BM25
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+    return wrapper
+
+
+class VectorIndex:
+    def __init__(self, path: str, dim: int, collection, config: Dict,
+                 retrain_threshold: Optional[float] = None, lexical: bool = False):
+        # config - tip i parametri indexa, vidi ann_index.py
+        self.path = path
+        self.dim = dim
+        self.collection = collection
+        self.config = config
+        self.index_factory = make_factory(config)
+        # udeo vrednosti novih vektora van treniranog opsega posle kog se kvantizator ponovo trenira
+        self.retrain_threshold = retrain_threshold
+        self.store = IndexStore(path, config_kind(config), make_loader(config))
+        self.docstore_dir = os.path.join(path, "docstore")
+        self.lexical_dir = os.path.join(path, "bm25")
+
+        self.index = None
+        self.docs = DocStore()
+        # BM25 nad istim labelama (None ako nije ukljucen)
+        self.lexical = BM25Index() if lexical else None
+        self.doc_id_mapping: List[Optional[str]] = []
+        self.doc_id_to_label: Dict[str, int] = {}
+        self.tombstones = set()
+        self.fingerprint = docs_fingerprint([])
+        self.train_min = None
+        self.train_max = None
+        # broj vektora na kojima je index treniran (None - index ne trazi trening)
+        self.trained_count = None
+        self.drift_out = 0
+        self.drift_total = 0
+        self._mmapped = False
+        self._tombstone_selector = None
+        # (version, FilterIndex) i egzaktni indexi po filteru
+        self._filter_index = None
+        self._partitions = OrderedDict()
+        # raste pri svakoj izmeni indexa (za invalidaciju keseva)
+        self.version = 0
+        # verzija poslednjeg snimka - save() bez izmena ne prepisuje fajlove
+        self._saved_version = None
+        self.lock = threading.RLock()
+        self._saver = BackgroundSaver(self.save, self.lock)
+
+    def __len__(self) -> int:
+        return len(self.doc_id_to_label)
+
+    @property
+    def base_index(self):
+        if isinstance(self.index, faiss.IndexIDMap):
+            return faiss.downcast_index(self.index.index)
+        return self.index
+
+    @locked
+    def set_config(self, config: Dict):
+        # promena samo efSearch/nprobe ne trazi rebuild
+        rebuild = config_kind(config) != config_kind(self.config)
+        self.config = config
+        self.index_factory = make_factory(config)
+        self.store = IndexStore(self.path, config_kind(config), make_loader(config))
+        if rebuild or self.index is None:
+            self.load_or_build(force=True)
+        else:
+            apply_search_params(self.index, config)
+            self.version += 1
+
+    @locked
+    def load_or_build(self, force: bool = False):
+        fingerprint = collection_fingerprint(self.collection)
+        if fingerprint['count'] == 0:
+            self.index = None
+            self.doc_id_mapping = []
+            self.doc_id_to_label = {}
+            self.tombstones = set()
+            self.docs = DocStore()
+            if self.lexical is not None:
+                self.lexical = BM25Index()
+            self.version += 1
+            return
+
+        # ako je sacuvani index za istu kolekciju preskacemo trening i build
+        if not force:
+            loaded = self.store.load(fingerprint)
+            docs = DocStore.load(self.docstore_dir) if loaded is not None else None
+            if docs is not None and len(docs) == len(loaded[1]["doc_id_mapping"]):
+                self._set_state(*loaded)
+                self.docs = docs
+                if self.lexical is not None:
+                    self._load_lexical()
+                self._saved_version = self.version
+                print(f"Loaded persisted FAISS index with {len(self)} vectors")
+                return
+
+        results = self.collection.get(include=['embeddings', 'documents', 'metadatas'])
+        embeddings = np.array(results['embeddings']).astype('float32')
+        self._build(results['ids'], embeddings, results['documents'], results['metadatas'])
+        self.save()
+
+    def _build(self, ids: List[str], embeddings: np.ndarray, documents: List[str],
+               metadatas: Optional[List[Dict]]):
+        index = self.index_factory(self.dim, len(ids))
+        self.trained_count = None
+        if not index.is_trained:
+            print("Training index...")
+            index.train(embeddings)
+            self.train_min = embeddings.min(axis=0)
+            self.train_max = embeddings.max(axis=0)
+            self.trained_count = len(ids)
+        index.add_with_ids(embeddings, np.arange(len(ids), dtype='int64'))
+        apply_search_params(index, self.config)
+
+        self.index = index
+        self._mmapped = False
+        self.docs = DocStore()
+        self.docs.append(documents, metadatas)
+        if self.lexical is not None:
+            self.lexical = BM25Index()
+            self.lexical.add(range(len(ids)), documents)
+        self.doc_id_mapping = list(ids)
+        self.doc_id_to_label = {doc_id: i for i, doc_id in enumerate(ids)}
+        self.tombstones = set()
+        self._tombstone_selector = None
+        self.fingerprint = docs_fingerprint(ids, documents, metadatas)
+        self.drift_out = 0
+        self.drift_total = 0
+        self.version += 1
+        print(f"Index built with {len(ids)} vectors")
+
+    def _set_state(self, index: faiss.Index, meta: Dict):
+        apply_search_params(index, self.config)
+        self.index = index
+        self._mmapped = True
+        self.doc_id_mapping = meta["doc_id_mapping"]
+        self.doc_id_to_label = {doc_id: i for i, doc_id in enumerate(self.doc_id_mapping) if doc_id is not None}
+        self.tombstones = set(meta.get("tombstones", []))
+        self._tombstone_selector = None
+        self.fingerprint = meta["fingerprint"]
+        self.train_min = np.array(meta["train_min"], dtype='float32') if meta.get("train_min") else None
+        self.train_max = np.array(meta["train_max"], dtype='float32') if meta.get("train_max") else None
+        self.trained_count = meta.get("trained_count")
+        self.drift_out = meta.get("drift_out", 0)
+        self.drift_total = meta.get("drift_total", 0)
+        self.version += 1
+
+    def _load_lexical(self):
+        lexical = BM25Index.load(self.lexical_dir)
+        deleted = [label for label, doc_id in enumerate(self.doc_id_mapping) if doc_id is None]
+        if lexical is None or len(lexical) != len(self.doc_id_mapping) or int(lexical.deleted.sum()) != len(deleted):
+            # nema BM25 fajlova (ili su od drugog snapshota) - gradimo iz docstore-a
+            print("Building BM25 index from docstore...")
+            lexical = BM25Index()
+            lexical.add(range(len(self.docs)), self.docs.documents(range(len(self.docs))))
+            lexical.remove(deleted)
+        self.lexical = lexical
+
+    @locked
+    def save(self):
+        if self.index is None or self._saved_version == self.version:
+            return
+        # docstore pre indexa - meta fajl indexa je poslednji i potvrdjuje ceo snapshot
+        self.docs.save(self.docstore_dir)
+        if self.lexical is not None:
+            self.lexical.save(self.lexical_dir)
+        self.store.save(self.index, {
+            "fingerprint": self.fingerprint,
+            "doc_id_mapping": self.doc_id_mapping,
+            "tombstones": sorted(self.tombstones),
+            "train_min": self.train_min.tolist() if self.train_min is not None else None,
+            "train_max": self.train_max.tolist() if self.train_max is not None else None,
+            "trained_count": self.trained_count,
+            "drift_out": self.drift_out,
+            "drift_total": self.drift_total
+        })
+        self._saved_version = self.version
+
+    def save_in_background(self):
+        """
+        Snimanje bez cekanja (inkrementalni add/update/delete); vise zahteva se spaja u jedno.
+        """
+        self._saver.request()
+
+    def flush(self):
+        # ceka snimanja zakazana sa save_in_background
+        self._saver.flush()
+
+    def _ensure_writable(self):
+        # mmapovan index je read-only, pre izmena ga ucitavamo u memoriju
+        if self._mmapped:
+            self.index = self.store.read_index(mmap=False)
+            apply_search_params(self.index, self.config)
+            self._mmapped = False
+
+    def drift(self) -> float:
+        return self.drift_out / self.drift_total if self.drift_total else 0.0
+
+    def undertrained(self) -> bool:
+        # nlist/kvantizator su odredjeni brojem vektora pri treningu - drift po opsegu to ne vidi
+        return self.trained_count is not None and len(self) >= RETRAIN_GROWTH * max(self.trained_count, 1)
+
+    @locked
+    def retrain_if_needed(self) -> bool:
+        """
+        Ponovni trening i build ako je index treniran na premalo vektora (npr. na prvom
+        batchu streaming ingesta). Zove se posle velikog ingesta, ne posle svakog add-a.
+        """
+        if self.index is None or not self.undertrained():
+            return False
+        print(f"Index trained on {self.trained_count} vectors, now {len(self)} - retraining...")
+        self.load_or_build(force=True)
+        return True
+
+    @locked
+    def add(self, ids: List[str], embeddings: np.ndarray, documents: List[str],
+            metadatas: Optional[List[Dict]] = None):
+        if self.index is None:
+            # prvi dokumenti - chroma ih vec ima, pa buildamo ceo index
+            # (kod streaming ingesta to je samo prvi batch - vidi retrain_if_needed)
+            self.load_or_build(force=True)
+            return
+
+        # chroma ignorise vec postojece id-jeve pri add, pa i mi
+        new_rows = [i for i, doc_id in enumerate(ids) if doc_id not in self.doc_id_to_label]
+        if not new_rows:
+            return
+        ids = [ids[i] for i in new_rows]
+        embeddings = np.ascontiguousarray(embeddings[new_rows], dtype='float32')
+        documents = [documents[i] for i in new_rows]
+        metadatas = [metadatas[i] for i in new_rows] if metadatas else None
+
+        if self.retrain_threshold is not None and self.train_min is not None:
+            outside = (embeddings < self.train_min) | (embeddings > self.train_max)
+            self.drift_out += int(outside.sum())
+            self.drift_total += outside.size
+            if self.drift() > self.retrain_threshold:
+                print(f"Quantizer drift {self.drift():.2%} over threshold, retraining index...")
+                self.load_or_build(force=True)
+                return
+
+        self._ensure_writable()
+        start = len(self.doc_id_mapping)
+        self.index.add_with_ids(embeddings, np.arange(start, start + len(ids), dtype='int64'))
+        for offset, doc_id in enumerate(ids):
+            self.doc_id_to_label[doc_id] = start + offset
+        self.doc_id_mapping.extend(ids)
+        self.docs.append(documents, metadatas)
+        if self.lexical is not None:
+            self.lexical.add(range(start, start + len(ids)), documents)
+        self.fingerprint = update_fingerprint(self.fingerprint, added=zip(ids, documents, metadatas or [None] * len(ids)))
+        self.version += 1
+        print(f"Appended {len(ids)} vectors to index ({len(self)} total)")
+
+    @locked
+    def remove(self, ids: List[str]):
+        removed = [doc_id for doc_id in ids if doc_id in self.doc_id_to_label]
+        if not removed or self.index is None:
+            return
+        labels = np.array([self.doc_id_to_label.pop(doc_id) for doc_id in removed], dtype='int64')
+        # otisak se azurira sadrzajem koji je bio upisan pod tim id-jevima
+        entries = list(zip(removed, self.docs.documents(labels), self.docs.metadatas(labels)))
+
+        self._ensure_writable()
+        try:
+            self.index.remove_ids(faiss.IDSelectorBatch(labels))
+        except RuntimeError:
+            # HNSW ne podrzava brisanje, labele se preskacu pri pretrazi
+            self.tombstones.update(labels.tolist())
+            self._tombstone_selector = None
+        for label in labels:
+            self.doc_id_mapping[label] = None
+        if self.lexical is not None:
+            self.lexical.remove(labels)
+        self.fingerprint = update_fingerprint(self.fingerprint, removed=entries)
+        self.version += 1
+
+        if len(self.tombstones) > TOMBSTONE_REBUILD_RATIO * max(len(self), 1):
+            print(f"{len(self.tombstones)} deleted vectors still in index, rebuilding...")
+            self.load_or_build(force=True)
+
+    def _params(self, selector):
+        base = self.base_index
+        if isinstance(base, faiss.IndexHNSW):
+            return faiss.SearchParametersHNSW(sel=selector, efSearch=base.hnsw.efSearch)
+        if isinstance(base, faiss.IndexIVF):
+            return faiss.SearchParametersIVF(sel=selector, nprobe=base.nprobe)
+        return faiss.SearchParameters(sel=selector)
+
+    def _search_params(self):
+        if not self.tombstones:
+            return None
+        if self._tombstone_selector is None:
+            deleted = faiss.IDSelectorBatch(np.array(sorted(self.tombstones), dtype='int64'))
+            # drzimo referencu na batch selektor, Not ga ne kopira
+            self._tombstone_selector = (deleted, faiss.IDSelectorNot(deleted))
+        return self._params(self._tombstone_selector[1])
+
+    @locked
+    def filter_mask(self, spec: Dict) -> np.ndarray:
+        """
+        Bool maska po labeli za filter (vidi metadata_filter.py), bez obrisanih.
+        """
+        if self._filter_index is None or self._filter_index[0] != self.version:
+            alive = np.array([doc_id is not None for doc_id in self.doc_id_mapping], dtype=bool)
+            self._filter_index = (self.version, FilterIndex(self.docs, alive))
+            self._partitions.clear()
+        return self._filter_index[1].mask(spec)
+
+    @locked
+    def vectors(self, labels: np.ndarray) -> np.ndarray:
+        if isinstance(self.index, BinaryRescoreIndex):
+            return np.asarray(self.index.vectors[labels], dtype='float32')
+        try:
+            return self.index.reconstruct_batch(np.asarray(labels, dtype='int64'))
+        except RuntimeError:
+            # IVF bez direct mape i slicni - vektori iz chroma db
+            ids = self.doc_ids(labels)
+            rows = self.collection.get(ids=ids, include=['embeddings'])
+            by_id = dict(zip(rows['ids'], rows['embeddings']))
+            return np.array([by_id[doc_id] for doc_id in ids], dtype='float32')
+
+    def _partition(self, spec: Dict, mask: np.ndarray) -> Tuple[np.ndarray, faiss.Index]:
+        # mali egzaktni index samo nad vektorima koji prolaze filter, kesiran po filteru
+        key = filter_key(spec)
+        if key in self._partitions:
+            self._partitions.move_to_end(key)
+            return self._partitions[key]
+        labels = np.flatnonzero(mask).astype('int64')
+        index = faiss.IndexFlatL2(self.dim)
+        index.add(np.ascontiguousarray(self.vectors(labels), dtype='float32'))
+        self._partitions[key] = (labels, index)
+        if len(self._partitions) > MAX_PARTITIONS:
+            self._partitions.popitem(last=False)
+        return labels, index
+
+    def _search_partition(self, spec: Dict, mask: np.ndarray, query_embs: np.ndarray, k: int):
+        labels, index = self._partition(spec, mask)
+        distances, rows = index.search(query_embs, k)
+        return distances, np.where(rows >= 0, labels[np.maximum(rows, 0)], -1)
+
+    @locked
+    def search(self, query_embs: np.ndarray, k: int, filter: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Vraca distance i labele za svaki query; labela -1 znaci da nema dovoljno vektora.
+        Labele su redovi u self.docs i doc_id_mapping. filter - vidi metadata_filter.py.
+        """
+        if filter:
+            return self._filtered_search(query_embs, k, filter)
+        k = min(k, len(self))
+        params = self._search_params()
+        if params is not None:
+            return self.index.search(query_embs, k, params=params)
+        return self.index.search(query_embs, k)
+
+    def _filtered_search(self, query_embs: np.ndarray, k: int, spec: Dict):
+        mask = self.filter_mask(spec)
+        matched = int(mask.sum())
+        if matched == 0:
+            return np.full((len(query_embs), k), np.inf, dtype='float32'), np.full((len(query_embs), k), -1, dtype='int64')
+        if matched <= PARTITION_MAX_SIZE or matched <= PARTITION_MAX_RATIO * len(self):
+            # vrlo selektivan filter - egzaktna pretraga particije je brza od filtriranog grafa
+            return self._search_partition(spec, mask, query_embs, min(k, matched))
+
+        # bitmapa (vec bez obrisanih) umesto tombstone selektora
+        selector, bits = bitmap_selector(mask)
+        distances, labels = self.index.search(query_embs, min(k, matched), params=self._params(selector))
+        # HNSW/IVF sa filterom moze vratiti manje od k - ti upiti idu egzaktno preko particije
+        short = [i for i, row in enumerate(labels) if (row >= 0).sum() < min(k, matched)]
+        if short:
+            distances[short], labels[short] = self._search_partition(spec, mask, query_embs[short], min(k, matched))
+        return distances, labels
+
+    @locked
+    def lexical_search(self, queries: List[str], k: int, filter: Optional[Dict] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        BM25 skorovi i labele (iste labele kao search); -1 kad nema pogodaka.
+        """
+        return self.lexical.search(queries, k, mask=self.filter_mask(filter) if filter else None)
+
+    @locked
+    def doc_ids(self, labels: Sequence[int]) -> List[str]:
+        return [self.doc_id_mapping[label] for label in labels]